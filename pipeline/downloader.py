@@ -0,0 +1,255 @@
+"""
+Resumable, parallel-range file downloads shared by the pipeline scripts.
+
+Files are fetched as Range parts over parallel connections into a <name>.part
+file, with progress in a <name>.part.json sidecar so an interrupted download
+resumes. The result is verified (size, optional sha256) before it is
+atomically renamed into place.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+CHUNK_SIZE = 1024 * 1024  # streaming read size
+PART_SIZE = 8 * 1024 * 1024  # bytes per Range request
+DOWNLOAD_CONNECTIONS = 4
+DOWNLOAD_TIMEOUT_S = 60
+PART_RETRIES = 3
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+class RangeIgnored(IOError):
+    """The server answered a Range request with the whole file; retrying won't change that."""
+
+
+def download_session() -> requests.Session:
+    """Shared pooled session for downloads."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max(DOWNLOAD_CONNECTIONS, 16))
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _content_length(resp: requests.Response) -> int | None:
+    """Body size as iter_content will yield it; unknown when the body is compressed on the wire."""
+    length = resp.headers.get("Content-Length")
+    if resp.headers.get("Content-Encoding", "identity") != "identity":
+        return None  # Content-Length counts the encoded bytes
+    return int(length) if length and length.isdigit() else None
+
+
+def _open(session: requests.Session, url: str) -> tuple[requests.Response, int | None, bool, str | None]:
+    """
+    Start a GET for the first byte. Returns (response, total size, supports ranges, validator).
+
+    Signed asset URLs are often valid for GET only, so this avoids HEAD. If
+    the server ignores Range the response is the whole file and the caller
+    streams it instead of discarding it.
+    """
+    resp = session.get(url, headers={"Range": "bytes=0-0"}, stream=True, timeout=DOWNLOAD_TIMEOUT_S)
+    resp.raise_for_status()
+    validator = resp.headers.get("ETag") or resp.headers.get("Last-Modified")
+    if resp.status_code == 206 and "/" in resp.headers.get("Content-Range", ""):
+        total = resp.headers["Content-Range"].rsplit("/", 1)[1]
+        if total.isdigit():
+            return resp, int(total), True, validator
+    return resp, _content_length(resp), False, validator
+
+
+def _open_plain(session: requests.Session, url: str) -> tuple[requests.Response, int | None, str | None]:
+    """Start a plain GET for the whole file. Returns (response, Content-Length, validator)."""
+    resp = session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT_S)
+    resp.raise_for_status()
+    validator = resp.headers.get("ETag") or resp.headers.get("Last-Modified")
+    return resp, _content_length(resp), validator
+
+
+def _load_progress(sidecar: str, total: int, validator: str | None) -> set[int]:
+    """Completed part indices from a previous attempt, if it was for the same file."""
+    try:
+        with open(sidecar) as f:
+            progress = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return set()
+    if progress.get("size") != total or progress.get("validator") != validator:
+        return set()
+    return set(progress.get("done", []))
+
+
+def _save_progress(sidecar: str, total: int, validator: str | None, done: set[int]):
+    tmp_path = f"{sidecar}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"size": total, "validator": validator, "part_size": PART_SIZE, "done": sorted(done)}, f)
+    os.replace(tmp_path, sidecar)
+
+
+def _fetch_part(session: requests.Session, url: str, fd: int, start: int, end: int):
+    """GET bytes [start, end] and pwrite them at their offset, retrying transient failures."""
+    for attempt in range(PART_RETRIES):
+        try:
+            with session.get(
+                url, headers={"Range": f"bytes={start}-{end}"}, stream=True, timeout=DOWNLOAD_TIMEOUT_S
+            ) as resp:
+                resp.raise_for_status()
+                if resp.status_code != 206:
+                    raise RangeIgnored(f"Range request ignored (HTTP {resp.status_code})")
+                offset = start
+                for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                    os.pwrite(fd, chunk, offset)
+                    offset += len(chunk)
+            if offset != end + 1:
+                raise IOError(f"Short read for bytes {start}-{end}: got {offset - start}")
+            return
+        except RangeIgnored:
+            raise
+        except (requests.ConnectionError, requests.Timeout, IOError) as e:
+            response = getattr(e, "response", None)
+            if response is not None and response.status_code < 500:
+                raise  # e.g. an expired signed URL; retrying won't help
+            if attempt == PART_RETRIES - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def _download_ranges(
+    session: requests.Session,
+    url: str,
+    part_path: str,
+    total: int,
+    validator: str | None,
+    connections: int,
+) -> int:
+    """Fill part_path with [0, total) via parallel Range requests. Returns bytes fetched."""
+    sidecar = f"{part_path}.json"
+    done = _load_progress(sidecar, total, validator) if os.path.exists(part_path) else set()
+    parts = [(i, start, min(start + PART_SIZE, total) - 1) for i, start in enumerate(range(0, total, PART_SIZE))]
+    todo = [p for p in parts if p[0] not in done]
+    if done:
+        print(f"  Resuming: {len(done)}/{len(parts)} parts already downloaded")
+
+    lock = threading.Lock()
+    fd = os.open(part_path, os.O_RDWR | os.O_CREAT)
+    try:
+        os.ftruncate(fd, total)
+
+        def fetch(part: tuple[int, int, int]):
+            i, start, end = part
+            _fetch_part(session, url, fd, start, end)
+            with lock:
+                done.add(i)
+                _save_progress(sidecar, total, validator, done)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(connections, len(todo)))) as pool:
+            for future in [pool.submit(fetch, part) for part in todo]:
+                future.result()
+    finally:
+        os.close(fd)
+    return sum(end - start + 1 for _, start, end in todo)
+
+
+def _download_stream(resp: requests.Response, part_path: str) -> int:
+    """Stream a full-body response into part_path. Returns bytes fetched."""
+    written = 0
+    try:
+        with open(part_path, "wb") as f:
+            for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+                written += len(chunk)
+    except BaseException:
+        os.unlink(part_path)  # no sidecar, so nothing could resume it
+        raise
+    return written
+
+
+def download(
+    url: str,
+    output_path: str,
+    label: str = "file",
+    connections: int = DOWNLOAD_CONNECTIONS,
+    expected_size: int | None = None,
+    sha256: str | None = None,
+    session: requests.Session | None = None,
+    verbose: bool = True,
+) -> str:
+    """
+    Download url to output_path, resuming a previous partial download.
+
+    Args:
+        url: file URL (signed URLs are fine; resume matches on size + ETag, not URL)
+        output_path: destination; written as output_path.part until verified
+        label: name used in log lines
+        connections: parallel Range connections (1 = one plain GET with no Range
+            probe, unless a resumable partial download exists)
+        expected_size: fail unless the file is exactly this many bytes
+        sha256: fail unless the file has this hex digest
+        session: requests session (default: shared download_session())
+        verbose: print progress lines
+
+    Returns:
+        output_path
+    """
+    session = session or download_session()
+    part_path = f"{output_path}.part"
+    sidecar = f"{part_path}.json"
+    if verbose:
+        print(f"  Downloading {label} from {url[:60]}...")
+
+    t0 = time.time()
+    if connections <= 1 and not os.path.exists(sidecar):
+        resp, total, validator = _open_plain(session, url)  # small files: one request
+        ranges = False
+    else:
+        resp, total, ranges, validator = _open(session, url)
+    with resp:
+        if ranges and total:
+            resp.close()
+            fetched = _download_ranges(session, url, part_path, total, validator, connections)
+        else:
+            fetched = _download_stream(resp, part_path)
+
+    size = os.path.getsize(part_path)
+    problems = []
+    if total is not None and size != total:
+        problems.append(f"size {size} != server size {total}")
+    if expected_size is not None and size != expected_size:
+        problems.append(f"size {size} != expected {expected_size}")
+    if sha256 is not None and file_sha256(part_path) != sha256.lower():
+        problems.append("sha256 mismatch")
+    if problems:
+        for path in (part_path, sidecar):
+            if os.path.exists(path):
+                os.unlink(path)
+        raise ValueError(f"Download of {label} failed verification: {', '.join(problems)}")
+
+    os.replace(part_path, output_path)
+    if os.path.exists(sidecar):
+        os.unlink(sidecar)
+
+    if verbose:
+        elapsed = time.time() - t0
+        mb = size / (1024 * 1024)
+        print(f"  Saved: {output_path} ({mb:.1f} MB, {fetched / (1024 * 1024) / max(elapsed, 1e-6):.1f} MB/s"
+              f"{f', {connections} connections' if ranges and connections > 1 else ''})")
+    return output_path
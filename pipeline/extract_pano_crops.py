@@ -21,6 +21,8 @@ from PIL import Image
 from io import BytesIO
 from pathlib import Path
 
+from projection import INTERPOLATIONS, equirect_to_perspectives
+
 # ---- Mapillary API ----
 
 ACCESS_TOKEN = os.environ.get("MAPILLARY_TOKEN")
@@ -49,81 +51,6 @@ def download_pano(url: str) -> Image.Image:
     return img
 
 
-# ---- Equirectangular → Perspective Projection ----
-
-def equirect_to_perspective(
-    equirect: np.ndarray,
-    heading_deg: float,
-    pitch_deg: float = 0.0,
-    fov_deg: float = 90.0,
-    out_size: int = 512,
-) -> np.ndarray:
-    """
-    Extract a perspective (rectilinear) crop from an equirectangular panorama.
-
-    Args:
-        equirect: HxWx3 uint8 array (equirectangular panorama, 2:1 aspect)
-        heading_deg: Horizontal angle in degrees (0=front, 90=right, etc.)
-        pitch_deg: Vertical angle in degrees (0=horizon, +up, -down)
-        fov_deg: Field of view in degrees
-        out_size: Output image size (square)
-
-    Returns:
-        out_size x out_size x 3 uint8 array
-    """
-    h_eq, w_eq = equirect.shape[:2]
-
-    # Convert angles to radians
-    heading = np.radians(heading_deg)
-    pitch = np.radians(pitch_deg)
-    fov = np.radians(fov_deg)
-
-    # Focal length in pixels for the output image
-    f = (out_size / 2) / np.tan(fov / 2)
-
-    # Build pixel grid for output image, centered at (0,0)
-    u = np.arange(out_size, dtype=np.float64) - out_size / 2
-    v = np.arange(out_size, dtype=np.float64) - out_size / 2
-    uu, vv = np.meshgrid(u, v)
-
-    # 3D ray directions in camera space (x=right, y=down, z=forward)
-    x = uu
-    y = vv
-    z = np.full_like(uu, f)
-
-    # Normalize
-    norm = np.sqrt(x**2 + y**2 + z**2)
-    x, y, z = x / norm, y / norm, z / norm
-
-    # Rotation: first pitch (around x-axis), then heading (around y-axis)
-    # Pitch rotation (positive pitch = look up = rotate around x)
-    cos_p, sin_p = np.cos(-pitch), np.sin(-pitch)
-    y2 = cos_p * y - sin_p * z
-    z2 = sin_p * y + cos_p * z
-    y, z = y2, z2
-
-    # Heading rotation (positive heading = look right = rotate around y)
-    cos_h, sin_h = np.cos(heading), np.sin(heading)
-    x2 = cos_h * x + sin_h * z
-    z2 = -sin_h * x + cos_h * z
-    x, z = x2, z2
-
-    # Convert 3D ray to spherical coordinates (longitude, latitude)
-    lon = np.arctan2(x, z)  # -pi to pi
-    lat = np.arcsin(np.clip(y, -1, 1))  # -pi/2 to pi/2
-
-    # Map to equirectangular pixel coordinates
-    eq_x = ((lon / np.pi + 1) / 2 * w_eq).astype(np.float64)
-    eq_y = ((lat / (np.pi / 2) + 1) / 2 * h_eq).astype(np.float64)
-
-    # Clamp to valid range
-    eq_x = np.clip(eq_x, 0, w_eq - 1).astype(int)
-    eq_y = np.clip(eq_y, 0, h_eq - 1).astype(int)
-
-    # Sample pixels
-    return equirect[eq_y, eq_x]
-
-
 # ---- Main ----
 
 def main():
@@ -133,6 +60,8 @@ def main():
     parser.add_argument("--fov", type=float, default=90.0, help="Field of view in degrees (default: 90)")
     parser.add_argument("--pitch", type=float, default=0.0, help="Pitch in degrees, 0=horizon (default: 0)")
     parser.add_argument("--out-size", type=int, default=512, help="Output crop size in pixels (default: 512)")
+    parser.add_argument("--interpolation", default="bilinear", choices=INTERPOLATIONS,
+                        help="Crop sampling (default: bilinear)")
     parser.add_argument("--output-dir", default="./data/test-crops", help="Output directory")
     args = parser.parse_args()
 
@@ -169,9 +98,10 @@ def main():
     out_dir.mkdir(parents=True, exist_ok=True)
 
     print(f"\nExtracting {args.num_crops} crops (FOV={args.fov}°, size={args.out_size}px):")
-    for i, heading in enumerate(headings):
+    views = [(heading % 360, args.pitch, args.fov, args.out_size) for heading in headings]
+    crops = equirect_to_perspectives(equirect, views, args.interpolation)
+    for i, (heading, crop) in enumerate(zip(headings, crops)):
         heading_norm = heading % 360
-        crop = equirect_to_perspective(equirect, heading_norm, args.pitch, args.fov, args.out_size)
         crop_img = Image.fromarray(crop)
 
         filename = f"crop_{i:02d}_h{heading_norm:05.1f}.jpg"
@@ -191,6 +121,7 @@ def main():
         "fov_deg": args.fov,
         "pitch_deg": args.pitch,
         "out_size": args.out_size,
+        "interpolation": args.interpolation,
         "crops": [
             {"index": i, "heading": h % 360, "filename": f"crop_{i:02d}_h{h % 360:05.1f}.jpg"}
             for i, h in enumerate(headings)
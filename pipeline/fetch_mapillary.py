@@ -4,15 +4,23 @@ Download panoramic images from Williamsburg, Brooklyn via Mapillary API v4.
 
 Usage:
     export MAPILLARY_TOKEN="MLY|..."
-    python fetch_mapillary.py
+    python fetch_mapillary.py --rps 10 --download-workers 16
 """
 
+import argparse
 import os
 import sys
 import json
 import time
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from urllib.parse import urlparse
+
 import requests
 import mercantile
+from requests.adapters import HTTPAdapter
+
+from downloader import download, download_session
 
 # ---- Config ----
 ACCESS_TOKEN = os.environ.get("MAPILLARY_TOKEN")
@@ -30,52 +38,166 @@ FIELDS = ",".join([
 # Williamsburg, Brooklyn bounding box
 WEST, SOUTH, EAST, NORTH = -73.970, 40.700, -73.935, 40.725
 
+# Query engine: start from coarse tiles and only split the ones that hit the result limit
+QUERY_LIMIT = 2000  # max results the API returns for one bbox
+START_ZOOM = 14
+MAX_ZOOM = 18
+QUERY_WORKERS = 8
+REQUESTS_PER_SECOND = 10
+MAX_RETRIES = 5
+
+# Image downloads
+DOWNLOAD_WORKERS = 16
+PER_HOST_LIMIT = 8  # concurrent downloads per CDN host
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_s = (1 - self.tokens) / self.rate
+            time.sleep(wait_s)
+
+
+_session = requests.Session()
+_session.headers.update(HEADERS)
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=QUERY_WORKERS))
+_bucket = TokenBucket(REQUESTS_PER_SECOND)
+_query_stats = {"requests": 0, "retries": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(key):
+    with _stats_lock:
+        _query_stats[key] += 1
+
+
+def api_get(url, params=None):
+    """Rate-limited GET against the Graph API, retrying 429 / 5xx / connection errors with backoff."""
+    for attempt in range(MAX_RETRIES):
+        _bucket.acquire()
+        _count("requests")
+        try:
+            resp = _session.get(url, params=params, timeout=60)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == MAX_RETRIES - 1:
+                raise
+            _count("retries")
+            time.sleep(2 ** attempt)
+            continue
+
+        if resp.status_code == 429 or resp.status_code >= 500:
+            if attempt == MAX_RETRIES - 1:
+                resp.raise_for_status()
+            _count("retries")
+            retry_after = resp.headers.get("Retry-After")
+            time.sleep(float(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt)
+            continue
+
+        resp.raise_for_status()
+        return resp.json()
+
 
 def query_bbox(bbox_str, is_pano=True):
-    """Query images in a single small bbox, handling pagination."""
+    """Query images in a single bbox, following pagination.
+
+    Returns (images, truncated): truncated means the API returned its full
+    result limit without a next page, so the bbox holds more images than we got.
+    """
     params = {
         "bbox": bbox_str,
-        "limit": 2000,
+        "limit": QUERY_LIMIT,
         "fields": FIELDS,
         "is_pano": str(is_pano).lower(),
     }
     images = []
     url = "https://graph.mapillary.com/images"
+    truncated = False
 
     while url:
-        resp = requests.get(url, headers=HEADERS, params=params)
-        resp.raise_for_status()
-        data = resp.json()
-        images.extend(data.get("data", []))
+        data = api_get(url, params=params)
+        page = data.get("data", [])
+        images.extend(page)
         url = data.get("paging", {}).get("next")
-        params = {}  # params are embedded in the next URL
-    return images
-
-
-def query_all_tiles(is_pano=True):
-    """Tile the Williamsburg bbox and query all tiles."""
-    tiles = list(mercantile.tiles(WEST, SOUTH, EAST, NORTH, zooms=16))
-    print(f"Querying {len(tiles)} tiles...")
+        params = None  # params are embedded in the next URL
+        truncated = len(page) >= QUERY_LIMIT and not url
+    return images, truncated
+
+
+def _clip_to_bbox(tile):
+    """Bounds of tile intersected with the Williamsburg bbox, or None if they don't overlap."""
+    b = mercantile.bounds(tile)
+    west, south, east, north = max(b.west, WEST), max(b.south, SOUTH), min(b.east, EAST), min(b.north, NORTH)
+    if west >= east or south >= north:
+        return None
+    return west, south, east, north
+
+
+def query_all_tiles(is_pano=True, rps=REQUESTS_PER_SECOND):
+    """Query the Williamsburg bbox with concurrent, adaptively subdivided tile queries.
+
+    Starts from START_ZOOM tiles (clipped to the bbox), so empty or sparse
+    areas cost a single request, and only splits a tile into its four
+    children when it hits the result limit.
+    """
+    global _bucket
+    start = time.time()
+    _bucket = TokenBucket(rps)
+    _query_stats.update(requests=0, retries=0)
+    tiles = list(mercantile.tiles(WEST, SOUTH, EAST, NORTH, zooms=START_ZOOM))
+    print(f"Querying {len(tiles)} zoom-{START_ZOOM} tiles ({QUERY_WORKERS} workers, "
+          f"{rps:g} req/s)...")
+
+    def query_tile(tile):
+        return query_bbox(",".join(str(v) for v in _clip_to_bbox(tile)), is_pano=is_pano)
 
     all_images = []
     seen = set()
-
-    for i, tile in enumerate(tiles):
-        bounds = mercantile.bounds(tile)
-        bbox_str = f"{bounds.west},{bounds.south},{bounds.east},{bounds.north}"
-
-        images = query_bbox(bbox_str, is_pano=is_pano)
-        new = 0
-        for img in images:
-            if img["id"] not in seen:
-                seen.add(img["id"])
-                all_images.append(img)
-                new += 1
-
-        print(f"  Tile {i+1}/{len(tiles)}: {new} new images")
-        time.sleep(0.1)
-
-    print(f"Total: {len(all_images)} unique images")
+    splits = 0
+
+    with ThreadPoolExecutor(max_workers=QUERY_WORKERS) as pool:
+        pending = {pool.submit(query_tile, tile): tile for tile in tiles}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                tile = pending.pop(future)
+                images, truncated = future.result()
+                new = 0
+                for img in images:
+                    if img["id"] not in seen:
+                        seen.add(img["id"])
+                        all_images.append(img)
+                        new += 1
+
+                note = ""
+                if truncated and tile.z < MAX_ZOOM:
+                    splits += 1
+                    children = [child for child in mercantile.children(tile) if _clip_to_bbox(child)]
+                    for child in children:
+                        pending[pool.submit(query_tile, child)] = child
+                    note = f" (hit {QUERY_LIMIT} limit, splitting into {len(children)})"
+                elif truncated:
+                    note = f" (hit {QUERY_LIMIT} limit at max zoom {MAX_ZOOM}; some images missed)"
+                print(f"  Tile z{tile.z}/{tile.x}/{tile.y}: {new} new images{note}")
+
+    all_images.sort(key=lambda img: img["id"])
+    print(f"Total: {len(all_images)} unique images from {_query_stats['requests']} requests "
+          f"({_query_stats['retries']} retries, {splits} tiles split) in {time.time() - start:.1f}s")
     return all_images
 
 
@@ -118,53 +240,106 @@ def save_metadata(images):
     print(f"Saved {meta_path} and {geo_path}")
 
 
-def download_images(images, resolution="thumb_original_url"):
-    """Download images to disk."""
+def is_complete_jpeg(path):
+    """True if path is a non-empty JPEG with both its start (FFD8) and end (FFD9) markers."""
+    try:
+        if os.path.getsize(path) < 4:
+            return False
+        with open(path, "rb") as f:
+            head = f.read(2)
+            f.seek(-2, os.SEEK_END)
+            return head == b"\xff\xd8" and f.read(2) == b"\xff\xd9"
+    except OSError:
+        return False
+
+
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+
+def _host_slot(url, limit):
+    """Semaphore limiting concurrent downloads from url's host to limit."""
+    key = (urlparse(url).netloc, limit)
+    with _host_slots_lock:
+        if key not in _host_slots:
+            _host_slots[key] = threading.Semaphore(limit)
+        return _host_slots[key]
+
+
+def download_image(url, filepath, image_id, per_host=PER_HOST_LIMIT):
+    """Download one image via a temp file, validated before it is renamed into place. Returns bytes written."""
+    with _host_slot(url, per_host):
+        # connections=1: a single plain GET, no Range probe (thumbnails are a few hundred KB)
+        download(url, filepath, label=image_id, connections=1, session=download_session(), verbose=False)
+    if not is_complete_jpeg(filepath):
+        os.unlink(filepath)
+        raise IOError("truncated or not a JPEG")
+    return os.path.getsize(filepath)
+
+
+def download_images(images, resolution="thumb_original_url", workers=DOWNLOAD_WORKERS, per_host=PER_HOST_LIMIT):
+    """Download images to disk in parallel, re-fetching existing files that are truncated."""
     img_dir = os.path.join(OUTPUT_DIR, "images")
     os.makedirs(img_dir, exist_ok=True)
 
-    total = len(images)
-    done = 0
+    jobs = []
+    existing = 0
     skipped = 0
-
     for img in images:
-        image_id = img["id"]
         url = img.get(resolution)
         if not url:
             skipped += 1
             continue
-
-        filepath = os.path.join(img_dir, f"{image_id}.jpg")
+        filepath = os.path.join(img_dir, f"{img['id']}.jpg")
         if os.path.exists(filepath):
-            done += 1
-            continue
-
-        try:
-            r = requests.get(url, stream=True, timeout=30)
-            r.raise_for_status()
-            with open(filepath, "wb") as f:
-                for chunk in r.iter_content(8192):
-                    f.write(chunk)
-            done += 1
-            if done % 25 == 0:
-                print(f"  Downloaded {done}/{total}")
-        except Exception as e:
-            print(f"  Error {image_id}: {e}")
-
-        time.sleep(0.05)
-
-    print(f"Downloaded {done}, skipped {skipped} (no URL)")
+            if is_complete_jpeg(filepath):
+                existing += 1
+                continue
+            print(f"  Re-downloading truncated {img['id']}")
+            os.unlink(filepath)
+        jobs.append((url, filepath, img["id"]))
+
+    print(f"  {existing} already on disk, {len(jobs)} to download ({workers} workers, {per_host} per host)")
+    start = time.time()
+    done = 0
+    failed = 0
+    total_bytes = 0
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(download_image, *job, per_host): job[2] for job in jobs}
+        for future in as_completed(futures):
+            try:
+                total_bytes += future.result()
+                done += 1
+            except Exception as e:
+                failed += 1
+                print(f"  Error {futures[future]}: {e}")
+            if (done + failed) % 25 == 0:
+                elapsed = max(time.time() - start, 1e-6)
+                print(f"  Downloaded {done}/{len(jobs)} ({done / elapsed:.1f} images/s, "
+                      f"{total_bytes / (1024 * 1024) / elapsed:.1f} MB/s)")
+
+    elapsed = max(time.time() - start, 1e-6)
+    print(f"Downloaded {done} ({total_bytes / (1024 * 1024):.1f} MB in {elapsed:.1f}s, "
+          f"{done / elapsed:.1f} images/s, {total_bytes / (1024 * 1024) / elapsed:.1f} MB/s), "
+          f"{existing} already present, {failed} failed, skipped {skipped} (no URL)")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download Mapillary panos for the Williamsburg bbox")
+    parser.add_argument("--rps", type=float, default=REQUESTS_PER_SECOND, help="Max Graph API requests per second")
+    parser.add_argument("--download-workers", type=int, default=DOWNLOAD_WORKERS, help="Parallel image downloads")
+    parser.add_argument("--per-host", type=int, default=PER_HOST_LIMIT, help="Max concurrent downloads per CDN host")
+    args = parser.parse_args()
+
     print("=== Mapillary Williamsburg Pano Fetcher ===\n")
 
     # Step 1: Query
-    images = query_all_tiles(is_pano=True)
+    images = query_all_tiles(is_pano=True, rps=args.rps)
 
     if not images:
         print("No panoramic images found. Trying all image types...")
-        images = query_all_tiles(is_pano=False)
+        images = query_all_tiles(is_pano=False, rps=args.rps)
 
     if not images:
         sys.exit("No images found in the bounding box.")
@@ -174,6 +349,6 @@ if __name__ == "__main__":
 
     # Step 3: Download
     print(f"\nDownloading {len(images)} images...")
-    download_images(images)
+    download_images(images, workers=args.download_workers, per_host=args.per_host)
 
     print("\nDone!")
@@ -15,20 +15,56 @@ Usage:
 import argparse
 import json
 import os
+import threading
 import requests
 import numpy as np
 from PIL import Image
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from io import BytesIO
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+
+from pano_graph import DEFAULT_DB_PATH, PanoGraph, haversine_m
+from projection import INTERPOLATIONS, View, equirect_to_perspectives, set_plan_cache_dir, view_footprint
+from tile_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_MB, TILE_SIZE, TileCache, default_tile_cache, set_default_tile_cache
 
 
 API_KEY = os.environ.get("GOOGLE_MAPS_API_KEY", "")
 BASE_URL = "https://tile.googleapis.com/v1"
 
+TILE_FETCH_WORKERS = 16
+TILE_TIMEOUT_S = 30
+
+CRAWL_MODES = ("line", "bfs", "corridor")
+CRAWL_WORKERS = 8
+
+_http: requests.Session | None = None
+_http_pool_size = 0
+_http_lock = threading.Lock()
+
+
+def http_session(pool_size: int = 0) -> requests.Session:
+    """Shared keep-alive HTTP session for Map Tiles API calls.
+
+    Callers about to run N worker threads pass pool_size=N; the connection pool
+    is remounted larger whenever that exceeds its current size, so every thread
+    gets its own pooled connection instead of "Connection pool is full" churn.
+    """
+    global _http, _http_pool_size
+    with _http_lock:
+        if _http is None:
+            _http = requests.Session()
+        pool_size = max(pool_size, TILE_FETCH_WORKERS, 10)
+        if pool_size > _http_pool_size:
+            _http.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=pool_size))
+            _http_pool_size = pool_size
+        return _http
+
 
 def create_session(api_key: str) -> str:
     """Create a Street View tiles session token."""
-    resp = requests.post(
+    resp = http_session().post(
         f"{BASE_URL}/createSession?key={api_key}",
         json={
             "mapType": "streetview",
@@ -44,7 +80,7 @@ def create_session(api_key: str) -> str:
 
 def get_pano_id(api_key: str, session: str, lat: float, lng: float, radius: int = 50) -> str | None:
     """Get a pano ID from coordinates."""
-    resp = requests.post(
+    resp = http_session().post(
         f"{BASE_URL}/streetview/panoIds?session={session}&key={api_key}",
         json={
             "locations": [{"lat": lat, "lng": lng}],
@@ -61,7 +97,7 @@ def get_pano_id(api_key: str, session: str, lat: float, lng: float, radius: int
 
 def get_metadata(api_key: str, session: str, pano_id: str) -> dict:
     """Get metadata for a pano including links to adjacent panos."""
-    resp = requests.get(
+    resp = http_session().get(
         f"{BASE_URL}/streetview/metadata",
         params={
             "session": session,
@@ -81,19 +117,63 @@ def fetch_tile(
     x: int,
     y: int,
 ) -> bytes:
-    """Fetch a single panorama tile at zoom/x/y."""
-    resp = requests.get(
+    """Fetch a single panorama tile at zoom/x/y, via the shared on-disk tile cache."""
+    cache = default_tile_cache()
+    if cache is not None:
+        cached = cache.get(pano_id, zoom, x, y)
+        if cached is not None:
+            return cached
+
+    resp = http_session().get(
         f"{BASE_URL}/streetview/tiles/{zoom}/{x}/{y}",
         params={
             "session": session,
             "key": api_key,
             "panoId": pano_id,
         },
+        timeout=TILE_TIMEOUT_S,
     )
     resp.raise_for_status()
+    if cache is not None:
+        cache.put(pano_id, zoom, x, y, resp.content)
     return resp.content
 
 
+def load_tile_image(
+    api_key: str,
+    session: str,
+    pano_id: str,
+    zoom: int,
+    x: int,
+    y: int,
+    tile_px: int = TILE_SIZE,
+) -> Image.Image:
+    """
+    Get tile zoom/x/y as a tile_px x tile_px RGB image, fetching only if needed.
+
+    Order: exact tile in the cache, then a tile synthesized from cached
+    higher-zoom tiles, then the network. tile_px < TILE_SIZE decodes at a
+    reduced JPEG draft scale.
+    """
+    cache = default_tile_cache()
+    if cache is not None and not cache.has(pano_id, zoom, x, y):
+        img = cache.synthesize(pano_id, zoom, x, y, tile_px)
+        if img is not None:
+            return img
+
+    tile_bytes = fetch_tile(api_key, session, pano_id, zoom, x, y)
+    img = Image.open(BytesIO(tile_bytes))
+    if tile_px != TILE_SIZE:
+        img.draft("RGB", (tile_px, tile_px))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if img.size != (tile_px, tile_px):
+        if tile_px == TILE_SIZE:
+            raise ValueError(f"Unexpected tile size {img.size} for z{zoom}/x{x}/y{y}")
+        img = img.resize((tile_px, tile_px), Image.BOX)
+    return img
+
+
 def fetch_thumbnail(
     api_key: str,
     session: str,
@@ -105,7 +185,7 @@ def fetch_thumbnail(
     height: int = 512,
 ) -> bytes:
     """Fetch a perspective thumbnail crop from a panorama."""
-    resp = requests.get(
+    resp = http_session().get(
         f"{BASE_URL}/streetview/thumbnail",
         params={
             "session": session,
@@ -122,56 +202,169 @@ def fetch_thumbnail(
     return resp.content
 
 
+def _heading_diff(a: float, b: float) -> float:
+    """Smallest absolute difference between two compass headings."""
+    return abs((a - b + 180) % 360 - 180)
+
+
+def _pano_info(pano_id: str, meta: dict) -> dict:
+    return {
+        "pano_id": pano_id,
+        "lat": meta.get("lat"),
+        "lng": meta.get("lng"),
+        "heading": meta.get("heading", 0),
+        "date": meta.get("date", ""),
+        "image_width": meta.get("imageWidth"),
+        "image_height": meta.get("imageHeight"),
+        "links": meta.get("links", []),
+    }
+
+
+def _save_frontier(path: str, state: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
 def crawl_street(
     api_key: str,
     session: str,
     start_pano_id: str,
     num_panos: int = 15,
+    mode: str = "line",
+    max_workers: int = CRAWL_WORKERS,
+    max_distance_m: float | None = None,
+    corridor_heading: float | None = None,
+    corridor_tolerance: float = 30.0,
+    frontier_path: str | None = None,
+    graph: PanoGraph | None = None,
 ) -> list[dict]:
     """
-    Crawl along a street from a starting pano, collecting adjacent panos.
-    Follows the first link (main road direction) at each step.
+    Crawl the Street View link graph from a starting pano, collecting adjacent panos.
+
+    Modes:
+        line: follow the first unvisited link (main road direction) at each step.
+        bfs: explore all links breadth-first.
+        corridor: breadth-first, but only along links within corridor_tolerance
+            degrees of corridor_heading (default: the start pano's heading) or
+            its reverse, i.e. both directions along one street.
+
+    Metadata for queued panos is fetched ahead on a pool of max_workers threads,
+    so bfs/corridor crawls run that many requests in parallel. Panos further
+    than max_distance_m from the start are dropped and not expanded. Stops
+    after num_panos panos in total.
+
+    If frontier_path is given, the crawl resumes from the panos, queue and
+    seen-set saved there, and writes its state back when it stops, so a
+    later call with a larger num_panos picks up where this one left off.
+
+    If graph is given, panos already in the local pano graph are read from it
+    instead of calling get_metadata, and newly fetched panos are written back.
+
     Returns list of {pano_id, lat, lng, heading, links} dicts.
     """
-    visited = set()
-    panos = []
-    current_id = start_pano_id
-
-    for i in range(num_panos):
-        if current_id in visited:
-            print(f"  Loop detected at pano {i}, stopping")
-            break
-
-        visited.add(current_id)
-        meta = get_metadata(api_key, session, current_id)
-
-        pano_info = {
-            "pano_id": current_id,
-            "lat": meta.get("lat"),
-            "lng": meta.get("lng"),
-            "heading": meta.get("heading", 0),
-            "date": meta.get("date", ""),
-            "image_width": meta.get("imageWidth"),
-            "image_height": meta.get("imageHeight"),
-            "links": meta.get("links", []),
-        }
-        panos.append(pano_info)
-        print(f"  [{i+1}/{num_panos}] pano={current_id[:12]}... lat={pano_info['lat']:.6f} lng={pano_info['lng']:.6f} links={len(pano_info['links'])}")
-
-        # Follow the first unvisited link to continue along the street
-        links = meta.get("links", [])
-        next_id = None
-        for link in links:
-            link_id = link.get("panoId")
-            if link_id and link_id not in visited:
-                next_id = link_id
-                break
-
-        if next_id is None:
-            print(f"  No unvisited links from pano {i+1}, stopping")
-            break
-
-        current_id = next_id
+    if mode not in CRAWL_MODES:
+        raise ValueError(f"Unknown crawl mode {mode!r}, expected one of {CRAWL_MODES}")
+
+    panos: list[dict] = []
+    frontier: deque[str] = deque([start_pano_id])
+    seen = {start_pano_id}
+
+    if frontier_path and os.path.exists(frontier_path):
+        with open(frontier_path) as f:
+            state = json.load(f)
+        panos = state["panos"]
+        frontier = deque(state["frontier"])
+        seen = set(state["seen"])
+        corridor_heading = state.get("corridor_heading", corridor_heading)
+        print(f"  Resuming crawl: {len(panos)} panos, {len(frontier)} queued")
+
+    origin = (panos[0]["lat"], panos[0]["lng"]) if panos else None
+    if corridor_heading is None and panos:
+        corridor_heading = panos[0]["heading"]
+
+    pending: dict[str, Future] = {}
+    fetched: set[str] = set()
+    pool = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    http_session(max_workers)
+
+    def fetch_pano(pano_id: str) -> dict:
+        return _pano_info(pano_id, get_metadata(api_key, session, pano_id))
+
+    def prefetch():
+        for pano_id in list(frontier)[:max_workers * 2]:
+            if pano_id in pending:
+                continue
+            stored = graph.get(pano_id) if graph is not None else None
+            if stored is not None:
+                pending[pano_id] = Future()
+                pending[pano_id].set_result(stored)
+            else:
+                pending[pano_id] = pool.submit(fetch_pano, pano_id)
+                fetched.add(pano_id)
+
+    try:
+        while frontier and len(panos) < num_panos:
+            prefetch()
+            # Dequeue only once the metadata is in hand, so an error or Ctrl-C here
+            # leaves current_id in the saved frontier and a resumed crawl retries it
+            current_id = frontier[0]
+            pano_info = pending[current_id].result()
+            frontier.popleft()
+            del pending[current_id]
+            if graph is not None and current_id in fetched:
+                graph.put(pano_info)
+
+            if origin is None:
+                origin = (pano_info["lat"], pano_info["lng"])
+                if corridor_heading is None:
+                    corridor_heading = pano_info["heading"]
+            if max_distance_m is not None:
+                dist = haversine_m(origin[0], origin[1], pano_info["lat"], pano_info["lng"])
+                if dist > max_distance_m:
+                    print(f"  Skipping pano={current_id[:12]}... ({dist:.0f}m from start)")
+                    continue
+
+            panos.append(pano_info)
+            print(f"  [{len(panos)}/{num_panos}] pano={current_id[:12]}... lat={pano_info['lat']:.6f} lng={pano_info['lng']:.6f} links={len(pano_info['links'])}")
+
+            next_ids = []
+            for link in pano_info["links"]:
+                link_id = link.get("panoId")
+                if not link_id or link_id in seen:
+                    continue
+                if mode == "corridor" and "heading" in link:
+                    off_axis = min(
+                        _heading_diff(link["heading"], corridor_heading),
+                        _heading_diff(link["heading"], corridor_heading + 180),
+                    )
+                    if off_axis > corridor_tolerance:
+                        continue
+                next_ids.append(link_id)
+            if mode == "line":
+                next_ids = next_ids[:1]
+
+            for link_id in next_ids:
+                seen.add(link_id)
+                frontier.append(link_id)
+
+        if not frontier and len(panos) < num_panos:
+            print(f"  No unvisited links after {len(panos)} panos, stopping")
+        if graph is not None:
+            from_api = sum(1 for p in panos if p["pano_id"] in fetched)
+            print(f"  Metadata: {len(panos) - from_api} from pano graph, {from_api} from API")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        if frontier_path:
+            _save_frontier(frontier_path, {
+                "start_pano_id": start_pano_id,
+                "mode": mode,
+                "corridor_heading": corridor_heading,
+                "panos": panos,
+                "frontier": list(frontier),
+                "seen": sorted(seen),
+            })
 
     return panos
 
@@ -191,6 +384,7 @@ def fetch_pano_tiles(
     At zoom 3: 8 x-tiles (each 45° FOV) × 4 y-tiles.
     y=0 is sky, y=1 is upper street, y=2 is lower street, y=3 is ground.
     For 3D reconstruction, y=1 and y=2 are most useful (street-level content).
+    Tiles missing from the cache are built from cached higher zooms when possible.
     """
     if y_rows is None:
         y_rows = [1, 2]  # Street-level rows by default
@@ -198,14 +392,21 @@ def fetch_pano_tiles(
     # Number of x tiles at each zoom: 2^zoom
     x_count = 2 ** zoom
 
+    cache = default_tile_cache()
     paths = []
     for y in y_rows:
         for x in range(x_count):
-            img_bytes = fetch_tile(api_key, session, pano_id, zoom, x, y)
             filename = f"{prefix}z{zoom}_x{x}_y{y}.jpg"
             filepath = os.path.join(output_dir, filename)
-            with open(filepath, "wb") as f:
-                f.write(img_bytes)
+            synthesized = None
+            if cache is not None and not cache.has(pano_id, zoom, x, y):
+                synthesized = cache.synthesize(pano_id, zoom, x, y)
+            if synthesized is not None:
+                synthesized.save(filepath, quality=95)
+            else:
+                img_bytes = fetch_tile(api_key, session, pano_id, zoom, x, y)
+                with open(filepath, "wb") as f:
+                    f.write(img_bytes)
             paths.append(filepath)
     return paths
 
@@ -260,65 +461,27 @@ def fetch_forward_views(
     return paths
 
 
-def equirect_to_perspective(
-    equirect: np.ndarray,
-    heading_deg: float,
-    pitch_deg: float = 0.0,
-    fov_deg: float = 90.0,
-    out_size: int = 512,
-) -> np.ndarray:
+def plan_view_tiles(views: list[View], zoom: int) -> set[tuple[int, int]]:
     """
-    Extract a perspective (rectilinear) crop from an equirectangular panorama.
+    Minimal set of (x, y) tiles at `zoom` that a set of crop views samples from.
 
-    Args:
-        equirect: HxWx3 uint8 array (equirectangular panorama, 2:1 aspect)
-        heading_deg: Horizontal angle in degrees (0=front, 90=right, etc.)
-        pitch_deg: Vertical angle in degrees (0=horizon, +up, -down)
-        fov_deg: Field of view in degrees
-        out_size: Output image size (square)
-
-    Returns:
-        out_size x out_size x 3 uint8 array
+    Views are (heading, pitch, fov, out_size) as for equirect_to_perspectives.
+    Street-level crop sets rarely need the sky and ground rows.
     """
-    h_eq, w_eq = equirect.shape[:2]
-
-    heading = np.radians(heading_deg)
-    pitch = np.radians(pitch_deg)
-    fov = np.radians(fov_deg)
-
-    f = (out_size / 2) / np.tan(fov / 2)
-
-    u = np.arange(out_size, dtype=np.float64) - out_size / 2
-    v = np.arange(out_size, dtype=np.float64) - out_size / 2
-    uu, vv = np.meshgrid(u, v)
-
-    x = uu
-    y = vv
-    z = np.full_like(uu, f)
-
-    norm = np.sqrt(x**2 + y**2 + z**2)
-    x, y, z = x / norm, y / norm, z / norm
-
-    cos_p, sin_p = np.cos(-pitch), np.sin(-pitch)
-    y2 = cos_p * y - sin_p * z
-    z2 = sin_p * y + cos_p * z
-    y, z = y2, z2
-
-    cos_h, sin_h = np.cos(heading), np.sin(heading)
-    x2 = cos_h * x + sin_h * z
-    z2 = -sin_h * x + cos_h * z
-    x, z = x2, z2
-
-    lon = np.arctan2(x, z)
-    lat = np.arcsin(np.clip(y, -1, 1))
-
-    eq_x = ((lon / np.pi + 1) / 2 * w_eq).astype(np.float64)
-    eq_y = ((lat / (np.pi / 2) + 1) / 2 * h_eq).astype(np.float64)
+    x_count = 2 ** zoom
+    y_count = max(1, 2 ** (zoom - 1))
+    eq_shape = (y_count * TILE_SIZE, x_count * TILE_SIZE)
+    return view_footprint(eq_shape, views, TILE_SIZE)
 
-    eq_x = np.clip(eq_x, 0, w_eq - 1).astype(int)
-    eq_y = np.clip(eq_y, 0, h_eq - 1).astype(int)
 
-    return equirect[eq_y, eq_x]
+def draft_reduction(zoom: int, target_width: int | None) -> int:
+    """Largest JPEG draft scale (1, 2, 4 or 8) that keeps the equirect >= target_width."""
+    reduce = 1
+    if target_width:
+        full_width = (2 ** zoom) * TILE_SIZE
+        while reduce < 8 and full_width // (reduce * 2) >= target_width:
+            reduce *= 2
+    return reduce
 
 
 def stitch_pano_tiles(
@@ -326,21 +489,60 @@ def stitch_pano_tiles(
     session: str,
     pano_id: str,
     zoom: int = 3,
+    max_workers: int = TILE_FETCH_WORKERS,
+    out_path: str | None = None,
+    target_width: int | None = None,
+    tiles: set[tuple[int, int]] | None = None,
 ) -> np.ndarray:
-    """Fetch all tiles for a pano and stitch into a full equirectangular image."""
+    """
+    Fetch all tiles for a pano and stitch into a full equirectangular image.
+
+    Tiles are fetched concurrently (up to max_workers in flight) over the
+    shared keep-alive session, and each one is decoded straight into its slot
+    of an equirect array allocated once up front. Tiles already in the tile
+    cache, or derivable from cached higher-zoom tiles, cost no requests.
+
+    Args:
+        out_path: If set, the equirect is a .npy memmap at this path instead of
+            an in-memory array (a zoom-5 pano is ~400 MB).
+        target_width: If set, tiles are decoded at a reduced JPEG draft scale
+            (1/2, 1/4 or 1/8) as long as the equirect stays at least this wide.
+        tiles: If set, only these (x, y) tiles are fetched (see plan_view_tiles)
+            and the rest of the equirect is left black.
+    """
     x_count = 2 ** zoom
     y_count = max(1, 2 ** (zoom - 1))
+    tile_px = TILE_SIZE // draft_reduction(zoom, target_width)
+
+    shape = (y_count * tile_px, x_count * tile_px, 3)
+    if out_path:
+        # New memmaps are zero-filled, so a sparse canvas costs nothing extra
+        equirect = np.lib.format.open_memmap(out_path, mode="w+", dtype=np.uint8, shape=shape)
+    elif tiles is not None:
+        equirect = np.zeros(shape, dtype=np.uint8)
+    else:
+        equirect = np.empty(shape, dtype=np.uint8)
 
-    rows = []
-    for y in range(y_count):
-        row_tiles = []
-        for x in range(x_count):
-            tile_bytes = fetch_tile(api_key, session, pano_id, zoom, x, y)
-            tile_img = Image.open(BytesIO(tile_bytes))
-            row_tiles.append(np.array(tile_img))
-        rows.append(np.concatenate(row_tiles, axis=1))
+    if tiles is None:
+        tiles = {(x, y) for y in range(y_count) for x in range(x_count)}
+
+    def load_tile(x: int, y: int):
+        img = load_tile_image(api_key, session, pano_id, zoom, x, y, tile_px)
+        equirect[y * tile_px:(y + 1) * tile_px, x * tile_px:(x + 1) * tile_px] = np.asarray(img)
+
+    http_session(max_workers)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = [pool.submit(load_tile, x, y) for x, y in sorted(tiles, key=lambda t: (t[1], t[0]))]
+        try:
+            for future in as_completed(futures):
+                future.result()
+        except BaseException:
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
 
-    return np.concatenate(rows, axis=0)
+    if isinstance(equirect, np.memmap):
+        equirect.flush()
+    return equirect
 
 
 def fetch_overlapping_crops(
@@ -353,6 +555,8 @@ def fetch_overlapping_crops(
     crop_size: int = 512,
     zoom: int = 3,
     output_dir: str = ".",
+    interpolation: str = "bilinear",
+    tile_workers: int = TILE_FETCH_WORKERS,
 ) -> list[str]:
     """
     Fetch pano tiles, stitch into equirectangular, then extract overlapping
@@ -360,6 +564,8 @@ def fetch_overlapping_crops(
 
     With FOV=90 and heading_step=45, adjacent crops share 50% horizontal overlap.
     Multiple pitch values provide vertical coverage (road to upper buildings).
+    Interpolated sampling ("bilinear"/"bicubic"/"area") gives usable crops
+    from a lower zoom than nearest sampling would need.
     """
     if pitches is None:
         pitches = [-20.0, 0.0, 20.0]
@@ -368,24 +574,36 @@ def fetch_overlapping_crops(
     overlap_pct = max(0, (fov - heading_step) / fov * 100)
     x_count = 2 ** zoom
     y_count = max(1, 2 ** (zoom - 1))
-    tiles_per_pano = x_count * y_count
+
+    views = [
+        (float(heading), pitch, float(fov), crop_size)
+        for pitch in pitches
+        for heading in headings
+    ]
+    # The crop set is the same for every pano, so plan its tiles once
+    tiles = plan_view_tiles(views, zoom)
+    tiles_per_pano = len(tiles)
+    tiles_saved = x_count * y_count - tiles_per_pano
 
     print(f"  Headings: {headings} (FOV={fov}, step={heading_step} -> {overlap_pct:.0f}% overlap)")
-    print(f"  Pitches: {pitches}")
-    print(f"  Tiles per pano: {tiles_per_pano} (zoom {zoom}, {x_count}x{y_count})")
+    print(f"  Pitches: {pitches}, interpolation: {interpolation}")
+    print(f"  Tiles per pano: {tiles_per_pano} of {x_count * y_count} (zoom {zoom}, {tiles_saved} not needed by crops)")
     print(f"  Crops per pano: {len(headings)} x {len(pitches)} = {len(headings) * len(pitches)}")
     print(f"  Total crops: {len(panos)} panos x {len(headings) * len(pitches)} = {len(panos) * len(headings) * len(pitches)}")
 
     paths = []
     for i, pano in enumerate(panos):
         print(f"  [{i+1}/{len(panos)}] Fetching {tiles_per_pano} tiles for pano {pano['pano_id'][:12]}...")
-        equirect = stitch_pano_tiles(api_key, session, pano["pano_id"], zoom)
+        equirect = stitch_pano_tiles(
+            api_key, session, pano["pano_id"], zoom, max_workers=tile_workers, tiles=tiles,
+        )
         print(f"    Stitched: {equirect.shape[1]}x{equirect.shape[0]}")
 
+        crops = iter(equirect_to_perspectives(equirect, views, interpolation))
+
         for pitch in pitches:
             for heading in headings:
-                crop = equirect_to_perspective(equirect, float(heading), pitch, float(fov), crop_size)
-                crop_img = Image.fromarray(crop)
+                crop_img = Image.fromarray(next(crops))
                 if pitch < 0:
                     pitch_str = f"dn{abs(int(pitch)):02d}"
                 elif pitch > 0:
@@ -409,11 +627,33 @@ def main():
     parser.add_argument("--lng", type=float, default=-73.9865227, help="Longitude")
     parser.add_argument("--num-panos", type=int, default=15, help="Number of panos to crawl")
     parser.add_argument("--zoom", type=int, default=3, help="Tile zoom level (0-5)")
+    parser.add_argument(
+        "--crawl", type=str, default="line", choices=CRAWL_MODES,
+        help="'line': follow first link. 'bfs': all links. 'corridor': bfs along the start heading"
+    )
+    parser.add_argument("--crawl-workers", type=int, default=CRAWL_WORKERS, help="Concurrent metadata requests")
+    parser.add_argument("--max-distance", type=float, default=None, help="Max crawl distance from start (m)")
+    parser.add_argument("--frontier", type=str, default=None, help="Crawl state file to resume from / save to")
+    parser.add_argument("--pano-graph", type=str, default=DEFAULT_DB_PATH, help="Local pano graph (SQLite)")
+    parser.add_argument("--no-pano-graph", action="store_true", help="Always fetch pano metadata from the API")
     parser.add_argument(
         "--mode", type=str, default="forward",
         choices=["forward", "tiles", "overlap"],
         help="'forward': one per pano. 'tiles': tile grid. 'overlap': overlapping thumbnails for COLMAP"
     )
+    parser.add_argument(
+        "--interpolation", type=str, default="bilinear", choices=INTERPOLATIONS,
+        help="Crop sampling (overlap mode only). 'area' antialiases when downsampling"
+    )
+    parser.add_argument(
+        "--tile-workers", type=int, default=TILE_FETCH_WORKERS,
+        help="Concurrent tile requests when stitching panos (overlap mode)"
+    )
+    parser.add_argument("--tile-cache-dir", type=str, default=DEFAULT_CACHE_DIR, help="On-disk tile cache directory")
+    parser.add_argument("--tile-cache-max-mb", type=int, default=DEFAULT_MAX_MB, help="Tile cache size bound in MB")
+    parser.add_argument("--no-tile-cache", action="store_true", help="Always fetch tiles from the API")
+    parser.add_argument("--plan-cache-dir", type=str, default=None,
+                        help="Persist projection plans here across runs (overlap mode)")
     parser.add_argument("--y-rows", type=str, default="1,2", help="Y tile rows (tiles mode only)")
     parser.add_argument("--output-dir", type=str, default="data/streetview", help="Output directory")
     parser.add_argument("--api-key", type=str, default="", help="Google Maps API key (or set GOOGLE_MAPS_API_KEY)")
@@ -424,6 +664,12 @@ def main():
         print("Error: Set GOOGLE_MAPS_API_KEY env var or pass --api-key")
         return
 
+    if args.no_tile_cache:
+        set_default_tile_cache(None)
+    else:
+        set_default_tile_cache(TileCache(args.tile_cache_dir, args.tile_cache_max_mb * 1024 * 1024))
+    set_plan_cache_dir(args.plan_cache_dir)
+
     print(f"Starting at ({args.lat}, {args.lng})")
     print(f"Mode: {args.mode}, Crawling {args.num_panos} panos, zoom {args.zoom}")
     print(f"Output: {args.output_dir}")
@@ -440,8 +686,16 @@ def main():
     print(f"Found starting pano: {start_pano}")
 
     # Crawl along street
-    print(f"\nCrawling {args.num_panos} panos along street...")
-    panos = crawl_street(api_key, session, start_pano, args.num_panos)
+    graph = None if args.no_pano_graph else PanoGraph(args.pano_graph)
+    print(f"\nCrawling {args.num_panos} panos along street ({args.crawl})...")
+    panos = crawl_street(
+        api_key, session, start_pano, args.num_panos,
+        mode=args.crawl,
+        max_workers=args.crawl_workers,
+        max_distance_m=args.max_distance,
+        frontier_path=args.frontier,
+        graph=graph,
+    )
     print(f"Collected {len(panos)} panos")
 
     # Create output directory
@@ -470,6 +724,8 @@ def main():
             pitches=pitches,
             zoom=args.zoom,
             output_dir=str(output_dir),
+            interpolation=args.interpolation,
+            tile_workers=args.tile_workers,
         )
     else:
         # Full tile grid per pano (old behavior)
@@ -510,6 +766,9 @@ def main():
     print(f"  Metadata: {meta_path}")
     print(f"\nAPI requests used: ~{1 + len(panos) + len(all_images)} "
           f"(1 panoId + {len(panos)} metadata + {len(all_images)} tiles)")
+    cache = default_tile_cache()
+    if cache is not None:
+        print(f"  {cache.report()}")
 
 
 if __name__ == "__main__":
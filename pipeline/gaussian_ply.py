@@ -0,0 +1,281 @@
+"""
+Streaming binary .ply writer / reader for gaussian splats.
+
+AnySplat's export_ply copies every attribute to NumPy, concatenates them and
+builds a structured array before writing, so a multi-million-gaussian scene
+briefly holds several full copies of itself in host memory.
+write_gaussians_ply instead converts and writes fixed-size chunks straight
+from the (GPU or CPU) tensors through one reused float32 buffer, so peak
+memory is bounded by the chunk size, not the scene size.
+
+The output matches export_ply(..., shift_and_scale=False, save_sh_dc_only=True)
+and what the viewer loads: per vertex x y z, nx ny nz (zero), f_dc_0..2,
+[f_rest_*], opacity (logit), scale_0..2 (log), rot_0..3 (w, x, y, z), all
+float32. The header is written up front with a fixed-width vertex count that
+is patched once the number of gaussians surviving pruning is known.
+
+Usage:
+    # Peak memory + throughput: streaming writer vs one-shot structured array
+    python pipeline/gaussian_ply.py --benchmark --gaussians 2000000
+
+    # Inspect a .ply
+    python pipeline/gaussian_ply.py data/splats/scene.ply
+"""
+
+import argparse
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+
+CHUNK_GAUSSIANS = 1 << 18  # 262144 gaussians, ~18 MB of float32 rows per chunk
+COUNT_WIDTH = 12  # digits reserved for the vertex count in the header
+OPACITY_EPS = 1e-6
+
+
+def ply_properties(num_rest: int = 0) -> list[str]:
+    """Vertex property names in file order."""
+    names = ["x", "y", "z", "nx", "ny", "nz", "f_dc_0", "f_dc_1", "f_dc_2"]
+    names += [f"f_rest_{i}" for i in range(num_rest)]
+    names += ["opacity", "scale_0", "scale_1", "scale_2", "rot_0", "rot_1", "rot_2", "rot_3"]
+    return names
+
+
+def _header(properties: list[str], count: int) -> bytes:
+    lines = ["ply", "format binary_little_endian 1.0", f"element vertex {count:0{COUNT_WIDTH}d}"]
+    lines += [f"property float {name}" for name in properties]
+    lines.append("end_header")
+    return ("\n".join(lines) + "\n").encode("ascii")
+
+
+def _to_numpy(x, start: int, end: int) -> np.ndarray:
+    """Rows [start, end) of a torch tensor or array as a float32 NumPy copy (safe to modify)."""
+    chunk = x[start:end]
+    if hasattr(chunk, "detach"):
+        chunk = chunk.detach().float().cpu().numpy()
+    return np.array(chunk, dtype=np.float32)
+
+
+def write_gaussians_ply(
+    path: str | os.PathLike,
+    means,
+    scales,
+    rotations,
+    harmonics,
+    opacities,
+    sh_dc_only: bool = True,
+    min_opacity: float = 0.0,
+    chunk_size: int = CHUNK_GAUSSIANS,
+) -> dict:
+    """
+    Write gaussians to a binary .ply in chunks.
+
+    Tensors may be torch (any device) or NumPy and are only read a chunk at
+    a time. Values are activated, as AnySplat returns them.
+
+    Args:
+        path: output .ply
+        means: (N, 3) positions
+        scales: (N, 3) scales (written as log)
+        rotations: (N, 4) quaternions, x y z w (written normalized as w x y z)
+        harmonics: (N, 3, K) SH coefficients; band 0 is the DC color
+        opacities: (N,) opacities in [0, 1] (written as logit)
+        sh_dc_only: drop SH bands above 0
+        min_opacity: skip gaussians with opacity below this (0 keeps all)
+        chunk_size: gaussians per write
+
+    Returns:
+        Dict with num_gaussians (written), num_pruned, file_size_mb, write_time_s
+    """
+    t0 = time.time()
+    total = int(means.shape[0])
+    num_rest = 0 if sh_dc_only else 3 * (int(harmonics.shape[-1]) - 1)
+    properties = ply_properties(num_rest)
+    rest_end = 9 + num_rest
+
+    buf = np.zeros((min(chunk_size, max(total, 1)), len(properties)), dtype=np.float32)
+    written = 0
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_header(properties, 0))
+        for start in range(0, total, chunk_size):
+            end = min(start + chunk_size, total)
+            rows = buf[:end - start]
+
+            opacity = _to_numpy(opacities, start, end).reshape(-1)
+            keep = opacity >= min_opacity if min_opacity > 0 else None
+
+            rows[:, 0:3] = _to_numpy(means, start, end)
+            # columns 3:6 (normals) stay zero
+            sh = _to_numpy(harmonics, start, end)
+            rows[:, 6:9] = sh[:, :, 0]
+            if num_rest:
+                rows[:, 9:rest_end] = sh[:, :, 1:].reshape(len(rows), -1)
+            np.clip(opacity, OPACITY_EPS, 1 - OPACITY_EPS, out=opacity)
+            rows[:, rest_end] = np.log(opacity / (1 - opacity))
+            np.log(np.maximum(_to_numpy(scales, start, end), 1e-12), out=rows[:, rest_end + 1:rest_end + 4])
+            quat = _to_numpy(rotations, start, end)
+            quat /= np.maximum(np.linalg.norm(quat, axis=1, keepdims=True), 1e-12)
+            rows[:, rest_end + 4] = quat[:, 3]
+            rows[:, rest_end + 5:rest_end + 8] = quat[:, :3]
+
+            if keep is not None:
+                rows = rows[keep]
+            f.write(memoryview(np.ascontiguousarray(rows)).cast("B"))
+            written += len(rows)
+
+        f.seek(0)
+        f.write(_header(properties, written))
+    os.replace(tmp_path, path)
+
+    return {
+        "num_gaussians": written,
+        "num_pruned": total - written,
+        "file_size_mb": round(os.path.getsize(path) / (1024 * 1024), 1),
+        "write_time_s": round(time.time() - t0, 2),
+    }
+
+
+def read_ply_header(f) -> tuple[int, list[str], int]:
+    """(vertex count, property names, header length) of a binary little-endian float .ply."""
+    count, properties = 0, []
+    line = f.readline()
+    if line.strip() != b"ply":
+        raise ValueError("Not a .ply file")
+    while True:
+        line = f.readline()
+        if not line:
+            raise ValueError("Truncated .ply header")
+        parts = line.decode("ascii").split()
+        if parts[:1] == ["format"] and parts[1] != "binary_little_endian":
+            raise ValueError(f"Unsupported .ply format {parts[1]}")
+        if parts[:2] == ["element", "vertex"]:
+            count = int(parts[2])
+        elif parts[:1] == ["property"]:
+            if parts[1] not in ("float", "float32"):
+                raise ValueError(f"Unsupported property type {parts[1]} for {parts[2]}")
+            properties.append(parts[2])
+        elif parts[:1] == ["end_header"]:
+            return count, properties, f.tell()
+
+
+def read_gaussians_ply(path: str | os.PathLike) -> dict[str, np.ndarray]:
+    """
+    Read a gaussian .ply back into activated arrays.
+
+    Returns:
+        Dict of means (N, 3), scales (N, 3), rotations (N, 4, x y z w),
+        harmonics (N, 3, K), opacities (N,)
+    """
+    with open(path, "rb") as f:
+        count, properties, offset = read_ply_header(f)
+    data = np.fromfile(path, dtype="<f4", offset=offset).reshape(count, len(properties))
+    col = {name: i for i, name in enumerate(properties)}
+
+    num_rest = sum(1 for name in properties if name.startswith("f_rest_"))
+    harmonics = np.empty((count, 3, 1 + num_rest // 3), dtype=np.float32)
+    harmonics[:, :, 0] = data[:, [col["f_dc_0"], col["f_dc_1"], col["f_dc_2"]]]
+    if num_rest:
+        first = col["f_rest_0"]
+        harmonics[:, :, 1:] = data[:, first:first + num_rest].reshape(count, 3, -1)
+
+    rot = data[:, [col["rot_1"], col["rot_2"], col["rot_3"], col["rot_0"]]]
+    return {
+        "means": data[:, [col["x"], col["y"], col["z"]]],
+        "scales": np.exp(data[:, [col["scale_0"], col["scale_1"], col["scale_2"]]]),
+        "rotations": rot,
+        "harmonics": harmonics,
+        "opacities": 1 / (1 + np.exp(-data[:, col["opacity"]])),
+    }
+
+
+def _write_one_shot(path: str, means, scales, rotations, harmonics, opacities):
+    """export_ply's approach: full NumPy copies, concatenate, structured array, single write."""
+    quat = rotations / np.linalg.norm(rotations, axis=1, keepdims=True)
+    opacity = np.clip(opacities, OPACITY_EPS, 1 - OPACITY_EPS)
+    attributes = np.concatenate([
+        means,
+        np.zeros_like(means),
+        harmonics[:, :, 0],
+        np.log(opacity / (1 - opacity))[:, None],
+        np.log(scales),
+        np.concatenate([quat[:, 3:], quat[:, :3]], axis=1),
+    ], axis=1).astype(np.float32)
+    properties = ply_properties(0)
+    elements = np.empty(len(means), dtype=[(name, "<f4") for name in properties])
+    for i, name in enumerate(properties):
+        elements[name] = attributes[:, i]
+    with open(path, "wb") as f:
+        f.write(_header(properties, len(means)))
+        f.write(elements.tobytes())
+
+
+def benchmark(num_gaussians: int, out_dir: str, min_opacity: float):
+    """Print peak traced memory, RSS growth and throughput for each writer."""
+    rng = np.random.default_rng(0)
+    scene = {
+        "means": rng.normal(size=(num_gaussians, 3)).astype(np.float32),
+        "scales": rng.uniform(0.001, 0.1, (num_gaussians, 3)).astype(np.float32),
+        "rotations": rng.normal(size=(num_gaussians, 4)).astype(np.float32),
+        "harmonics": rng.normal(size=(num_gaussians, 3, 1)).astype(np.float32),
+        "opacities": rng.uniform(0, 1, num_gaussians).astype(np.float32),
+    }
+    input_mb = sum(a.nbytes for a in scene.values()) / (1024 * 1024)
+    print(f"{num_gaussians:,} gaussians ({input_mb:.0f} MB of input arrays)")
+
+    # Streaming first: ru_maxrss is a high-water mark, so the one-shot spike must come last
+    writers = [("streaming", lambda p: write_gaussians_ply(p, **scene))]
+    if min_opacity > 0:
+        writers.append((f"streaming, prune <{min_opacity}",
+                        lambda p: write_gaussians_ply(p, **scene, min_opacity=min_opacity)))
+    writers.append(("one-shot structured", lambda p: _write_one_shot(p, **scene)))
+
+    os.makedirs(out_dir, exist_ok=True)
+    print(f"{'writer':<28} {'time':>7}  {'MB/s':>7}  {'peak extra':>10}  {'maxrss':>8}  {'file MB':>7}")
+    for name, write in writers:
+        path = os.path.join(out_dir, "benchmark.ply")
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        write(path)
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        # ru_maxrss is in KB on Linux
+        print(f"{name:<28} {elapsed:6.2f}s  {size_mb / elapsed:7.0f}  {peak / (1024 * 1024):8.0f}MB  "
+              f"{rss_after / 1024:6.0f}MB  {size_mb:7.1f}")
+        os.unlink(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming gaussian .ply writer")
+    parser.add_argument("ply", nargs="?", help=".ply to summarize")
+    parser.add_argument("--benchmark", action="store_true", help="Compare writers on synthetic gaussians")
+    parser.add_argument("--gaussians", type=int, default=2_000_000, help="Benchmark scene size")
+    parser.add_argument("--min-opacity", type=float, default=0.005, help="Benchmark pruning threshold")
+    parser.add_argument("--out-dir", type=str, default="/tmp", help="Benchmark scratch directory")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.gaussians, args.out_dir, args.min_opacity)
+    elif args.ply:
+        g = read_gaussians_ply(args.ply)
+        n = len(g["means"])
+        print(f"{args.ply}: {n:,} gaussians, SH bands {g['harmonics'].shape[2]}")
+        if n:
+            print(f"  bounds min {g['means'].min(axis=0).round(2)} max {g['means'].max(axis=0).round(2)}")
+            print(f"  opacity mean {g['opacities'].mean():.3f}, "
+                  f"{(g['opacities'] < 0.005).mean():.1%} below 0.005")
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
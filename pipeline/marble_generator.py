@@ -2,7 +2,10 @@
 Generate 3D worlds via World Labs Marble API from Street View panoramas.
 
 Stitches SV tiles into equirectangular panos, uploads to Marble,
-generates worlds, and downloads .spz files.
+generates worlds, and downloads .spz files. Uploads and generations are
+recorded by content hash in marble_ledger.py, so re-running the same pano
+reuses the earlier media assets and world instead of paying again
+(--no-ledger to force).
 
 Usage:
     # Test with one pano, draft quality (~$0.12)
@@ -10,6 +13,9 @@ Usage:
 
     # Use plus model (~$1.20)
     python pipeline/marble_generator.py --input-dir data/streetview-overlap --pano-index 0 --model plus
+
+    # Whole route: stitch pano N+1 while up to 4 Marble operations run
+    python pipeline/marble_generator.py --input-dir data/streetview-overlap --pano-range all --max-operations 4
 """
 
 import argparse
@@ -17,15 +23,26 @@ import base64
 import json
 import os
 import sys
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from io import BytesIO
 from pathlib import Path
+from typing import BinaryIO
 
 import requests
 
-# Import pano stitching from existing fetch script
+# Import pano stitching and projection from the shared pipeline modules
 sys.path.insert(0, str(Path(__file__).parent))
-from fetch_streetview import create_session, stitch_pano_tiles, equirect_to_perspective
+import downloader
+from fetch_streetview import create_session, plan_view_tiles, stitch_pano_tiles
+from marble_ledger import DEFAULT_LEDGER_PATH, MarbleLedger, content_sha256, default_ledger, set_default_ledger, world_key
+from operation_tracker import OperationTracker
+from pano_encoder import EXTENSIONS, FORMATS, encode_image
+from projection import INTERPOLATIONS, equirect_to_perspectives, set_plan_cache_dir
+from registry import Registry
+from tile_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_MB, TileCache, default_tile_cache, set_default_tile_cache
+from world_index import build_index
 
 MARBLE_BASE = "https://api.worldlabs.ai"
 GOOGLE_API_KEY = os.environ.get("GOOGLE_MAPS_API_KEY", "")
@@ -36,32 +53,63 @@ MODEL_MAP = {
     "plus": "Marble 0.1-plus",
 }
 
+MULTI_IMAGE_PROMPT = (
+    "A continuous street scene on St Marks Place in the East Village, NYC. "
+    "Brownstone buildings line both sides of the tree-lined street."
+)
 
-def stitch_and_save_pano(
+
+def stitch_pano_image(
     pano_id: str,
-    output_path: str,
     zoom: int = 3,
-) -> str:
-    """Fetch SV tiles, stitch into equirectangular, save as PNG."""
-    from PIL import Image
-    import numpy as np
-
+    target_width: int | None = None,
+    fmt: str = "png",
+    level: int = 6,
+    quality: int = 95,
+) -> BytesIO:
+    """Fetch SV tiles, stitch into equirectangular, and encode it in memory.
+
+    target_width decodes tiles at a reduced JPEG draft scale when the
+    pano only needs to be that wide (see stitch_pano_tiles). fmt / level /
+    quality select the encoder (see pano_encoder.encode_image). The returned
+    buffer is positioned at 0, ready to pass to upload_image.
+    """
     google_key = GOOGLE_API_KEY
     if not google_key:
         raise ValueError("Set GOOGLE_MAPS_API_KEY env var")
 
     session = create_session(google_key)
     print(f"  Fetching tiles for pano {pano_id[:12]}... (zoom {zoom})")
-    equirect = stitch_pano_tiles(google_key, session, pano_id, zoom)
+    equirect = stitch_pano_tiles(google_key, session, pano_id, zoom, target_width=target_width)
     print(f"  Stitched: {equirect.shape[1]}x{equirect.shape[0]}")
 
-    img = Image.fromarray(equirect)
-    img.save(output_path, format="PNG")
-    size_mb = os.path.getsize(output_path) / (1024 * 1024)
-    print(f"  Saved: {output_path} ({size_mb:.1f} MB)")
+    t0 = time.time()
+    buf = encode_image(equirect, fmt, level=level, quality=quality)
+    print(f"  Encoded {fmt} in memory ({buf.getbuffer().nbytes / (1024 * 1024):.1f} MB, "
+          f"{time.time() - t0:.1f}s)")
+    return buf
+
+
+def save_buffer(buf: BytesIO, output_path: str) -> str:
+    """Write an in-memory image to disk without copying it."""
+    with buf.getbuffer() as view, open(output_path, "wb") as f:
+        f.write(view)
+    print(f"  Saved: {output_path} ({os.path.getsize(output_path) / (1024 * 1024):.1f} MB)")
     return output_path
 
 
+def stitch_and_save_pano(
+    pano_id: str,
+    output_path: str,
+    zoom: int = 3,
+    target_width: int | None = None,
+) -> str:
+    """Fetch SV tiles, stitch into equirectangular, save in the format of output_path's extension."""
+    ext = output_path.rsplit(".", 1)[-1].lower()
+    fmt = {"jpg": "jpeg"}.get(ext, ext)
+    return save_buffer(stitch_pano_image(pano_id, zoom, target_width, fmt=fmt), output_path)
+
+
 def marble_headers() -> dict:
     """Auth headers for Marble API."""
     if not MARBLE_API_KEY:
@@ -69,10 +117,24 @@ def marble_headers() -> dict:
     return {"WLT-Api-Key": MARBLE_API_KEY}
 
 
-def upload_image(image_path: str) -> str:
-    """Upload image to Marble via media asset flow. Returns media_asset_id."""
+def upload_image(image: str | bytes | BinaryIO, filename: str | None = None) -> str:
+    """Upload image to Marble via media asset flow. Returns media_asset_id.
+
+    Args:
+        image: a file path, an encoded image in bytes, or a binary file-like
+            object (e.g. BytesIO). Paths and file-like objects are streamed
+            as the request body from their current position, not read into
+            memory first.
+        filename: asset file name; taken from the path if omitted, required
+            for bytes and streams (its extension sets the asset type)
+    """
+    if isinstance(image, (str, os.PathLike)):
+        with open(image, "rb") as f:
+            return upload_image(f, filename or os.path.basename(image))
+    if filename is None:
+        raise ValueError("filename is required when uploading bytes or a stream")
+
     headers = marble_headers()
-    filename = os.path.basename(image_path)
     ext = filename.rsplit(".", 1)[-1].lower()
 
     # Step 1: Prepare upload
@@ -90,16 +152,13 @@ def upload_image(image_path: str) -> str:
     upload_method = data["upload_info"]["upload_method"]
     required_headers = data["upload_info"].get("required_headers") or {}
 
-    # Step 2: Upload file
+    # Step 2: Upload body (requests sets Content-Length from the stream and sends it in blocks)
     print(f"  Uploading to signed URL ({upload_method})...")
-    with open(image_path, "rb") as f:
-        file_bytes = f.read()
-
     upload_resp = requests.request(
         upload_method,
         upload_url,
         headers=required_headers,
-        data=file_bytes,
+        data=image,
     )
     upload_resp.raise_for_status()
     print(f"  Upload complete. media_asset_id: {media_asset_id}")
@@ -194,48 +253,49 @@ def generate_world_multi_image(
     return op_id
 
 
-def poll_operation(operation_id: str, timeout: int = 600, interval: int = 5) -> dict:
-    """Poll operation until done. Returns completed operation data."""
-    headers = marble_headers()
-    start = time.time()
-
-    while time.time() - start < timeout:
-        resp = requests.get(
-            f"{MARBLE_BASE}/marble/v1/operations/{operation_id}",
-            headers=headers,
-        )
-        resp.raise_for_status()
-        data = resp.json()
+_operation_tracker: OperationTracker | None = None
+_operation_tracker_lock = threading.Lock()
 
-        status = data.get("metadata", {}).get("progress", {}).get("status", "UNKNOWN")
-        desc = data.get("metadata", {}).get("progress", {}).get("description", "")
-        elapsed = int(time.time() - start)
-        print(f"  [{elapsed}s] Status: {status} - {desc}", end="\r")
 
-        if data.get("done"):
-            print(f"\n  Completed in {elapsed}s")
-            if data.get("error"):
-                raise RuntimeError(f"Generation failed: {data['error']}")
-            return data
+def operation_tracker() -> OperationTracker:
+    """Process-wide tracker that polls all Marble operations over one session."""
+    global _operation_tracker
+    with _operation_tracker_lock:
+        if _operation_tracker is None:
+            _operation_tracker = OperationTracker(MARBLE_BASE, marble_headers())
+        return _operation_tracker
 
-        time.sleep(interval)
 
-    raise TimeoutError(f"Operation {operation_id} timed out after {timeout}s")
+def poll_operation(operation_id: str, timeout: int = 600, interval: int = 5, verbose: bool = True) -> dict:
+    """Poll operation until done. Returns completed operation data.
 
+    Blocking wrapper over operation_tracker(); interval is the starting poll
+    interval, which backs off while progress is unchanged. verbose=False
+    skips the in-place progress line (for concurrent operations).
+    """
+    def show_progress(data: dict, elapsed: float):
+        progress = data.get("metadata", {}).get("progress", {})
+        status = progress.get("status", "UNKNOWN")
+        desc = progress.get("description", "")
+        print(f"  [{int(elapsed)}s] Status: {status} - {desc}", end="\r")
 
-def download_file(url: str, output_path: str, label: str = "file") -> str:
-    """Download a file from URL to output_path."""
-    print(f"  Downloading {label} from {url[:60]}...")
-    resp = requests.get(url, stream=True)
-    resp.raise_for_status()
+    start = time.time()
+    future = operation_tracker().track(
+        operation_id,
+        on_progress=show_progress if verbose else None,
+        timeout=timeout,
+        min_interval=interval,
+    )
+    data = future.result()
+    if verbose:
+        print()
+    print(f"  Completed in {int(time.time() - start)}s")
+    return data
 
-    with open(output_path, "wb") as f:
-        for chunk in resp.iter_content(chunk_size=8192):
-            f.write(chunk)
 
-    size_mb = os.path.getsize(output_path) / (1024 * 1024)
-    print(f"  Saved: {output_path} ({size_mb:.1f} MB)")
-    return output_path
+def download_file(url: str, output_path: str, label: str = "file") -> str:
+    """Download a file from URL to output_path (parallel ranges, resumable; see downloader.py)."""
+    return downloader.download(url, output_path, label=label)
 
 
 def download_spz(world_data: dict, output_path: str) -> str:
@@ -266,6 +326,73 @@ def download_mesh(world_data: dict, output_path: str) -> str | None:
     return download_file(url, output_path, ".glb mesh")
 
 
+def upload_image_once(image: str | bytes | BinaryIO, filename: str | None = None) -> tuple[str, str]:
+    """upload_image, reusing the media asset of an earlier upload of identical bytes.
+
+    Returns (media_asset_id, content sha256).
+    """
+    sha256 = content_sha256(image)
+    ledger = default_ledger()
+    media_asset_id = ledger.media_asset(sha256) if ledger else None
+    if media_asset_id:
+        print(f"  Reusing earlier upload of identical image: {media_asset_id}")
+        return media_asset_id, sha256
+
+    media_asset_id = upload_image(image, filename)
+    if ledger:
+        ledger.record_upload(sha256, media_asset_id, filename or os.path.basename(str(image)))
+    return media_asset_id, sha256
+
+
+def get_operation(operation_id: str) -> dict:
+    """Current state of a Marble operation."""
+    resp = requests.get(f"{MARBLE_BASE}/marble/v1/operations/{operation_id}", headers=marble_headers())
+    resp.raise_for_status()
+    return resp.json()
+
+
+def start_world_once(job: dict, key: str, display_name: str, start) -> str:
+    """
+    Operation id for the world identified by key, calling start() only if needed.
+
+    A pending or completed operation recorded in the ledger is reused unless
+    it failed or no longer exists. Sets job["world_key"] and, for a world
+    that already completed, job["reused"] so its downloads can be skipped.
+    """
+    job["world_key"] = key
+    ledger = default_ledger()
+    record = ledger.world(key) if ledger else None
+    if record:
+        try:
+            operation = get_operation(record["operation_id"])
+        except requests.HTTPError:
+            operation = None
+        if operation is not None and not operation.get("error"):
+            job["reused"] = record["status"] == "completed"
+            print(f"  Reusing {record['status']} operation {record['operation_id']} (no new generation)")
+            return record["operation_id"]
+        ledger.forget_world(key)
+
+    op_id = start()
+    if ledger:
+        ledger.record_operation(key, op_id, display_name)
+    return op_id
+
+
+def record_world_done(job: dict, result: dict):
+    ledger = default_ledger()
+    if ledger and job.get("world_key"):
+        ledger.record_world(job["world_key"], result)
+
+
+def download_asset(job: dict, fetch, world_data: dict, path: Path):
+    """Run fetch(world_data, path) unless this is a reused world whose file is already on disk."""
+    if job.get("reused") and path.exists():
+        print(f"  Already downloaded: {path}")
+        return str(path)
+    return fetch(world_data, str(path))
+
+
 def extract_and_save_crops(
     pano_ids: list[str],
     headings_per_pano: list[list[float]],
@@ -273,6 +400,7 @@ def extract_and_save_crops(
     zoom: int = 3,
     crop_size: int = 1024,
     fov: float = 90.0,
+    interpolation: str = "bilinear",
 ) -> list[tuple[str, float]]:
     """Stitch panos and extract perspective crops. Returns list of (filepath, azimuth)."""
     from PIL import Image
@@ -286,12 +414,15 @@ def extract_and_save_crops(
     crops = []
 
     for i, (pano_id, headings) in enumerate(zip(pano_ids, headings_per_pano)):
-        print(f"  Stitching pano {pano_id[:12]}...")
-        equirect = stitch_pano_tiles(google_key, session, pano_id, zoom)
+        views = [(heading, 0.0, fov, crop_size) for heading in headings]
+        tiles = plan_view_tiles(views, zoom)
+        total_tiles = (2 ** zoom) * max(1, 2 ** (zoom - 1))
+        print(f"  Stitching pano {pano_id[:12]}... ({len(tiles)}/{total_tiles} tiles, "
+              f"{total_tiles - len(tiles)} saved)")
+        equirect = stitch_pano_tiles(google_key, session, pano_id, zoom, tiles=tiles)
         print(f"    Equirect: {equirect.shape[1]}x{equirect.shape[0]}")
 
-        for heading in headings:
-            crop = equirect_to_perspective(equirect, heading, pitch_deg=0.0, fov_deg=fov, out_size=crop_size)
+        for heading, crop in zip(headings, equirect_to_perspectives(equirect, views, interpolation)):
             filename = f"crop_p{i}_h{int(heading):03d}.png"
             filepath = os.path.join(output_dir, filename)
             Image.fromarray(crop).save(filepath, format="PNG")
@@ -302,59 +433,68 @@ def extract_and_save_crops(
     return crops
 
 
-def run_pano_mode(args, panos, out_dir):
-    """Generate a world from a single equirectangular panorama."""
-    pano = panos[args.pano_index]
-    pano_id = pano["pano_id"]
-    idx = args.pano_index
-
-    print(f"=== Pano Mode: Single Equirectangular ===")
-    print(f"Pano {idx}: {pano_id[:12]}... ({pano['lat']:.6f}, {pano['lng']:.6f})")
-    print(f"Model: {MODEL_MAP[args.model]}")
-    print()
+def stitch_pano_job(args, panos, idx, out_dir, tag: str = "") -> dict:
+    """Pano mode step 1 (local): stitch and encode the equirect. Returns the job for generate_pano_job.
 
-    # Step 1: Stitch
-    pano_png = out_dir / f"pano{idx:02d}_equirect.png"
+    The image is encoded in memory (--pano-format) and uploaded from there;
+    it is only written to disk with --save-pano (for a later --skip-stitch run).
+    """
+    filename = f"pano{idx:02d}_equirect.{EXTENSIONS[args.pano_format]}"
+    pano_png = out_dir / filename
     if args.skip_stitch and pano_png.exists():
-        print(f"[1/5] Skipping stitch (exists: {pano_png})")
+        print(f"{tag}[1/5] Skipping stitch (exists: {pano_png})")
+        image = pano_png
     else:
-        print(f"[1/5] Stitching equirectangular pano...")
-        stitch_and_save_pano(pano_id, str(pano_png), zoom=args.zoom)
-    print()
+        print(f"{tag}[1/5] Stitching equirectangular pano...")
+        image = stitch_pano_image(
+            panos[idx]["pano_id"], zoom=args.zoom, target_width=args.pano_width,
+            fmt=args.pano_format, level=args.png_level, quality=args.quality,
+        )
+        if args.save_pano:
+            save_buffer(image, str(pano_png))
+    return {"idx": idx, "pano": panos[idx], "image": image, "filename": filename}
+
+
+def submit_pano_job(args, job, tag: str = "") -> str:
+    """Pano mode steps 2-3 (remote): upload and start generation. Returns the operation id."""
+    idx = job["idx"]
 
     # Step 2: Upload
-    print(f"[2/5] Uploading to Marble API...")
-    media_asset_id = upload_image(str(pano_png))
-    print()
+    print(f"{tag}[2/5] Uploading to Marble API...")
+    media_asset_id, sha256 = upload_image_once(job["image"], job["filename"])
 
     # Step 3: Generate
     display_name = f"stmarks-pano{idx:02d}-{args.model}"
-    print(f"[3/5] Generating world '{display_name}'...")
-    op_id = generate_world(media_asset_id, display_name, model=args.model)
-    result = poll_operation(op_id)
-    print()
+    print(f"{tag}[3/5] Generating world '{display_name}'...")
+    key = world_key("pano", MODEL_MAP[args.model], [(sha256, None)])
+    return start_world_once(
+        job, key, display_name, lambda: generate_world(media_asset_id, display_name, model=args.model)
+    )
+
+
+def download_pano_job(args, job, result, out_dir, tag: str = "") -> dict:
+    """Pano mode steps 4-5: download the finished world's assets. Returns the registry entry."""
+    idx, pano = job["idx"], job["pano"]
+    record_world_done(job, result)
 
-    # Step 4-5: Download
     world_data = result.get("response", {})
     world_id = world_data.get("id", "unknown")
     marble_url = world_data.get("world_marble_url", "")
 
-    print(f"[4/5] Downloading .spz...")
+    print(f"{tag}[4/5] Downloading .spz...")
     spz_path = out_dir / f"pano{idx:02d}.spz"
-    download_spz(world_data, str(spz_path))
-    print()
+    download_asset(job, download_spz, world_data, spz_path)
 
-    print(f"[5/5] Downloading collider mesh...")
+    print(f"{tag}[5/5] Downloading collider mesh...")
     mesh_path = out_dir / f"pano{idx:02d}_collider.glb"
-    mesh_result = download_mesh(world_data, str(mesh_path))
-    print()
+    mesh_result = download_asset(job, download_mesh, world_data, mesh_path)
 
     return {
         "id": f"pano{idx:02d}",
         "file": f"pano{idx:02d}.spz",
         "mesh_file": f"pano{idx:02d}_collider.glb" if mesh_result else None,
         "file_size_mb": round(os.path.getsize(str(spz_path)) / (1024 * 1024), 1),
-        "source_pano_id": pano_id,
+        "source_pano_id": pano["pano_id"],
         "center": {"lat": pano["lat"], "lng": pano["lng"]},
         "heading": pano["heading"],
         "model": MODEL_MAP[args.model],
@@ -366,23 +506,43 @@ def run_pano_mode(args, panos, out_dir):
     }
 
 
-def run_multi_image_mode(args, panos, out_dir):
-    """Generate a world from perspective crops spanning multiple pano positions."""
-    # Use pano at pano_index and pano at pano_index+2 (or last available)
-    idx_a = args.pano_index
-    idx_b = min(args.pano_index + 2, len(panos) - 1)
-    if idx_a == idx_b:
-        idx_b = min(idx_a + 1, len(panos) - 1)
+def generate_pano_job(args, job, out_dir) -> dict:
+    """Pano mode steps 2-5 (remote): upload, generate, poll, download. Returns the registry entry."""
+    op_id = submit_pano_job(args, job)
+    result = poll_operation(op_id)
+    return download_pano_job(args, job, result, out_dir)
 
-    pano_a = panos[idx_a]
-    pano_b = panos[idx_b]
 
-    print(f"=== Multi-Image Mode: Spanning Two Positions ===")
-    print(f"Pano A ({idx_a}): {pano_a['pano_id'][:12]}... ({pano_a['lat']:.6f}, {pano_a['lng']:.6f})")
-    print(f"Pano B ({idx_b}): {pano_b['pano_id'][:12]}... ({pano_b['lat']:.6f}, {pano_b['lng']:.6f})")
+def run_pano_mode(args, panos, out_dir):
+    """Generate a world from a single equirectangular panorama."""
+    pano = panos[args.pano_index]
+    idx = args.pano_index
+
+    print(f"=== Pano Mode: Single Equirectangular ===")
+    print(f"Pano {idx}: {pano['pano_id'][:12]}... ({pano['lat']:.6f}, {pano['lng']:.6f})")
     print(f"Model: {MODEL_MAP[args.model]}")
     print()
 
+    job = stitch_pano_job(args, panos, idx, out_dir)
+    print()
+    entry = generate_pano_job(args, job, out_dir)
+    print()
+    return entry
+
+
+def multi_image_pair(idx: int, num_panos: int) -> tuple[int, int]:
+    """Pano indices spanned by a multi-image world: idx and idx+2 (or the next available)."""
+    idx_b = min(idx + 2, num_panos - 1)
+    if idx == idx_b:
+        idx_b = min(idx + 1, num_panos - 1)
+    return idx, idx_b
+
+
+def extract_multi_image_job(args, panos, idx, out_dir, tag: str = "") -> dict:
+    """Multi-image mode step 1 (local): extract crops from both panos. Returns the job."""
+    idx_a, idx_b = multi_image_pair(idx, len(panos))
+    pano_a, pano_b = panos[idx_a], panos[idx_b]
+
     # Street heading (direction from A to B)
     street_heading = pano_a.get("heading", 119)
 
@@ -402,55 +562,71 @@ def run_multi_image_mode(args, panos, out_dir):
         (street_heading + 90) % 360,         # right (from B's perspective)
     ]
 
-    # Step 1: Extract crops
     crop_dir = out_dir / f"multi_{idx_a}_{idx_b}_crops"
     crop_dir.mkdir(parents=True, exist_ok=True)
 
-    print(f"[1/5] Extracting 1024x1024 crops from both panos...")
+    print(f"{tag}[1/5] Extracting 1024x1024 crops from both panos...")
     crops = extract_and_save_crops(
         pano_ids=[pano_a["pano_id"], pano_b["pano_id"]],
         headings_per_pano=[headings_a, headings_b],
         output_dir=str(crop_dir),
         zoom=args.zoom,
         crop_size=1024,
+        interpolation=args.interpolation,
     )
-    print(f"  Total crops: {len(crops)}")
-    print()
+    print(f"{tag}  Total crops: {len(crops)}")
+    return {
+        "idx_a": idx_a,
+        "idx_b": idx_b,
+        "pano_a": pano_a,
+        "pano_b": pano_b,
+        "street_heading": street_heading,
+        "crops": crops,
+    }
+
+
+def submit_multi_image_job(args, job, tag: str = "") -> str:
+    """Multi-image mode steps 2-3 (remote): upload crops and start generation. Returns the operation id."""
+    idx_a, idx_b = job["idx_a"], job["idx_b"]
+    crops = job["crops"]
 
     # Step 2: Upload all crops
-    print(f"[2/5] Uploading {len(crops)} images to Marble API...")
-    uploaded = []
+    print(f"{tag}[2/5] Uploading {len(crops)} images to Marble API...")
+    uploaded, hashes = [], []
     for filepath, azimuth in crops:
-        mid = upload_image(filepath)
+        mid, sha256 = upload_image_once(filepath)
         uploaded.append((mid, azimuth))
-    print()
+        hashes.append((sha256, azimuth))
 
     # Step 3: Generate multi-image world
     display_name = f"stmarks-multi-{idx_a}-{idx_b}-{args.model}"
-    print(f"[3/5] Generating multi-image world '{display_name}'...")
-    op_id = generate_world_multi_image(
-        uploaded, display_name, model=args.model,
-        text_prompt="A continuous street scene on St Marks Place in the East Village, NYC. Brownstone buildings line both sides of the tree-lined street."
+    print(f"{tag}[3/5] Generating multi-image world '{display_name}'...")
+    key = world_key("multi-image", MODEL_MAP[args.model], hashes, MULTI_IMAGE_PROMPT)
+    return start_world_once(
+        job, key, display_name,
+        lambda: generate_world_multi_image(uploaded, display_name, model=args.model, text_prompt=MULTI_IMAGE_PROMPT),
     )
-    result = poll_operation(op_id)
-    print()
 
-    # Step 4-5: Download
+
+def download_multi_image_job(args, job, result, out_dir, tag: str = "") -> dict:
+    """Multi-image mode steps 4-5: download the finished world's assets. Returns the registry entry."""
+    idx_a, idx_b = job["idx_a"], job["idx_b"]
+    pano_a, pano_b = job["pano_a"], job["pano_b"]
+    record_world_done(job, result)
+
     world_data = result.get("response", {})
     world_id = world_data.get("id", "unknown")
     marble_url = world_data.get("world_marble_url", "")
 
     spz_name = f"multi_{idx_a}_{idx_b}.spz"
-    print(f"[4/5] Downloading .spz...")
+    print(f"{tag}[4/5] Downloading .spz...")
     spz_path = out_dir / spz_name
-    download_spz(world_data, str(spz_path))
-    print()
+    download_asset(job, download_spz, world_data, spz_path)
 
-    print(f"[5/5] Downloading collider mesh...")
+    print(f"{tag}[5/5] Downloading collider mesh...")
     mesh_name = f"multi_{idx_a}_{idx_b}_collider.glb"
     mesh_path = out_dir / mesh_name
-    mesh_result = download_mesh(world_data, str(mesh_path))
-    print()
+    mesh_result = download_asset(job, download_mesh, world_data, mesh_path)
 
     # Compute midpoint between the two panos
     mid_lat = (pano_a["lat"] + pano_b["lat"]) / 2
@@ -463,7 +639,7 @@ def run_multi_image_mode(args, panos, out_dir):
         "file_size_mb": round(os.path.getsize(str(spz_path)) / (1024 * 1024), 1),
         "source_pano_id": f"{pano_a['pano_id']}+{pano_b['pano_id']}",
         "center": {"lat": mid_lat, "lng": mid_lng},
-        "heading": street_heading,
+        "heading": job["street_heading"],
         "model": MODEL_MAP[args.model],
         "world_id": world_id,
         "marble_url": marble_url,
@@ -475,6 +651,120 @@ def run_multi_image_mode(args, panos, out_dir):
     }
 
 
+def generate_multi_image_job(args, job, out_dir) -> dict:
+    """Multi-image mode steps 2-5 (remote): upload, generate, poll, download. Returns the registry entry."""
+    op_id = submit_multi_image_job(args, job)
+    result = poll_operation(op_id)
+    return download_multi_image_job(args, job, result, out_dir)
+
+
+def run_multi_image_mode(args, panos, out_dir):
+    """Generate a world from perspective crops spanning multiple pano positions."""
+    idx_a, idx_b = multi_image_pair(args.pano_index, len(panos))
+    pano_a, pano_b = panos[idx_a], panos[idx_b]
+
+    print(f"=== Multi-Image Mode: Spanning Two Positions ===")
+    print(f"Pano A ({idx_a}): {pano_a['pano_id'][:12]}... ({pano_a['lat']:.6f}, {pano_a['lng']:.6f})")
+    print(f"Pano B ({idx_b}): {pano_b['pano_id'][:12]}... ({pano_b['lat']:.6f}, {pano_b['lng']:.6f})")
+    print(f"Model: {MODEL_MAP[args.model]}")
+    print()
+
+    job = extract_multi_image_job(args, panos, args.pano_index, out_dir)
+    print()
+    entry = generate_multi_image_job(args, job, out_dir)
+    print()
+    return entry
+
+
+# mode -> (local prepare stage, upload + start generation, download on completion)
+MODE_STAGES = {
+    "pano": (stitch_pano_job, submit_pano_job, download_pano_job),
+    "multi-image": (extract_multi_image_job, submit_multi_image_job, download_multi_image_job),
+}
+
+
+def parse_pano_range(spec: str, num_panos: int) -> list[int]:
+    """'START:END' (end exclusive, either side optional) or 'all' -> pano indices."""
+    if spec == "all":
+        return list(range(num_panos))
+    start, sep, end = spec.partition(":")
+    if not sep:
+        return [int(start)]
+    return list(range(num_panos))[slice(int(start) if start else None, int(end) if end else None)]
+
+
+def run_batch(args, panos, out_dir, indices: list[int], registry: Registry) -> list[dict]:
+    """
+    Generate worlds for many panos with the stages pipelined.
+
+    Local stages (stitching / crop extraction) run one at a time on this
+    thread, so the next pano is being prepared while earlier ones upload on
+    a thread pool and generate on Marble. All generations are polled by the
+    shared operation tracker, which downloads each world's assets as soon
+    as it completes. At most args.max_operations worlds are in flight
+    (uploading, generating or downloading); preparation stays at most one
+    pano ahead of a free slot. Each finished world is added to the registry
+    as it completes.
+    """
+    prepare, submit, download = MODE_STAGES[args.mode]
+    tracker = operation_tracker()
+    slots = threading.Semaphore(args.max_operations + 1)
+    registry_lock = threading.Lock()
+    entries, failed = [], []
+    start = time.time()
+
+    def finish(idx: int, job: dict, result: dict, started: float) -> dict:
+        tag = f"[pano{idx:02d}] "
+        entry = download(args, job, result, out_dir, tag=tag)
+        with registry_lock:
+            registry.put(entry)
+        print(f"{tag}Done in {time.time() - started:.0f}s -> {entry['file']}")
+        return entry
+
+    def launch(idx: int, job: dict, done: Future):
+        started = time.time()
+        try:
+            op_id = submit(args, job, tag=f"[pano{idx:02d}] ")
+        except Exception as e:
+            done.set_exception(e)
+            return
+        tracked = tracker.track(op_id, on_done=lambda result: finish(idx, job, result, started))
+        tracked.add_done_callback(
+            lambda f: done.set_exception(f.exception()) if f.exception() else done.set_result(f.result())
+        )
+
+    print(f"=== Batch: {len(indices)} {args.mode} worlds, up to {args.max_operations} operations at once ===")
+    futures = {}
+    with ThreadPoolExecutor(max_workers=args.max_operations) as uploads:
+        for idx in indices:
+            slots.acquire()
+            tag = f"[pano{idx:02d}] "
+            try:
+                job = prepare(args, panos, idx, out_dir, tag=tag)
+            except Exception as e:
+                print(f"{tag}Prepare failed: {e}")
+                failed.append(idx)
+                slots.release()
+                continue
+            done = Future()
+            done.add_done_callback(lambda _: slots.release())
+            futures[done] = idx
+            uploads.submit(launch, idx, job, done)
+
+        for future in as_completed(futures):
+            idx = futures[future]
+            try:
+                entries.append(future.result())
+            except Exception as e:
+                print(f"[pano{idx:02d}] Failed: {e}")
+                failed.append(idx)
+
+    print(f"=== Batch done: {len(entries)} worlds in {time.time() - start:.0f}s"
+          f"{f', failed: {sorted(failed)}' if failed else ''} "
+          f"({tracker.polls} status polls) ===")
+    return entries
+
+
 def main():
     parser = argparse.ArgumentParser(description="Generate Marble worlds from Street View panos")
     parser.add_argument("--input-dir", type=str, default="data/streetview-overlap", help="Dir with metadata.json")
@@ -484,7 +774,29 @@ def main():
     parser.add_argument("--mode", type=str, default="pano", choices=["pano", "multi-image"],
                         help="'pano': single equirectangular. 'multi-image': crops from 2 positions")
     parser.add_argument("--zoom", type=int, default=3, help="SV tile zoom for stitching")
-    parser.add_argument("--skip-stitch", action="store_true", help="Skip stitching if pano PNG already exists")
+    parser.add_argument("--pano-width", type=int, default=None,
+                        help="Decode tiles at reduced resolution down to this equirect width (pano mode)")
+    parser.add_argument("--interpolation", type=str, default="bilinear", choices=INTERPOLATIONS,
+                        help="Crop sampling for multi-image mode")
+    parser.add_argument("--pano-format", type=str, default="png", choices=FORMATS,
+                        help="Equirect upload encoding (pano mode); png is lossless, jpeg/webp far smaller")
+    parser.add_argument("--png-level", type=int, default=6, help="PNG zlib level 0-9 (1 is ~4x faster)")
+    parser.add_argument("--quality", type=int, default=95, help="JPEG / WebP quality")
+    parser.add_argument("--skip-stitch", action="store_true", help="Skip stitching if pano image already exists")
+    parser.add_argument("--save-pano", action="store_true",
+                        help="Also write the encoded pano to the output dir (pano mode uploads from memory)")
+    parser.add_argument("--ledger", type=str, default=DEFAULT_LEDGER_PATH, help="Upload/world ledger path")
+    parser.add_argument("--no-ledger", action="store_true",
+                        help="Ignore the upload/world ledger and always upload and generate anew")
+    parser.add_argument("--tile-cache-dir", type=str, default=DEFAULT_CACHE_DIR, help="On-disk tile cache directory")
+    parser.add_argument("--tile-cache-max-mb", type=int, default=DEFAULT_MAX_MB, help="Tile cache size bound in MB")
+    parser.add_argument("--no-tile-cache", action="store_true", help="Always fetch tiles from the API")
+    parser.add_argument("--plan-cache-dir", type=str, default=None,
+                        help="Persist projection plans here across runs (multi-image mode)")
+    parser.add_argument("--pano-range", type=str, default=None,
+                        help="Batch mode: 'START:END' (end exclusive) or 'all' panos in metadata.json")
+    parser.add_argument("--max-operations", type=int, default=4,
+                        help="Batch mode: max Marble operations (upload/generate/download) in flight")
     args = parser.parse_args()
 
     # Load metadata
@@ -493,44 +805,55 @@ def main():
         meta = json.load(f)
 
     panos = meta["panos"]
-    if args.pano_index >= len(panos):
+    if args.pano_range is None and args.pano_index >= len(panos):
         print(f"Error: pano_index {args.pano_index} out of range (have {len(panos)} panos)")
         return
 
+    set_default_ledger(None if args.no_ledger else MarbleLedger(args.ledger))
+    if args.no_tile_cache:
+        set_default_tile_cache(None)
+    else:
+        set_default_tile_cache(TileCache(args.tile_cache_dir, args.tile_cache_max_mb * 1024 * 1024))
+    set_plan_cache_dir(args.plan_cache_dir)
+
     # Setup output dir
     out_dir = Path(args.output_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    # Run selected mode
-    if args.mode == "multi-image":
-        entry = run_multi_image_mode(args, panos, out_dir)
-    else:
-        entry = run_pano_mode(args, panos, out_dir)
-
-    # Save registry entry
     registry_path = out_dir / "registry.json"
-    if registry_path.exists():
-        with open(registry_path) as f:
-            registry = json.load(f)
-    else:
-        registry = {
-            "origin": {"lat": panos[0]["lat"], "lng": panos[0]["lng"]},
-            "worlds": [],
-        }
-
-    existing_idx = next((i for i, w in enumerate(registry["worlds"]) if w["id"] == entry["id"]), None)
-    if existing_idx is not None:
-        registry["worlds"][existing_idx] = entry
+    registry = Registry.for_json(str(registry_path))
+    registry.set_origin({"lat": panos[0]["lat"], "lng": panos[0]["lng"]})
+
+    if args.pano_range is not None:
+        indices = parse_pano_range(args.pano_range, len(panos))
+        if args.mode == "multi-image":
+            indices = [i for i in indices if i < len(panos) - 1]  # each world needs a second pano
+        entries = run_batch(args, panos, out_dir, indices, registry)
     else:
-        registry["worlds"].append(entry)
+        # Run selected mode
+        if args.mode == "multi-image":
+            entries = [run_multi_image_mode(args, panos, out_dir)]
+        else:
+            entries = [run_pano_mode(args, panos, out_dir)]
+        registry.put(entries[0])
 
-    with open(registry_path, "w") as f:
-        json.dump(registry, f, indent=2)
+    # Re-export registry.json from the sharded store
+    registry.export_json(str(registry_path))
+    index_path = build_index(str(registry_path))
 
     print(f"=== Done ===")
-    print(f"  .spz: {out_dir / entry['file']}")
-    print(f"  Marble URL: {entry.get('marble_url', 'N/A')}")
+    for entry in entries:
+        print(f"  .spz: {out_dir / entry['file']}")
+        print(f"  Marble URL: {entry.get('marble_url', 'N/A')}")
     print(f"  Registry: {registry_path}")
+    print(f"  Spatial index: {index_path}")
+    cache = default_tile_cache()
+    if cache is not None:
+        print(f"  {cache.report()}")
+    ledger = default_ledger()
+    if ledger is not None:
+        s = ledger.stats()
+        print(f"  Ledger ({ledger.path}): {s['uploads']} uploads, {s['worlds']} worlds, {s['pending']} pending")
 
 
 if __name__ == "__main__":
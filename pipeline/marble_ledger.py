@@ -0,0 +1,186 @@
+"""
+Local ledger of Marble uploads and world generations, keyed by content.
+
+Uploads are keyed by image sha256, worlds by (kind, model, image hashes,
+prompt), so marble_generator reuses earlier media assets and worlds instead
+of paying again. One JSON file, read-modify-written under a flock:
+
+    {
+      "uploads": {<image sha256>: {"media_asset_id", "filename", "size", "uploaded_at"}},
+      "worlds":  {<world key>: {"operation_id", "status": "pending"|"completed",
+                                "display_name", "world_id", "marble_url", "updated_at"}}
+    }
+"""
+
+import fcntl
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO
+
+
+DEFAULT_LEDGER_PATH = "data/cache/marble_ledger.json"
+HASH_BLOCK = 1024 * 1024
+
+
+def content_sha256(image: str | bytes | BinaryIO) -> str:
+    """sha256 of an image given as a path, bytes, or a seekable binary stream (position is kept)."""
+    digest = hashlib.sha256()
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        digest.update(image)
+    elif isinstance(image, io.BytesIO):
+        with image.getbuffer() as view:
+            digest.update(view[image.tell():])
+    elif isinstance(image, (str, os.PathLike)):
+        with open(image, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b""):
+                digest.update(block)
+    else:
+        start = image.tell()
+        for block in iter(lambda: image.read(HASH_BLOCK), b""):
+            digest.update(block)
+        image.seek(start)
+    return digest.hexdigest()
+
+
+def world_key(
+    kind: str,
+    model: str,
+    images: list[tuple[str, float | None]],
+    prompt: str | None = None,
+) -> str:
+    """Identity of a generation request: kind, model, (image sha256, azimuth) list and text prompt."""
+    canonical = json.dumps(
+        {"kind": kind, "model": model, "images": [list(i) for i in images], "prompt": prompt},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+class MarbleLedger:
+    """Content-addressed record of media assets and world operations."""
+
+    def __init__(self, path: str = DEFAULT_LEDGER_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        data.setdefault("uploads", {})
+        data.setdefault("worlds", {})
+        return data
+
+    @contextmanager
+    def _locked(self):
+        with self._lock, open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _update(self):
+        """Yield the ledger dict under the lock and write it back atomically."""
+        with self._locked():
+            data = self._read()
+            yield data
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def media_asset(self, sha256: str) -> str | None:
+        """media_asset_id of an earlier upload of identical bytes, if any."""
+        with self._locked():
+            upload = self._read()["uploads"].get(sha256)
+        return upload["media_asset_id"] if upload else None
+
+    def record_upload(self, sha256: str, media_asset_id: str, filename: str, size: int | None = None):
+        with self._update() as data:
+            data["uploads"][sha256] = {
+                "media_asset_id": media_asset_id,
+                "filename": filename,
+                "size": size,
+                "uploaded_at": _now(),
+            }
+
+    def world(self, key: str) -> dict | None:
+        """Ledger record for a world key: {"operation_id", "status", ...}, or None."""
+        with self._locked():
+            return self._read()["worlds"].get(key)
+
+    def record_operation(self, key: str, operation_id: str, display_name: str | None = None):
+        """Mark a generation as started (pending) under its world key."""
+        with self._update() as data:
+            data["worlds"][key] = {
+                "operation_id": operation_id,
+                "status": "pending",
+                "display_name": display_name,
+                "updated_at": _now(),
+            }
+
+    def record_world(self, key: str, operation: dict):
+        """Mark a world as completed from its finished operation."""
+        world = operation.get("response", {})
+        with self._update() as data:
+            record = data["worlds"].setdefault(key, {})
+            record.update({
+                "operation_id": operation.get("operation_id", record.get("operation_id")),
+                "status": "completed",
+                "world_id": world.get("id"),
+                "marble_url": world.get("world_marble_url"),
+                "updated_at": _now(),
+            })
+
+    def forget_world(self, key: str):
+        with self._update() as data:
+            data["worlds"].pop(key, None)
+
+    def stats(self) -> dict:
+        with self._locked():
+            data = self._read()
+        worlds = data["worlds"].values()
+        return {
+            "uploads": len(data["uploads"]),
+            "worlds": sum(1 for w in worlds if w.get("status") == "completed"),
+            "pending": sum(1 for w in worlds if w.get("status") == "pending"),
+        }
+
+
+_default_ledger: MarbleLedger | None = None
+_default_configured = False
+_default_lock = threading.Lock()
+
+
+def default_ledger() -> MarbleLedger | None:
+    """Process-wide ledger used by marble_generator, or None if disabled."""
+    global _default_ledger, _default_configured
+    with _default_lock:
+        if not _default_configured:
+            _default_ledger = MarbleLedger(DEFAULT_LEDGER_PATH)
+            _default_configured = True
+        return _default_ledger
+
+
+def set_default_ledger(ledger: MarbleLedger | None):
+    """Replace the process-wide ledger (None disables dedupe)."""
+    global _default_ledger, _default_configured
+    with _default_lock:
+        _default_ledger = ledger
+        _default_configured = True
@@ -0,0 +1,164 @@
+"""
+Poll many Marble operations from one event loop.
+
+OperationTracker runs an asyncio loop on a background thread and polls every
+tracked operation id through one pooled requests.Session, so a process can
+follow dozens of world generations at once instead of one blocking sleep
+loop per operation. track() is safe to call from any thread and returns a
+concurrent.futures.Future.
+
+Polling adapts per operation: it starts at min_interval, backs off by
+`backoff` up to max_interval while the reported progress (status +
+description) is unchanged, and drops back to min_interval when it changes.
+429 / 5xx responses and connection errors are retried with backoff instead
+of failing the operation. Each operation has its own timeout, and an
+on_done callback (e.g. downloading the .spz/.glb) runs in a worker thread
+the moment that operation completes.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+HTTP_TIMEOUT_S = 30
+
+
+class OperationTracker:
+    """Tracks Marble operations to completion with a shared session and one polling loop."""
+
+    def __init__(
+        self,
+        base_url: str,
+        headers: dict,
+        min_interval: float = 2.0,
+        max_interval: float = 30.0,
+        backoff: float = 1.5,
+        timeout: float = 600.0,
+        max_requests: int = 8,
+    ):
+        """
+        Args:
+            base_url: Marble API root, e.g. https://api.worldlabs.ai
+            headers: auth headers sent with every poll
+            min_interval / max_interval: bounds on the per-operation poll interval (s)
+            backoff: interval multiplier while an operation reports no progress
+            timeout: default per-operation timeout (s)
+            max_requests: max poll requests in flight at once
+        """
+        self.base_url = base_url
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout = timeout
+        self.polls = 0
+        self.retries = 0
+
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_requests)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._requests = asyncio.Semaphore(max_requests)
+        self._active = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="marble-operations", daemon=True)
+        self._thread.start()
+
+    def track(
+        self,
+        operation_id: str,
+        on_done: Callable[[dict], object] | None = None,
+        on_progress: Callable[[dict, float], None] | None = None,
+        timeout: float | None = None,
+        min_interval: float | None = None,
+    ) -> Future:
+        """
+        Start polling an operation.
+
+        Returns a Future that resolves to on_done(operation) if on_done is
+        given, else to the completed operation data. It raises RuntimeError
+        if the operation reports an error and TimeoutError after `timeout`
+        seconds. on_progress(operation, elapsed_s) is called on the polling
+        thread after every successful poll and must not block.
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self._track(
+                operation_id,
+                on_done,
+                on_progress,
+                self.timeout if timeout is None else timeout,
+                self.min_interval if min_interval is None else min_interval,
+            ),
+            self._loop,
+        )
+
+    @property
+    def active(self) -> int:
+        """Number of operations currently being polled."""
+        return self._active
+
+    async def _get(self, operation_id: str) -> tuple[dict | None, float | None]:
+        """One poll. Returns (operation, None), or (None, retry_after_s) on a transient failure."""
+        url = f"{self.base_url}/marble/v1/operations/{operation_id}"
+        try:
+            async with self._requests:
+                resp = await asyncio.to_thread(self.session.get, url, timeout=HTTP_TIMEOUT_S)
+        except (requests.ConnectionError, requests.Timeout):
+            self.retries += 1
+            return None, None
+        self.polls += 1
+
+        if resp.status_code == 429 or resp.status_code >= 500:
+            self.retries += 1
+            retry_after = resp.headers.get("Retry-After")
+            return None, float(retry_after) if retry_after and retry_after.isdigit() else None
+        resp.raise_for_status()
+        return resp.json(), None
+
+    async def _track(self, operation_id, on_done, on_progress, timeout, min_interval):
+        start = time.time()
+        interval = min_interval
+        last_progress = None
+        self._active += 1
+        try:
+            while True:
+                data, retry_after = await self._get(operation_id)
+                if data is not None:
+                    if on_progress is not None:
+                        on_progress(data, time.time() - start)
+                    if data.get("done"):
+                        if data.get("error"):
+                            raise RuntimeError(f"Generation failed: {data['error']}")
+                        if on_done is not None:
+                            return await asyncio.to_thread(on_done, data)
+                        return data
+
+                    progress = data.get("metadata", {}).get("progress", {})
+                    progress = (progress.get("status"), progress.get("description"))
+                    if progress != last_progress:
+                        interval = min_interval
+                    else:
+                        interval = min(interval * self.backoff, self.max_interval)
+                    last_progress = progress
+                else:
+                    interval = max(min(interval * 2, self.max_interval), retry_after or 0)
+
+                remaining = timeout - (time.time() - start)
+                if remaining <= 0:
+                    raise TimeoutError(f"Operation {operation_id} timed out after {timeout:.0f}s")
+                await asyncio.sleep(min(interval, remaining))
+        finally:
+            self._active -= 1
+
+    def close(self):
+        """Stop the polling loop. Pending operations are abandoned."""
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self.session.close()
@@ -0,0 +1,247 @@
+"""
+Encode stitched equirect panos for upload: PNG (parallel or PIL), JPEG, WebP.
+
+encode_png_parallel deflates bands of rows on separate threads and joins
+the streams into one standard PNG, since PIL's writer uses a single core.
+
+Usage:
+    # Encode time and size per zoom level for a cached / fetched pano
+    python pipeline/pano_encoder.py --benchmark --pano-id 7m6cOuZYXUqYeRz5aXXylA --zooms 2 3 4
+
+    # Convert
+    python pipeline/pano_encoder.py pano.png pano.webp --quality 90
+"""
+
+import argparse
+import os
+import struct
+import sys
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import BinaryIO
+
+import numpy as np
+
+
+FORMATS = ("png", "jpeg", "webp")
+EXTENSIONS = {"png": "png", "jpeg": "jpg", "webp": "webp"}
+PNG_FILTERS = {"none": 0, "sub": 1, "up": 2, "paeth": 4}
+PNG_COLOR_TYPES = {1: 0, 3: 2, 4: 6}  # channels -> PNG color type
+ENCODE_WORKERS = os.cpu_count() or 1
+MIN_BAND_ROWS = 64
+WEBP_MAX_DIM = 16383
+
+
+def _png_chunk(out: BinaryIO, tag: bytes, data: bytes | memoryview = b""):
+    out.write(struct.pack(">I", len(data)))
+    out.write(tag)
+    out.write(data)
+    out.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(tag)) & 0xFFFFFFFF))
+
+
+def _zlib_header(level: int) -> bytes:
+    """Two-byte zlib header (deflate, 32K window) with the FLEVEL hint for `level`."""
+    cmf = 0x78
+    flevel = 0 if level < 2 else 1 if level < 6 else 2 if level == 6 else 3
+    flg = flevel << 6
+    flg += 31 - (cmf * 256 + flg) % 31
+    return bytes([cmf, flg])
+
+
+def _filter_band(image: np.ndarray, r0: int, r1: int, filter_type: int) -> np.ndarray:
+    """PNG-filter rows [r0, r1) into a (rows, 1 + W*C) uint8 scanline array."""
+    raw = image[r0:r1].reshape(r1 - r0, -1)
+    bpp = image.shape[2]
+    up = image[r0 - 1].reshape(1, -1) if r0 > 0 else np.zeros((1, raw.shape[1]), np.uint8)
+
+    out = np.empty((raw.shape[0], raw.shape[1] + 1), np.uint8)
+    out[:, 0] = filter_type
+    if filter_type == 0:
+        out[:, 1:] = raw
+        return out
+
+    prev = np.concatenate([up, raw[:-1]])  # the row above each row
+    if filter_type == 2:
+        np.subtract(raw, prev, out=out[:, 1:])
+        return out
+
+    left = np.zeros_like(raw)
+    left[:, bpp:] = raw[:, :-bpp]
+    if filter_type == 1:
+        np.subtract(raw, left, out=out[:, 1:])
+        return out
+
+    # Paeth: predict from left (a), up (b) or up-left (c), whichever is closest to a + b - c
+    upleft = np.zeros_like(prev)
+    upleft[:, bpp:] = prev[:, :-bpp]
+    a, b, c = left.astype(np.int16), prev.astype(np.int16), upleft.astype(np.int16)
+    p = a + b - c
+    pa, pb, pc = np.abs(p - a), np.abs(p - b), np.abs(p - c)
+    pred = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c)).astype(np.uint8)
+    np.subtract(raw, pred, out=out[:, 1:])
+    return out
+
+
+def encode_png_parallel(
+    image: np.ndarray,
+    out: BinaryIO,
+    level: int = 6,
+    filter: str = "up",
+    workers: int = ENCODE_WORKERS,
+):
+    """
+    Write image (H, W) or (H, W, C) uint8, C in 1/3/4, as a PNG to out, deflating bands of rows in parallel.
+
+    Args:
+        image: uint8 pixels
+        out: binary stream to write the PNG to
+        level: zlib compression level 0-9
+        filter: PNG scanline filter for every row: none, sub, up or paeth
+        workers: compression threads
+    """
+    if image.ndim == 2:
+        image = image[:, :, None]
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    h, w, channels = image.shape
+    filter_type = PNG_FILTERS[filter]
+
+    n_bands = max(1, min(workers * 2, h // MIN_BAND_ROWS))
+    bounds = np.linspace(0, h, n_bands + 1).astype(int)
+
+    def compress_band(i: int) -> tuple[bytes, np.ndarray]:
+        scanlines = _filter_band(image, bounds[i], bounds[i + 1], filter_type)
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        data = compressor.compress(scanlines)
+        # A sync flush ends the band on a byte boundary without a final block, so the
+        # raw streams concatenate into one; the whole image's Adler-32 goes at the end
+        data += compressor.flush(zlib.Z_FINISH if i == n_bands - 1 else zlib.Z_SYNC_FLUSH)
+        return data, scanlines
+
+    out.write(b"\x89PNG\r\n\x1a\n")
+    _png_chunk(out, b"IHDR", struct.pack(">IIBBBBB", w, h, 8, PNG_COLOR_TYPES[channels], 0, 0, 0))
+    _png_chunk(out, b"IDAT", _zlib_header(level))
+
+    adler = 1
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for data, scanlines in pool.map(compress_band, range(n_bands)):
+            adler = zlib.adler32(scanlines, adler)
+            _png_chunk(out, b"IDAT", data)
+
+    _png_chunk(out, b"IDAT", struct.pack(">I", adler & 0xFFFFFFFF))
+    _png_chunk(out, b"IEND")
+
+
+def encode_image(
+    image: np.ndarray,
+    fmt: str = "png",
+    level: int = 6,
+    quality: int = 95,
+    workers: int = ENCODE_WORKERS,
+) -> BytesIO:
+    """
+    Encode an equirect to an in-memory image file, positioned at 0.
+
+    Args:
+        image: (H, W, 3) uint8
+        fmt: png, jpeg or webp
+        level: PNG zlib level 0-9
+        quality: JPEG / WebP quality 1-100
+        workers: PNG threads; 1 uses PIL's single-threaded writer
+    """
+    from PIL import Image
+
+    buf = BytesIO()
+    if fmt == "png":
+        if workers > 1:
+            encode_png_parallel(image, buf, level=level, workers=workers)
+        else:
+            Image.fromarray(image).save(buf, format="PNG", compress_level=level)
+    elif fmt == "jpeg":
+        Image.fromarray(image).save(buf, format="JPEG", quality=quality, subsampling=0)
+    elif fmt == "webp":
+        if max(image.shape[:2]) > WEBP_MAX_DIM:
+            raise ValueError(f"WebP is limited to {WEBP_MAX_DIM}px; {image.shape[1]}x{image.shape[0]} needs png or jpeg")
+        Image.fromarray(image).save(buf, format="WEBP", quality=quality)
+    else:
+        raise ValueError(f"Unknown format {fmt!r} (expected one of {FORMATS})")
+    buf.seek(0)
+    return buf
+
+
+def benchmark(images: dict[int, np.ndarray], level: int, quality: int, workers: int):
+    """Print encode time and size for each encoder on each zoom's equirect."""
+    configs = [
+        ("PIL png", dict(fmt="png", level=level, workers=1)),
+        ("PIL png L1", dict(fmt="png", level=1, workers=1)),
+        (f"parallel png x{workers}", dict(fmt="png", level=level, workers=workers)),
+        (f"parallel png L1 x{workers}", dict(fmt="png", level=1, workers=workers)),
+        (f"jpeg q{quality}", dict(fmt="jpeg", quality=quality)),
+        (f"webp q{quality}", dict(fmt="webp", quality=quality)),
+    ]
+    print(f"{'zoom':>4}  {'size':>11}  {'encoder':<22} {'time':>9}  {'MB':>7}  {'ratio':>6}")
+    for zoom, image in sorted(images.items()):
+        raw_mb = image.nbytes / (1024 * 1024)
+        for name, kwargs in configs:
+            try:
+                t0 = time.perf_counter()
+                buf = encode_image(image, **kwargs)
+                elapsed = time.perf_counter() - t0
+            except ValueError as e:
+                print(f"{zoom:>4}  {image.shape[1]:>5}x{image.shape[0]:<5}  {name:<22} skipped: {e}")
+                continue
+            mb = buf.getbuffer().nbytes / (1024 * 1024)
+            print(f"{zoom:>4}  {image.shape[1]:>5}x{image.shape[0]:<5}  {name:<22} "
+                  f"{elapsed * 1000:7.0f}ms  {mb:7.1f}  {raw_mb / mb:5.1f}x")
+
+
+def main():
+    from PIL import Image
+
+    parser = argparse.ArgumentParser(description="Equirect pano encoders")
+    parser.add_argument("input", nargs="?", help="Image to convert")
+    parser.add_argument("output", nargs="?", help="Output path (format from extension)")
+    parser.add_argument("--benchmark", action="store_true", help="Time each encoder per zoom level")
+    parser.add_argument("--image", type=str, default=None, help="Benchmark: equirect resized to each zoom")
+    parser.add_argument("--pano-id", type=str, default=None, help="Benchmark: stitch this pano at each zoom")
+    parser.add_argument("--zooms", type=int, nargs="+", default=[2, 3, 4], help="Benchmark zoom levels")
+    parser.add_argument("--level", type=int, default=6, help="PNG zlib level 0-9")
+    parser.add_argument("--quality", type=int, default=95, help="JPEG / WebP quality")
+    parser.add_argument("--workers", type=int, default=ENCODE_WORKERS, help="PNG encode threads")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        images = {}
+        if args.pano_id:
+            from fetch_streetview import create_session, stitch_pano_tiles
+
+            api_key = os.environ.get("GOOGLE_MAPS_API_KEY", "")
+            session = create_session(api_key)
+            for zoom in args.zooms:
+                images[zoom] = stitch_pano_tiles(api_key, session, args.pano_id, zoom)
+        elif args.image:
+            source = Image.open(args.image).convert("RGB")
+            for zoom in args.zooms:
+                size = (512 * 2 ** zoom, 256 * 2 ** zoom)
+                images[zoom] = np.asarray(source.resize(size, Image.BILINEAR))
+        else:
+            sys.exit("--benchmark needs --pano-id or --image")
+        benchmark(images, args.level, args.quality, args.workers)
+        return
+
+    if not (args.input and args.output):
+        parser.error("input and output are required unless --benchmark")
+    ext = args.output.rsplit(".", 1)[-1].lower()
+    fmt = {"jpg": "jpeg"}.get(ext, ext)
+    image = np.asarray(Image.open(args.input).convert("RGB"))
+    t0 = time.perf_counter()
+    buf = encode_image(image, fmt, level=args.level, quality=args.quality, workers=args.workers)
+    with buf.getbuffer() as view, open(args.output, "wb") as f:
+        f.write(view)
+    print(f"{args.output}: {os.path.getsize(args.output) / (1024 * 1024):.1f} MB "
+          f"in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
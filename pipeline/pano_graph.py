@@ -0,0 +1,224 @@
+"""
+Local store of crawled Street View panos and the links between them.
+
+crawl_street reads pano metadata from here before calling the API and writes
+every newly fetched pano back, so re-crawling a street costs no metadata
+requests. Neighbour and radius queries run against SQLite, so route
+planning works offline.
+
+Usage:
+    # Seed the store from existing crawl outputs
+    python pipeline/pano_graph.py import data/streetview-overlap/metadata.json data/streetview-intersection/metadata.json
+
+    # Panos within 40m of a point
+    python pipeline/pano_graph.py near 40.7285 -73.9875 --radius 40
+
+    python pipeline/pano_graph.py stats
+"""
+
+import argparse
+import json
+import math
+import sqlite3
+import time
+from pathlib import Path
+
+
+DEFAULT_DB_PATH = "data/cache/panos.sqlite"
+EARTH_RADIUS_M = 6371000.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS panos (
+    pano_id TEXT PRIMARY KEY,
+    lat REAL,
+    lng REAL,
+    heading REAL,
+    date TEXT,
+    image_width INTEGER,
+    image_height INTEGER,
+    fetched_at TEXT
+);
+CREATE INDEX IF NOT EXISTS panos_lat_lng ON panos (lat, lng);
+CREATE TABLE IF NOT EXISTS links (
+    src TEXT NOT NULL,
+    dst TEXT NOT NULL,
+    heading REAL,
+    text TEXT,
+    elevation REAL,
+    position INTEGER,
+    PRIMARY KEY (src, dst)
+);
+"""
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in meters."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class PanoGraph:
+    """SQLite-backed pano nodes (lat/lng, date, heading) and link edges."""
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM panos").fetchone()[0]
+
+    def __contains__(self, pano_id: str) -> bool:
+        row = self.conn.execute("SELECT 1 FROM panos WHERE pano_id = ?", (pano_id,)).fetchone()
+        return row is not None
+
+    def _links(self, pano_id: str) -> list[dict]:
+        rows = self.conn.execute(
+            "SELECT dst, heading, text, elevation FROM links WHERE src = ? ORDER BY position",
+            (pano_id,),
+        )
+        links = []
+        for row in rows:
+            link = {"panoId": row["dst"]}
+            if row["heading"] is not None:
+                link["heading"] = row["heading"]
+            if row["text"] is not None:
+                link["text"] = row["text"]
+            if row["elevation"] is not None:
+                link["elevationAboveEgm96"] = row["elevation"]
+            links.append(link)
+        return links
+
+    def _pano(self, row: sqlite3.Row) -> dict:
+        return {
+            "pano_id": row["pano_id"],
+            "lat": row["lat"],
+            "lng": row["lng"],
+            "heading": row["heading"],
+            "date": row["date"],
+            "image_width": row["image_width"],
+            "image_height": row["image_height"],
+            "links": self._links(row["pano_id"]),
+        }
+
+    def get(self, pano_id: str) -> dict | None:
+        """Return a pano in crawl_street's {pano_id, lat, lng, heading, links, ...} format."""
+        row = self.conn.execute("SELECT * FROM panos WHERE pano_id = ?", (pano_id,)).fetchone()
+        return self._pano(row) if row else None
+
+    def put(self, pano: dict, commit: bool = True):
+        """Insert or replace a pano and its outgoing links."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO panos VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                pano["pano_id"], pano.get("lat"), pano.get("lng"), pano.get("heading"),
+                pano.get("date"), pano.get("image_width"), pano.get("image_height"),
+                time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            ),
+        )
+        self.conn.execute("DELETE FROM links WHERE src = ?", (pano["pano_id"],))
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO links VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    pano["pano_id"], link["panoId"], link.get("heading"),
+                    link.get("text"), link.get("elevationAboveEgm96"), i,
+                )
+                for i, link in enumerate(pano.get("links", []))
+                if link.get("panoId")
+            ],
+        )
+        if commit:
+            self.conn.commit()
+
+    def put_many(self, panos: list[dict]):
+        with self.conn:
+            for pano in panos:
+                self.put(pano, commit=False)
+
+    def neighbours(self, pano_id: str) -> list[dict]:
+        """Linked panos (with link heading), including ones not fetched yet (lat/lng None)."""
+        rows = self.conn.execute(
+            """
+            SELECT l.dst, l.heading AS link_heading, p.lat, p.lng
+            FROM links l LEFT JOIN panos p ON p.pano_id = l.dst
+            WHERE l.src = ? ORDER BY l.position
+            """,
+            (pano_id,),
+        )
+        return [
+            {"pano_id": r["dst"], "heading": r["link_heading"], "lat": r["lat"], "lng": r["lng"]}
+            for r in rows
+        ]
+
+    def within_radius(self, lat: float, lng: float, radius_m: float) -> list[tuple[float, dict]]:
+        """Panos within radius_m of (lat, lng), nearest first, as (distance_m, pano) pairs."""
+        dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+        dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        rows = self.conn.execute(
+            "SELECT * FROM panos WHERE lat BETWEEN ? AND ? AND lng BETWEEN ? AND ?",
+            (lat - dlat, lat + dlat, lng - dlng, lng + dlng),
+        ).fetchall()
+
+        hits = []
+        for row in rows:
+            dist = haversine_m(lat, lng, row["lat"], row["lng"])
+            if dist <= radius_m:
+                hits.append((dist, self._pano(row)))
+        hits.sort(key=lambda hit: hit[0])
+        return hits
+
+    def import_metadata(self, path: str) -> int:
+        """Load the panos from a fetch_streetview.py metadata.json. Returns count."""
+        with open(path) as f:
+            meta = json.load(f)
+        panos = [p for p in meta.get("panos", []) if p.get("pano_id")]
+        self.put_many(panos)
+        return len(panos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Street View pano graph")
+    parser.add_argument("--db", type=str, default=DEFAULT_DB_PATH, help="SQLite path")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imp = sub.add_parser("import", help="Import crawl metadata.json files")
+    imp.add_argument("paths", nargs="+")
+
+    near = sub.add_parser("near", help="Panos within a radius of a point")
+    near.add_argument("lat", type=float)
+    near.add_argument("lng", type=float)
+    near.add_argument("--radius", type=float, default=50.0, help="Radius in meters")
+
+    sub.add_parser("stats", help="Node and edge counts")
+    args = parser.parse_args()
+
+    graph = PanoGraph(args.db)
+    if args.command == "import":
+        for path in args.paths:
+            n = graph.import_metadata(path)
+            print(f"Imported {n} panos from {path}")
+        print(f"Graph now has {len(graph)} panos")
+    elif args.command == "near":
+        hits = graph.within_radius(args.lat, args.lng, args.radius)
+        for dist, pano in hits:
+            print(f"  {dist:6.1f}m  {pano['pano_id']}  ({pano['lat']:.6f}, {pano['lng']:.6f})  "
+                  f"date={pano['date']} links={len(pano['links'])}")
+        print(f"{len(hits)} panos within {args.radius:.0f}m")
+    else:
+        n_links = graph.conn.execute("SELECT COUNT(*) FROM links").fetchone()[0]
+        print(f"{args.db}: {len(graph)} panos, {n_links} links")
+    graph.close()
+
+
+if __name__ == "__main__":
+    main()
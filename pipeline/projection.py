@@ -0,0 +1,451 @@
+"""
+Equirectangular → perspective projection shared by the pipeline scripts.
+
+Used by fetch_streetview.py (overlap mode), extract_pano_crops.py (Mapillary)
+and marble_generator.py (multi-image mode) so every entry point produces the
+same crops from the same pano.
+
+A "view" is a (heading_deg, pitch_deg, fov_deg, out_size) tuple. For a given
+equirect size each view maps to a fixed lookup table ("plan") of flat pixel
+indices, which is cached so projecting a crop is a single gather.
+
+Nearest sampling is the default fast path. Bilinear, bicubic and area
+(antialiased) sampling wrap horizontally at the ±180° seam and use cv2.remap
+when OpenCV is installed, falling back to vectorized NumPy otherwise. They
+give usable crops from lower tile zooms (fewer tile requests).
+
+    from projection import equirect_to_perspectives
+
+    views = [(h, 0.0, 90.0, 512) for h in range(0, 360, 45)]
+    crops = equirect_to_perspectives(equirect, views, interpolation="bilinear")
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import cv2
+except ImportError:  # optional: faster remap for the interpolating samplers
+    cv2 = None
+
+
+# Plans are keyed on geometry only, so the same heading/pitch combos are reused
+# for every pano in a crawl. A 512px plan is 1 MB of int32.
+PLAN_CACHE_SIZE = 32
+PLAN_CACHE_DIR = ""  # see set_plan_cache_dir
+_PLAN_CACHE: OrderedDict[tuple, np.ndarray] = OrderedDict()
+_PLAN_CACHE_LOCK = threading.Lock()
+
+View = tuple[float, float, float, int]
+
+INTERPOLATIONS = ("nearest", "bilinear", "bicubic", "area")
+CUBIC_A = -0.75  # matches cv2.INTER_CUBIC
+MAX_SUPERSAMPLE = 4
+
+
+@lru_cache(maxsize=16)
+def _ray_grid(fov_deg: float, out_size: int, dtype: type = np.float32) -> np.ndarray:
+    """Unit camera-space rays (x=right, y=down, z=forward) for every output pixel.
+
+    Returns a read-only (out_size*out_size, 3) array, shared by all views with
+    the same fov and size.
+    """
+    fov = np.radians(fov_deg)
+    f = (out_size / 2) / np.tan(fov / 2)
+
+    u = np.arange(out_size, dtype=np.float64) - out_size / 2
+    uu, vv = np.meshgrid(u, u)
+    zz = np.full_like(uu, f)
+    norm = np.sqrt(uu**2 + vv**2 + zz**2)
+    rays = np.stack([uu / norm, vv / norm, zz / norm], axis=-1).reshape(-1, 3)
+
+    rays = rays.astype(dtype)
+    rays.flags.writeable = False
+    return rays
+
+
+def _rotation(heading_deg: float, pitch_deg: float) -> np.ndarray:
+    """Camera → world rotation: pitch around x (positive = up), then heading around y."""
+    cos_p, sin_p = np.cos(np.radians(-pitch_deg)), np.sin(np.radians(-pitch_deg))
+    cos_h, sin_h = np.cos(np.radians(heading_deg)), np.sin(np.radians(heading_deg))
+
+    r_pitch = np.array([[1, 0, 0], [0, cos_p, -sin_p], [0, sin_p, cos_p]])
+    r_heading = np.array([[cos_h, 0, sin_h], [0, 1, 0], [-sin_h, 0, cos_h]])
+    return r_heading @ r_pitch
+
+
+def _view_key(kind: str, eq_shape: tuple[int, int], view: View) -> tuple:
+    heading, pitch, fov, out_size = view
+    return (
+        kind,
+        (int(eq_shape[0]), int(eq_shape[1])),
+        float(heading), float(pitch), float(fov), int(out_size),
+    )
+
+
+def _compute_coords(
+    eq_shape: tuple[int, int],
+    views: list[View],
+    dtype: type = np.float32,
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    Map every output pixel of many views to continuous equirect coordinates.
+
+    Runs one vectorized pass per (fov, size) group. Returns per-view (eq_x, eq_y)
+    arrays of out_size*out_size, where pixel i spans [i, i+1). In float64 the
+    rotations are applied one axis at a time, in the original per-crop order,
+    so nearest plans truncate to exactly the pixels it picked.
+    """
+    h_eq, w_eq = eq_shape
+    coords: list[tuple[np.ndarray, np.ndarray] | None] = [None] * len(views)
+
+    groups: dict[tuple[float, int], list[int]] = {}
+    for i, (_, _, fov, out_size) in enumerate(views):
+        groups.setdefault((float(fov), int(out_size)), []).append(i)
+
+    for (fov, out_size), idxs in groups.items():
+        rays = _ray_grid(fov, out_size, dtype)
+
+        # World-space ray components, each (views, pixels)
+        if dtype == np.float64:
+            pitch = np.radians([-views[i][1] for i in idxs])[:, None]
+            heading = np.radians([views[i][0] for i in idxs])[:, None]
+            rx, ry, rz = rays.T
+            y = np.cos(pitch) * ry - np.sin(pitch) * rz
+            z = np.sin(pitch) * ry + np.cos(pitch) * rz
+            x = np.cos(heading) * rx + np.sin(heading) * z
+            z = -np.sin(heading) * rx + np.cos(heading) * z
+        else:
+            rots = np.stack([_rotation(views[i][0], views[i][1]) for i in idxs]).astype(dtype)
+            rays_t = np.ascontiguousarray(rays.T)
+            x = rots[:, 0] @ rays_t
+            y = rots[:, 1] @ rays_t
+            z = rots[:, 2] @ rays_t
+
+        lon = np.arctan2(x, z)
+        lat = np.arcsin(np.clip(y, -1, 1))
+
+        eq_x = (lon / dtype(np.pi) + 1) / 2 * w_eq
+        eq_y = (lat / dtype(np.pi / 2) + 1) / 2 * h_eq
+
+        for row, i in enumerate(idxs):
+            coords[i] = (eq_x[row], eq_y[row])
+
+    return coords
+
+
+def _compute_plans(kind: str, eq_shape: tuple[int, int], views: list[View]) -> list[np.ndarray]:
+    """Compute "index" plans (flat int32 pixel indices) or "coords" plans
+    ((2, pixels) float32 sample positions, pixel centres at integers)."""
+    h_eq, w_eq = eq_shape
+    plans = []
+    dtype = np.float64 if kind == "index" else np.float32
+    for eq_x, eq_y in _compute_coords(eq_shape, views, dtype):
+        if kind == "index":
+            ix = np.clip(eq_x, 0, w_eq - 1).astype(np.int32)
+            iy = np.clip(eq_y, 0, h_eq - 1).astype(np.int32)
+            plans.append(iy * np.int32(w_eq) + ix)
+        else:
+            plans.append(np.stack([eq_x - 0.5, eq_y - 0.5]))
+    return plans
+
+
+def view_footprint(
+    eq_shape: tuple[int, int],
+    views: list[View],
+    block_size: int,
+    margin: float = 2.0,
+) -> set[tuple[int, int]]:
+    """
+    Return the (bx, by) blocks of block_size pixels that any view samples from.
+
+    Used to fetch only the tiles a crop set needs. margin (in equirect pixels)
+    covers the extra taps of the interpolating samplers; x wraps at the seam.
+    """
+    h_eq, w_eq = eq_shape
+    bx_count = -(-w_eq // block_size)
+    by_count = -(-h_eq // block_size)
+    hit = np.zeros(by_count * bx_count, dtype=bool)
+
+    for view in views:
+        ((eq_x, eq_y),) = _compute_coords(eq_shape, [view])
+        for dx in (-margin, margin):
+            bx = (np.floor(eq_x + dx).astype(np.int64) % w_eq) // block_size
+            for dy in (-margin, margin):
+                by = np.clip(np.floor(eq_y + dy).astype(np.int64), 0, h_eq - 1) // block_size
+                hit[by * bx_count + bx] = True
+
+    return {(int(i % bx_count), int(i // bx_count)) for i in np.flatnonzero(hit)}
+
+
+def _plan_cache_path(key: tuple) -> Path:
+    kind, (h_eq, w_eq), heading, pitch, fov, out_size = key
+    name = f"{kind}_{h_eq}x{w_eq}_h{heading!r}_p{pitch!r}_f{fov!r}_s{out_size}.npy"
+    return Path(PLAN_CACHE_DIR) / name
+
+
+def _load_plan(key: tuple) -> np.ndarray | None:
+    if not PLAN_CACHE_DIR:
+        return None
+    path = _plan_cache_path(key)
+    if not path.exists():
+        return None
+    try:
+        plan = np.load(path)
+    except (OSError, ValueError):
+        return None
+    kind, out_size = key[0], key[-1]
+    if kind == "index":
+        expected = (np.int32, (out_size * out_size,))
+    else:
+        expected = (np.float32, (2, out_size * out_size))
+    if (plan.dtype, plan.shape) != expected:
+        return None
+    return plan
+
+
+def _save_plan(key: tuple, plan: np.ndarray):
+    path = _plan_cache_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, plan)
+    os.replace(tmp_path, path)
+
+
+def set_plan_cache_dir(path: str | None):
+    """Persist computed plans as .npy files under path, reused across runs (None disables)."""
+    global PLAN_CACHE_DIR
+    PLAN_CACHE_DIR = path or ""
+
+
+def get_projection_plans(
+    eq_shape: tuple[int, int],
+    views: list[View],
+    kind: str = "index",
+) -> list[np.ndarray]:
+    """
+    Return cached lookup tables for a list of views.
+
+    kind="index" plans are read-only int32 arrays of out_size*out_size flat
+    indices into the (H*W) equirect, used for nearest sampling. kind="coords"
+    plans are (2, out_size*out_size) float32 sample positions, used by the
+    interpolating samplers. Plans are held in an in-memory LRU of
+    PLAN_CACHE_SIZE entries and, after set_plan_cache_dir, persisted as
+    .npy files across runs. Missing plans are computed together in one
+    batched pass.
+    """
+    keys = [_view_key(kind, eq_shape, view) for view in views]
+    plans: list[np.ndarray | None] = [None] * len(views)
+
+    with _PLAN_CACHE_LOCK:
+        for i, key in enumerate(keys):
+            plan = _PLAN_CACHE.get(key)
+            if plan is not None:
+                _PLAN_CACHE.move_to_end(key)
+                plans[i] = plan
+
+    missing = []
+    for i, key in enumerate(keys):
+        if plans[i] is None:
+            plans[i] = _load_plan(key)
+            if plans[i] is None:
+                missing.append(i)
+
+    if missing:
+        computed = _compute_plans(kind, eq_shape, [views[i] for i in missing])
+        for i, plan in zip(missing, computed):
+            plan = plan.copy()
+            if PLAN_CACHE_DIR:
+                _save_plan(keys[i], plan)
+            plans[i] = plan
+
+    with _PLAN_CACHE_LOCK:
+        for key, plan in zip(keys, plans):
+            plan.flags.writeable = False
+            _PLAN_CACHE[key] = plan
+            _PLAN_CACHE.move_to_end(key)
+        while len(_PLAN_CACHE) > PLAN_CACHE_SIZE:
+            _PLAN_CACHE.popitem(last=False)
+
+    return plans
+
+
+def get_projection_plan(
+    eq_shape: tuple[int, int],
+    heading_deg: float,
+    pitch_deg: float = 0.0,
+    fov_deg: float = 90.0,
+    out_size: int = 512,
+) -> np.ndarray:
+    """Return the cached nearest-sampling lookup table for a single perspective crop."""
+    return get_projection_plans(eq_shape, [(heading_deg, pitch_deg, fov_deg, out_size)])[0]
+
+
+# ---- Interpolating samplers ----
+
+def _cubic_weights(t: np.ndarray) -> list[np.ndarray]:
+    """Keys cubic convolution weights for taps at offsets -1, 0, 1, 2."""
+    a = CUBIC_A
+    weights = []
+    for offset in (-1, 0, 1, 2):
+        d = np.abs(t - offset)
+        near = ((a + 2) * d - (a + 3)) * d * d + 1
+        far = ((a * d - 5 * a) * d + 8 * a) * d - 4 * a
+        weights.append(np.where(d <= 1, near, np.where(d < 2, far, 0)).astype(np.float32))
+    return weights
+
+
+def _sample_numpy(flat: np.ndarray, eq_shape: tuple[int, int], coords: np.ndarray, mode: str) -> np.ndarray:
+    """
+    Sample (H*W, C) pixels at (2, P) float coordinates.
+
+    x wraps around the ±180° seam, y is clamped at the poles. Returns (P, C) float32.
+    """
+    h_eq, w_eq = eq_shape
+    mx, my = coords
+    x0 = np.floor(mx)
+    y0 = np.floor(my)
+    tx = (mx - x0)[:, None]
+    ty = (my - y0)[:, None]
+    x0 = x0.astype(np.int64)
+    y0 = y0.astype(np.int64)
+
+    if mode == "bilinear":
+        taps, wx, wy = (0, 1), [1 - tx, tx], [1 - ty, ty]
+    else:
+        taps, wx, wy = (-1, 0, 1, 2), _cubic_weights(tx), _cubic_weights(ty)
+
+    cols = [(x0 + dx) % w_eq for dx in taps]
+    out = np.zeros((mx.shape[0], flat.shape[1]), dtype=np.float32)
+    for dy, weight_y in zip(taps, wy):
+        row = np.clip(y0 + dy, 0, h_eq - 1) * w_eq
+        acc = np.zeros_like(out)
+        for col, weight_x in zip(cols, wx):
+            acc += weight_x * flat[row + col]
+        out += weight_y * acc
+    return out
+
+
+def _sample_cv2(padded: np.ndarray, pad: int, coords: np.ndarray, out_size: int, mode: str) -> np.ndarray:
+    """Sample with cv2.remap from an equirect pre-padded horizontally by `pad` wrapped columns."""
+    map_x = (coords[0] + pad).reshape(out_size, out_size)
+    map_y = coords[1].reshape(out_size, out_size)
+    interp = cv2.INTER_LINEAR if mode == "bilinear" else cv2.INTER_CUBIC
+    return cv2.remap(padded, map_x, map_y, interp, borderMode=cv2.BORDER_REPLICATE)
+
+
+def _supersample_factor(eq_shape: tuple[int, int], fov_deg: float, out_size: int) -> int:
+    """How many source pixels land on one output pixel at the crop centre (1 when upsampling)."""
+    src_per_rad = eq_shape[1] / (2 * np.pi)
+    out_per_rad = (out_size / 2) / np.tan(np.radians(fov_deg) / 2)
+    return int(np.clip(np.ceil(src_per_rad / out_per_rad - 1e-6), 1, MAX_SUPERSAMPLE))
+
+
+def _to_dtype(values: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        values = np.clip(np.rint(values), info.min, info.max)
+    return values.astype(dtype)
+
+
+def equirect_to_perspectives(
+    equirect: np.ndarray,
+    views: list[View],
+    interpolation: str = "nearest",
+) -> list[np.ndarray]:
+    """
+    Extract many perspective crops from one equirectangular panorama.
+
+    Args:
+        equirect: HxWx3 uint8 array (equirectangular panorama, 2:1 aspect)
+        views: list of (heading_deg, pitch_deg, fov_deg, out_size) tuples
+        interpolation: "nearest" (single gather, fastest), "bilinear",
+            "bicubic", or "area" (supersampled bilinear, antialiases crops
+            that downsample the pano)
+
+    Returns:
+        List of out_size x out_size x 3 arrays (equirect dtype), in the order of views
+    """
+    if interpolation not in INTERPOLATIONS:
+        raise ValueError(f"Unknown interpolation {interpolation!r}, expected one of {INTERPOLATIONS}")
+
+    h_eq, w_eq = equirect.shape[:2]
+    channels = equirect.shape[2:]
+    flat = equirect.reshape(h_eq * w_eq, -1)
+    crops: list[np.ndarray | None] = [None] * len(views)
+
+    if interpolation == "nearest":
+        plans = get_projection_plans((h_eq, w_eq), views)
+        by_size: dict[int, list[int]] = {}
+        for i, view in enumerate(views):
+            by_size.setdefault(int(view[3]), []).append(i)
+
+        # One gather per output size
+        for out_size, idxs in by_size.items():
+            stacked = np.take(flat, np.stack([plans[i] for i in idxs]), axis=0)
+            stacked = stacked.reshape(len(idxs), out_size, out_size, *channels)
+            for row, i in enumerate(idxs):
+                crops[i] = stacked[row]
+        return crops
+
+    # "area" renders each view k times larger with bilinear, then box-filters down
+    factors = [1] * len(views)
+    mode = interpolation
+    if interpolation == "area":
+        mode = "bilinear"
+        factors = [_supersample_factor((h_eq, w_eq), fov, size) for _, _, fov, size in views]
+    render_views = [
+        (heading, pitch, fov, int(size) * k)
+        for (heading, pitch, fov, size), k in zip(views, factors)
+    ]
+    plans = get_projection_plans((h_eq, w_eq), render_views, kind="coords")
+
+    use_cv2 = cv2 is not None and flat.shape[1] <= 4
+    if use_cv2:
+        pad = 4
+        image = equirect.reshape(h_eq, w_eq, -1)
+        padded = np.concatenate([image[:, -pad:], image, image[:, :pad]], axis=1)
+
+    for i, ((_, _, _, out_size), k, coords) in enumerate(zip(views, factors, plans)):
+        size = int(out_size) * k
+        if use_cv2:
+            crop = _sample_cv2(padded, pad, coords, size, mode).reshape(size, size, -1)
+        else:
+            crop = _sample_numpy(flat, (h_eq, w_eq), coords, mode).reshape(size, size, -1)
+        if k > 1:
+            crop = crop.reshape(int(out_size), k, int(out_size), k, -1).mean(axis=(1, 3), dtype=np.float32)
+        crops[i] = _to_dtype(crop, equirect.dtype).reshape(int(out_size), int(out_size), *channels)
+
+    return crops
+
+
+def equirect_to_perspective(
+    equirect: np.ndarray,
+    heading_deg: float,
+    pitch_deg: float = 0.0,
+    fov_deg: float = 90.0,
+    out_size: int = 512,
+    interpolation: str = "nearest",
+) -> np.ndarray:
+    """
+    Extract a perspective (rectilinear) crop from an equirectangular panorama.
+
+    Args:
+        equirect: HxWx3 uint8 array (equirectangular panorama, 2:1 aspect)
+        heading_deg: Horizontal angle in degrees (0=front, 90=right, etc.)
+        pitch_deg: Vertical angle in degrees (0=horizon, +up, -down)
+        fov_deg: Field of view in degrees
+        out_size: Output image size (square)
+        interpolation: "nearest", "bilinear", "bicubic" or "area"
+
+    Returns:
+        out_size x out_size x 3 uint8 array
+    """
+    views = [(heading_deg, pitch_deg, fov_deg, out_size)]
+    return equirect_to_perspectives(equirect, views, interpolation)[0]
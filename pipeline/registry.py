@@ -0,0 +1,295 @@
+"""
+Sharded, append-only world registry behind registry.json.
+
+Each generated world is appended as one JSON line to the shard for its
+region (geohash prefix of its center), under an exclusive file lock on that
+shard, so concurrent marble_generator runs never rewrite or clobber each
+other's entries. Every line carries its write time and the newest line for
+an id wins wherever it lives, so a world whose center moves to another
+region needs no cross-shard rewrite. A shard is compacted to one line per
+id once its log grows well past that. registry.json is exported from the
+shards for the viewer and world_index.py.
+
+Shard files start with a {"gen": <ns>} header that changes on every
+compaction; readers tail each shard from their last offset and reread it
+from the start when the header changes. Log lines after the header are
+{"t": <ns>, "world": {...}} or {"t": <ns>, "deleted": <id>}.
+
+Layout (next to registry.json):
+    registry.d/meta.json           origin, import marker
+    registry.d/<geohash>.jsonl     append-only world log for one region
+    registry.d/<geohash>.lock      flock target for that shard's writers
+    registry.d/registry.lock       flock target for meta, import and export
+
+Usage:
+    python pipeline/registry.py stats data/splats/marble/registry.json
+    python pipeline/registry.py get data/splats/marble/registry.json st-marks-40.7284_-73.9872
+    python pipeline/registry.py compact data/splats/marble/registry.json
+    python pipeline/registry.py export data/splats/marble/registry.json
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from world_index import geohash_encode
+
+
+SHARD_PRECISION = 5  # ~4.9km x 4.9km regions
+NO_CENTER_SHARD = "_"
+COMPACT_MIN_LINES = 64
+COMPACT_RATIO = 2.0  # compact once a shard log has this many lines per id it holds
+
+
+@contextmanager
+def _locked(lock_path: Path):
+    """Hold an exclusive flock on lock_path for the duration of the block."""
+    with open(lock_path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _write_atomic(path: Path, text: str):
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _line(record: dict) -> str:
+    return json.dumps(record, separators=(",", ":")) + "\n"
+
+
+def shard_key(entry: dict, precision: int = SHARD_PRECISION) -> str:
+    """Geohash prefix of a world's center, or NO_CENTER_SHARD."""
+    center = entry.get("center")
+    if not center:
+        return NO_CENTER_SHARD
+    return geohash_encode(center["lat"], center["lng"], precision)
+
+
+def store_dir_for(registry_path: str) -> Path:
+    """registry.json -> registry.d/ alongside it."""
+    path = Path(registry_path)
+    return path.with_name(f"{path.stem}.d")
+
+
+class Registry:
+    """World entries keyed by id, stored as per-region append-only JSONL shards."""
+
+    def __init__(self, root: str, shard_precision: int = SHARD_PRECISION):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.shard_precision = shard_precision
+        # id -> (write time, shard, world or None if deleted)
+        self._records: dict[str, tuple[int, str, dict | None]] = {}
+        self._read_pos: dict[str, tuple[bytes, int]] = {}  # shard -> (header, bytes consumed)
+        self._lines: dict[str, int] = {}
+        self.refresh()
+
+    @classmethod
+    def for_json(cls, registry_path: str) -> "Registry":
+        """Open the store next to registry_path, importing registry.json on first use."""
+        registry = cls(str(store_dir_for(registry_path)))
+        if not registry.meta().get("imported") and os.path.exists(registry_path):
+            registry.import_json(registry_path)
+        return registry
+
+    # --- reading ---
+
+    def _shard_path(self, key: str) -> Path:
+        return self.root / f"{key}.jsonl"
+
+    def _apply(self, key: str, record: dict):
+        world_id = record["world"]["id"] if "world" in record else record["deleted"]
+        current = self._records.get(world_id)
+        if current is None or record["t"] >= current[0]:
+            self._records[world_id] = (record["t"], key, record.get("world"))
+
+    def _refresh_shard(self, key: str):
+        try:
+            f = open(self._shard_path(key), "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            header = f.readline()
+            if not header.endswith(b"\n"):
+                return  # still being created
+            known_header, pos = self._read_pos.get(key, (header, 0))
+            size = os.fstat(f.fileno()).st_size
+            if known_header != header or size < pos:
+                # Compacted since the last read: start over
+                for world_id in [w for w, (_, k, _) in self._records.items() if k == key]:
+                    del self._records[world_id]
+                pos = 0
+            if pos == 0:
+                pos, self._lines[key] = len(header), 0
+            f.seek(pos)
+            data = f.read()
+
+        end = data.rfind(b"\n") + 1  # ignore a line still being written
+        for line in data[:end].splitlines():
+            if line.strip():
+                self._apply(key, json.loads(line))
+                self._lines[key] += 1
+        self._read_pos[key] = (header, pos + end)
+
+    def refresh(self):
+        """Pick up lines appended (or compactions done) by other writers since the last read."""
+        for path in sorted(self.root.glob("*.jsonl")):
+            self._refresh_shard(path.stem)
+
+    def get(self, world_id: str) -> dict | None:
+        record = self._records.get(world_id)
+        return record[2] if record else None
+
+    def __contains__(self, world_id: str) -> bool:
+        return self.get(world_id) is not None
+
+    def __len__(self) -> int:
+        return sum(1 for _, _, world in self._records.values() if world is not None)
+
+    def worlds(self) -> list[dict]:
+        return [world for _, _, world in self._records.values() if world is not None]
+
+    def meta(self) -> dict:
+        try:
+            with open(self.root / "meta.json") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    # --- writing ---
+
+    def _append(self, key: str, records: list[dict]):
+        """Append records to a shard. Caller holds the shard lock."""
+        path = self._shard_path(key)
+        with open(path, "a") as f:
+            if f.tell() == 0:
+                f.write(_line({"gen": time.time_ns()}))
+            f.write("".join(_line(r) for r in records))
+        self._refresh_shard(key)
+
+    def put(self, entry: dict):
+        """Add or replace a world entry."""
+        self.put_many([entry])
+
+    def put_many(self, entries: list[dict]):
+        by_shard: dict[str, list[dict]] = {}
+        for entry in entries:
+            record = {"t": time.time_ns(), "world": entry}
+            by_shard.setdefault(shard_key(entry, self.shard_precision), []).append(record)
+
+        for key, records in by_shard.items():
+            with _locked(self.root / f"{key}.lock"):
+                self._append(key, records)
+                if self._needs_compaction(key):
+                    self.compact_shard(key)
+
+    def delete(self, world_id: str):
+        record = self._records.get(world_id)
+        if record is None or record[2] is None:
+            return
+        key = record[1]
+        with _locked(self.root / f"{key}.lock"):
+            self._append(key, [{"t": time.time_ns(), "deleted": world_id}])
+
+    def set_origin(self, origin: dict, overwrite: bool = False):
+        """Record the registry origin (kept from the first run unless overwrite)."""
+        with _locked(self.root / "registry.lock"):
+            meta = self.meta()
+            if "origin" not in meta or overwrite:
+                meta["origin"] = origin
+                _write_atomic(self.root / "meta.json", json.dumps(meta, indent=2))
+
+    def import_json(self, registry_path: str) -> int:
+        """One-time import of a legacy registry.json. Returns the number of worlds imported."""
+        with _locked(self.root / "registry.lock"):
+            meta = self.meta()
+            if meta.get("imported"):
+                return 0
+            with open(registry_path) as f:
+                legacy = json.load(f)
+            worlds = [w for w in legacy.get("worlds", []) if w.get("id")]
+            self.put_many(worlds)
+            if legacy.get("origin") and "origin" not in meta:
+                meta["origin"] = legacy["origin"]
+            meta["imported"] = True
+            _write_atomic(self.root / "meta.json", json.dumps(meta, indent=2))
+        return len(worlds)
+
+    # --- compaction / export ---
+
+    def _needs_compaction(self, key: str) -> bool:
+        lines = self._lines.get(key, 0)
+        if lines < COMPACT_MIN_LINES:
+            return False
+        held = sum(1 for _, k, _ in self._records.values() if k == key)
+        return lines > COMPACT_RATIO * max(held, 1)
+
+    def compact_shard(self, key: str):
+        """
+        Rewrite a shard keeping only the newest line for each id it holds.
+
+        Tombstones are kept so an older copy of a deleted world in another
+        shard can't come back. Caller holds the shard lock.
+        """
+        self._refresh_shard(key)
+        lines = [_line({"gen": time.time_ns()})]
+        for world_id, (t, k, world) in self._records.items():
+            if k == key:
+                lines.append(_line({"t": t, "world": world} if world is not None else {"t": t, "deleted": world_id}))
+        _write_atomic(self._shard_path(key), "".join(lines))
+        self._refresh_shard(key)
+
+    def compact(self):
+        for path in sorted(self.root.glob("*.jsonl")):
+            with _locked(self.root / f"{path.stem}.lock"):
+                self.compact_shard(path.stem)
+
+    def export_json(self, registry_path: str):
+        """Write the legacy {"origin", "worlds"} registry.json from the current shards."""
+        with _locked(self.root / "registry.lock"):
+            self.refresh()
+            registry = {"origin": self.meta().get("origin"), "worlds": self.worlds()}
+            _write_atomic(Path(registry_path), json.dumps(registry, indent=2))
+
+    def stats(self) -> dict:
+        return {
+            "worlds": len(self),
+            "shards": len(self._read_pos),
+            "log_lines": sum(self._lines.values()),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded world registry")
+    parser.add_argument("command", choices=["stats", "get", "compact", "export"])
+    parser.add_argument("registry", type=str, help="Path to registry.json")
+    parser.add_argument("world_id", type=str, nargs="?", help="World id (for get)")
+    args = parser.parse_args()
+
+    registry = Registry.for_json(args.registry)
+    if args.command == "get":
+        world = registry.get(args.world_id)
+        print(json.dumps(world, indent=2) if world else f"{args.world_id}: not found")
+    elif args.command == "compact":
+        registry.compact()
+        print(f"Compacted {registry.root}")
+    elif args.command == "export":
+        registry.export_json(args.registry)
+        print(f"Exported {len(registry)} worlds -> {args.registry}")
+
+    s = registry.stats()
+    print(f"{registry.root}: {s['worlds']} worlds in {s['shards']} shards ({s['log_lines']} log lines)")
+
+
+if __name__ == "__main__":
+    main()
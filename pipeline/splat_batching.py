@@ -0,0 +1,401 @@
+"""
+Batched multi-scene AnySplat inference, shared by SplatGenerator.generate_batch.
+
+Scenes with the same view count are bucketed (no padding) and run as one
+(B, V, C, H, W) forward pass, with the next bucket's views decoded into
+pinned buffers while the current one is on the GPU. If the model's output
+isn't per-scene shaped, scenes fall back to one per forward pass.
+
+Usage:
+    # CPU benchmark with the stand-in model: batched vs one scene at a time
+    python pipeline/splat_batching.py --scenes 12 --views 6 8 --max-batch 4
+"""
+
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+import torch
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+MIN_VIEWS = 3
+MAX_BATCH_SCENES = 4
+MAX_BATCH_VIEWS = 48  # bounds activation memory per forward pass
+GAUSSIAN_FIELDS = ("means", "scales", "rotations", "harmonics", "opacities")
+PREPROCESS_WORKERS = min(16, os.cpu_count() or 1)
+MAX_BUFFER_SHAPES = 4
+
+
+def scene_images(input_path: str) -> list[str]:
+    """Sorted image paths in a scene directory; raises if AnySplat can't use it."""
+    image_files = sorted(f for f in os.listdir(input_path) if f.lower().endswith(IMAGE_EXTENSIONS))
+    if len(image_files) < MIN_VIEWS:
+        raise ValueError(f"AnySplat needs >= {MIN_VIEWS} images, found {len(image_files)} in {input_path}")
+    return [os.path.join(input_path, f) for f in image_files]
+
+
+def bucket_scenes(
+    scenes: list[dict],
+    max_batch: int = MAX_BATCH_SCENES,
+    max_views: int = MAX_BATCH_VIEWS,
+) -> list[list[dict]]:
+    """
+    Group scenes into forward-pass batches of equal view count.
+
+    Args:
+        scenes: dicts with at least "image_paths"
+        max_batch: max scenes per batch
+        max_views: max total views per batch (a scene larger than this runs alone)
+
+    Returns:
+        List of batches, largest view count first, scenes in input order within a bucket
+    """
+    by_views: dict[int, list[dict]] = {}
+    for scene in scenes:
+        by_views.setdefault(len(scene["image_paths"]), []).append(scene)
+
+    batches = []
+    for n_views in sorted(by_views, reverse=True):
+        size = max(1, min(max_batch, max_views // n_views))
+        bucket = by_views[n_views]
+        batches.extend(bucket[i:i + size] for i in range(0, len(bucket), size))
+    return batches
+
+
+class ViewPreprocessor:
+    """
+    Decodes scene views on a thread pool into reusable host tensors.
+
+    Each (B, V, C, H, W) shape gets two buffers used alternately, so one
+    batch can be filled while the previous one is still being transferred
+    or used for inference. Buffers are pinned when CUDA is available so
+    the host-to-device copy can run asynchronously.
+    """
+
+    def __init__(
+        self,
+        load_view: Callable[[str], torch.Tensor],
+        workers: int = PREPROCESS_WORKERS,
+        pin_memory: bool | None = None,
+    ):
+        """
+        Args:
+            load_view: path -> (C, H, W) tensor (AnySplat's process_image)
+            workers: decode threads
+            pin_memory: pin host buffers (default: when CUDA is available)
+        """
+        self.load_view = load_view
+        self.pin_memory = torch.cuda.is_available() if pin_memory is None else pin_memory
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="splat-decode")
+        self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="splat-prefetch")
+        self._buffers: dict[tuple, list] = {}  # shape -> [slot 0, slot 1, next slot]
+        self._view = None  # (shape, dtype) of a decoded view
+
+    def _buffer(self, shape: tuple, dtype: torch.dtype) -> torch.Tensor:
+        if shape not in self._buffers:
+            if len(self._buffers) >= MAX_BUFFER_SHAPES:
+                # Least recently used shape; a buffer still in flight stays alive via its caller
+                del self._buffers[next(iter(self._buffers))]
+            self._buffers[shape] = [None, None, 0]
+        slots = self._buffers.pop(shape)
+        self._buffers[shape] = slots
+        slot = slots[2]
+        slots[2] = 1 - slot
+        if slots[slot] is None:
+            slots[slot] = torch.empty(shape, dtype=dtype, pin_memory=self.pin_memory)
+        return slots[slot]
+
+    def load(self, scenes: list[dict]) -> tuple[torch.Tensor, float]:
+        """
+        Decode every view of scenes (equal view counts) in parallel.
+
+        Returns:
+            ((B, V, C, H, W) host tensor, decode seconds). The tensor is a
+            reused buffer: it is overwritten two load() calls later.
+        """
+        t0 = time.perf_counter()
+        paths = [path for scene in scenes for path in scene["image_paths"]]
+        first = None
+        if self._view is None:
+            first = self.load_view(paths[0])
+            self._view = (tuple(first.shape), first.dtype)
+        view_shape, dtype = self._view
+
+        out = self._buffer((len(scenes), len(scenes[0]["image_paths"]), *view_shape), dtype)
+        flat = out.view(-1, *view_shape)
+
+        def fill(i: int):
+            view = first if (i == 0 and first is not None) else self.load_view(paths[i])
+            if tuple(view.shape) != view_shape:
+                raise ValueError(f"{paths[i]} decoded to {tuple(view.shape)}, expected {view_shape}")
+            flat[i].copy_(view)
+
+        list(self._pool.map(fill, range(len(paths))))
+        return out, time.perf_counter() - t0
+
+    def prefetch(self, scenes: list[dict]) -> Future:
+        """load(scenes) in the background; the Future resolves to load's result."""
+        return self._prefetcher.submit(self.load, scenes)
+
+    def close(self):
+        self._prefetcher.shutdown()
+        self._pool.shutdown()
+        self._buffers.clear()
+
+
+def to_device(host: torch.Tensor, device: torch.device | str) -> tuple[torch.Tensor, float]:
+    """Copy a (pinned) host batch to device. Returns (tensor, seconds including the sync)."""
+    t0 = time.perf_counter()
+    images = host.to(device, non_blocking=True)
+    if torch.device(device).type == "cuda":
+        torch.cuda.synchronize()
+    return images, time.perf_counter() - t0
+
+
+def split_scenes(gaussians, batch_size: int) -> list[dict] | None:
+    """
+    Per-scene gaussian tensors (batch dim stripped) from a model output.
+
+    Returns None unless every field is a (batch_size, N, ...) tensor with the
+    same N, i.e. unless index i along dim 0 is unambiguously scene i.
+    """
+    tensors = {field: getattr(gaussians, field, None) for field in GAUSSIAN_FIELDS}
+    if not all(isinstance(t, torch.Tensor) and t.dim() >= 2 and t.shape[0] == batch_size
+               for t in tensors.values()):
+        return None
+    n = tensors["means"].shape[1]
+    if tensors["means"].dim() != 3 or any(t.shape[1] != n for t in tensors.values()):
+        return None
+    return [{field: t[i] for field, t in tensors.items()} for i in range(batch_size)]
+
+
+class UtilizationSampler:
+    """Samples torch.cuda.utilization() on a thread while in use; mean is None without a GPU / NVML."""
+
+    def __init__(self, interval: float = 0.2):
+        self.interval = interval
+        self.samples: list[int] = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.samples.append(torch.cuda.utilization())
+
+    def __enter__(self):
+        try:
+            torch.cuda.utilization()
+        except Exception:
+            return self  # no CUDA device or pynvml missing
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    @property
+    def mean(self) -> float | None:
+        return round(sum(self.samples) / len(self.samples), 1) if self.samples else None
+
+
+def run_batches(
+    model,
+    scenes: list[dict],
+    load_view: Callable[[str], torch.Tensor] | ViewPreprocessor,
+    export: Callable[[dict, dict], dict] | None,
+    device: torch.device | str = "cpu",
+    max_batch: int = MAX_BATCH_SCENES,
+    max_views: int = MAX_BATCH_VIEWS,
+) -> dict:
+    """
+    Run AnySplat-style inference over many scenes, several scenes per forward pass.
+
+    Args:
+        model: object with inference(images[B, V, C, H, W] in [0, 1]) -> (gaussians, poses),
+            gaussians having means / scales / rotations / harmonics / opacities; when these
+            are not all (B, N, ...) the scenes are re-run one per forward pass
+        scenes: dicts with "name" and "image_paths"
+        load_view: path -> (C, H, W) tensor in [-1, 1] (AnySplat's process_image), or a
+            ViewPreprocessor wrapping one (reused across calls, not closed here)
+        export: (scene, gaussian tensors) -> dict of extra per-scene results, or None to skip export
+        device: inference device
+        max_batch / max_views: bucket caps, see bucket_scenes
+
+    Returns:
+        Dict with per-scene results ("scenes", in input order), aggregate throughput and
+        decode / decode_wait (decode not hidden behind inference) / transfer / inference totals
+    """
+    batches = bucket_scenes(scenes, max_batch, max_views)
+    shapes = ", ".join(f"{len(b)}x{len(b[0]['image_paths'])}v" for b in batches)
+    print(f"{len(scenes)} scenes -> {len(batches)} batches ({shapes})")
+
+    preprocessor = load_view if isinstance(load_view, ViewPreprocessor) else ViewPreprocessor(load_view)
+    batched = True  # cleared the first time a batched output isn't per-scene shaped
+
+    def infer(images: torch.Tensor) -> list[dict]:
+        nonlocal batched
+        if batched or len(images) == 1:
+            gaussians, _ = model.inference(images)
+            per_scene = split_scenes(gaussians, len(images))
+            if per_scene is not None:
+                return per_scene
+            if len(images) == 1:
+                raise ValueError("model output is not shaped (1, N, ...) per gaussian field")
+            print("  Batched output is not per-scene shaped; running scenes one at a time from here")
+            batched = False
+        return [infer(images[i:i + 1])[0] for i in range(len(images))]
+
+    results = {}
+    totals = {"decode": 0.0, "decode_wait": 0.0, "transfer": 0.0, "inference": 0.0}
+    start = time.time()
+    try:
+        with UtilizationSampler() as sampler:
+            pending = preprocessor.prefetch(batches[0]) if batches else None
+            for k, batch in enumerate(batches):
+                t0 = time.perf_counter()
+                host, decode_s = pending.result()
+                decode_wait_s = time.perf_counter() - t0
+                # Decode the next batch while this one is transferred and run
+                pending = preprocessor.prefetch(batches[k + 1]) if k + 1 < len(batches) else None
+
+                images, transfer_s = to_device(host, device)
+                t0 = time.perf_counter()
+                with torch.no_grad():
+                    per_scene = infer((images + 1) * 0.5)
+                if torch.device(device).type == "cuda":
+                    torch.cuda.synchronize()
+                inference_s = time.perf_counter() - t0
+
+                for key, value in (("decode", decode_s), ("decode_wait", decode_wait_s),
+                                   ("transfer", transfer_s), ("inference", inference_s)):
+                    totals[key] += value
+
+                batch_size = len(batch) if batched else 1
+                for scene, tensors in zip(batch, per_scene):
+                    t0 = time.perf_counter()
+                    result = {
+                        "name": scene["name"],
+                        "num_images": len(scene["image_paths"]),
+                        "num_gaussians": int(tensors["means"].shape[0]),
+                        "batch_size": batch_size,
+                        "decode_time_s": round(decode_s / len(batch), 3),
+                        "transfer_time_s": round(transfer_s / len(batch), 3),
+                        "inference_time_s": round(inference_s / len(batch), 3),
+                    }
+                    if export is not None:
+                        result.update(export(scene, tensors))
+                    result["export_time_s"] = round(time.perf_counter() - t0, 3)
+                    results[scene["name"]] = result
+                    print(f"  {scene['name']}: {result['num_gaussians']:,} gaussians "
+                          f"({result['num_images']} views, batch of {batch_size})")
+    finally:
+        if preprocessor is not load_view:
+            preprocessor.close()
+
+    elapsed = time.time() - start
+    return {
+        "scenes": [results[scene["name"]] for scene in scenes],
+        "num_scenes": len(scenes),
+        "num_batches": len(batches),
+        "total_time_s": round(elapsed, 1),
+        "decode_time_s": round(totals["decode"], 2),
+        "decode_wait_time_s": round(totals["decode_wait"], 2),
+        "transfer_time_s": round(totals["transfer"], 2),
+        "inference_time_s": round(totals["inference"], 2),
+        "scenes_per_min": round(len(scenes) / elapsed * 60, 1) if elapsed > 0 else None,
+        "inference_fraction": round(totals["inference"] / elapsed, 2) if elapsed > 0 else None,
+        "gpu_utilization_pct": sampler.mean,
+    }
+
+
+class TinySplatGaussians:
+    def __init__(self, **tensors):
+        self.__dict__.update(tensors)
+
+
+class TinySplatModel(torch.nn.Module):
+    """
+    CPU stand-in for AnySplat with the same inference() contract.
+
+    A small strided conv predicts one gaussian per output pixel per view, so
+    cost scales with batch x views like the real model, just much smaller.
+    """
+
+    def __init__(self, stride: int = 8, sh_degree: int = 0):
+        super().__init__()
+        self.sh_coeffs = (sh_degree + 1) ** 2
+        channels = 3 + 3 + 4 + 3 * self.sh_coeffs + 1
+        self.net = torch.nn.Sequential(
+            torch.nn.Conv2d(3, 32, 3, stride=stride, padding=1),
+            torch.nn.ReLU(),
+            torch.nn.Conv2d(32, channels, 1),
+        )
+
+    def inference(self, images: torch.Tensor):
+        b, v, c, h, w = images.shape
+        out = self.net(images.reshape(b * v, c, h, w))  # (B*V, channels, h', w')
+        out = out.reshape(b, v, out.shape[1], -1).permute(0, 1, 3, 2).reshape(b, -1, out.shape[1])
+        means, scales, rotations, sh, opacities = out.split([3, 3, 4, 3 * self.sh_coeffs, 1], dim=-1)
+        gaussians = TinySplatGaussians(
+            means=means,
+            scales=torch.exp(scales.clamp(max=2)) * 0.01,
+            rotations=torch.nn.functional.normalize(rotations, dim=-1),
+            harmonics=sh.reshape(b, -1, 3, self.sh_coeffs),
+            opacities=torch.sigmoid(opacities[..., 0]),
+        )
+        poses = torch.eye(4).expand(b, v, 4, 4)
+        return gaussians, poses
+
+
+def main():
+    import io
+
+    import numpy as np
+    from PIL import Image
+
+    parser = argparse.ArgumentParser(description="Batched splat inference benchmark (CPU stand-in model)")
+    parser.add_argument("--scenes", type=int, default=12, help="Number of synthetic scenes")
+    parser.add_argument("--views", type=int, nargs="+", default=[6, 8], help="View counts to cycle through")
+    parser.add_argument("--size", type=int, default=448, help="View resolution after resize")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH_SCENES, help="Max scenes per batch")
+    parser.add_argument("--max-views", type=int, default=MAX_BATCH_VIEWS, help="Max views per batch")
+    parser.add_argument("--workers", type=int, default=PREPROCESS_WORKERS, help="Decode threads")
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    model = TinySplatModel().eval()
+
+    # Synthetic 1024x768 JPEGs kept in memory, decoded + resized like process_image
+    rng = np.random.default_rng(0)
+    jpeg = io.BytesIO()
+    Image.fromarray(rng.integers(0, 256, (768, 1024, 3), dtype=np.uint8)).save(jpeg, format="JPEG", quality=90)
+    jpeg = jpeg.getvalue()
+
+    def load_view(path: str) -> torch.Tensor:
+        image = Image.open(io.BytesIO(jpeg)).convert("RGB").resize((args.size, args.size), Image.BILINEAR)
+        return torch.from_numpy(np.array(image)).permute(2, 0, 1).float() / 127.5 - 1
+
+    scenes = [
+        {"name": f"scene{i:02d}", "image_paths": [f"scene{i:02d}/{j}.jpg" for j in range(args.views[i % len(args.views)])]}
+        for i in range(args.scenes)
+    ]
+    for max_batch, workers in ((1, 1), (args.max_batch, 1), (args.max_batch, args.workers)):
+        print(f"\n=== max batch {max_batch}, {workers} decode threads ===")
+        preprocessor = ViewPreprocessor(load_view, workers=workers)
+        result = run_batches(model, scenes, preprocessor, None, max_batch=max_batch, max_views=args.max_views)
+        preprocessor.close()
+        print(f"{result['num_batches']} batches, {result['total_time_s']}s, {result['scenes_per_min']} scenes/min")
+        print(f"  decode {result['decode_time_s']}s (waited {result['decode_wait_time_s']}s), "
+              f"transfer {result['transfer_time_s']}s, inference {result['inference_time_s']}s "
+              f"({result['inference_fraction']:.0%} of wall time)")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,17 @@ Usage:
 
     # Download result
     modal volume get globerun-data splats/my-scene/scene.ply ./scene.ply
+
+    # Also write a compressed scene.spz next to scene.ply (~10x smaller, for the viewer)
+    modal run splat_generator.py --image-dir images/test --output-name my-scene --spz
+
+    # Plus 500k / 100k LOD variants, recorded under a world in the local registry
+    modal run splat_generator.py --image-dir images/test --output-name my-scene --spz \
+        --lods 500000,100000 --registry data/splats/marble/registry.json --world-id my-scene \
+        --center 40.7285,-73.9875
+
+    # Several scenes, batched by view count into shared forward passes
+    modal run splat_generator.py --image-dirs images/a,images/b,images/c --max-batch 4
 """
 
 import modal
@@ -83,6 +94,8 @@ anysplat_image = (
         "OPENCV_IO_ENABLE_OPENEXR": "1",
         "PYTHONPATH": "/opt/anysplat",
     })
+    # Local helper modules (must stay last: added at container start, not baked in)
+    .add_local_python_source("splat_batching", "gaussian_ply", "spz", "splat_lod")
 )
 
 # Persistent volume for images + output splats (free, no TTL)
@@ -90,6 +103,23 @@ volume = modal.Volume.from_name("globerun-data", create_if_missing=True)
 VOLUME_PATH = "/data"
 
 
+def build_lod_files(ply_path, budgets: list[int], export_spz: bool) -> dict:
+    """Write decimated scene_<budget>.ply (+ .spz) variants next to a .ply. Returns {"lod_files": ...}."""
+    from splat_lod import build_lods
+
+    return {"lod_files": build_lods(ply_path, budgets, export_spz=export_spz)}
+
+
+def compress_to_spz(ply_path) -> dict:
+    """Write scene.spz next to a .ply. Returns spz_path, spz_size_mb, compression_ratio, spz_time_s."""
+    from spz import ply_to_spz
+
+    result = ply_to_spz(ply_path, os.path.splitext(str(ply_path))[0] + ".spz")
+    print(f"Saved {result['spz_path']}: {result['spz_size_mb']} MB "
+          f"({result['compression_ratio']}x smaller) in {result['spz_time_s']}s")
+    return {k: result[k] for k in ("spz_path", "spz_size_mb", "compression_ratio", "spz_time_s")}
+
+
 # ---------------------------------------------------------------------------
 # AnySplat inference class with memory snapshots for fast cold starts
 # ---------------------------------------------------------------------------
@@ -124,18 +154,40 @@ class SplatGenerator:
         self.device = torch.device("cuda")
         self.model = self.model.to(self.device)
         print(f"AnySplat moved to {torch.cuda.get_device_name(0)}")
+        self.preprocessor = None
+
+    def _preprocessor(self):
+        """Shared decode pool + pinned input buffers, reused across calls in this container."""
+        if self.preprocessor is None:
+            from src.utils.image import process_image
+            from splat_batching import ViewPreprocessor
+
+            self.preprocessor = ViewPreprocessor(process_image)
+        return self.preprocessor
 
     @modal.method()
-    def generate(self, image_dir: str, output_name: str) -> dict:
+    def generate(
+        self,
+        image_dir: str,
+        output_name: str,
+        export_spz: bool = False,
+        lod_budgets: list[int] | None = None,
+        min_opacity: float = 0.0,
+    ) -> dict:
         """
         Generate a gaussian splat .ply from a directory of images.
 
         Args:
             image_dir: Image directory path relative to volume root (e.g. "images/test")
             output_name: Name for the output directory under splats/
+            export_spz: Also compress the .ply to scene.spz
+            lod_budgets: Gaussian budgets for decimated LOD variants (e.g. [500000, 100000])
+            min_opacity: Drop gaussians below this opacity at export (0 keeps all)
 
         Returns:
-            Dict with output_path, num_gaussians, file_size_mb, inference_time_s
+            Dict with output_path, num_gaussians, file_size_mb, and decode / transfer /
+            inference times (+ spz_path, spz_size_mb, compression_ratio, spz_time_s)
+            (+ lod_files: {"500k": {"file", "num_gaussians", "file_size_mb", ...}})
         """
         import sys
         sys.path.insert(0, "/opt/anysplat")
@@ -143,8 +195,8 @@ class SplatGenerator:
         import time
         import torch
         from pathlib import Path
-        from src.utils.image import process_image
-        from src.model.ply_export import export_ply
+        from gaussian_ply import write_gaussians_ply
+        from splat_batching import scene_images, to_device
 
         input_path = os.path.join(VOLUME_PATH, image_dir)
         output_dir = os.path.join(VOLUME_PATH, "splats", output_name)
@@ -152,54 +204,127 @@ class SplatGenerator:
         ply_path = Path(os.path.join(output_dir, "scene.ply"))
 
         # Discover images
-        extensions = (".jpg", ".jpeg", ".png", ".webp")
-        image_files = sorted(
-            f for f in os.listdir(input_path) if f.lower().endswith(extensions)
-        )
-        n = len(image_files)
+        image_paths = scene_images(input_path)
+        n = len(image_paths)
         print(f"Found {n} images in {input_path}")
-        if n < 3:
-            raise ValueError(f"AnySplat needs >= 3 images, found {n}")
 
-        # Preprocess: resize + center-crop to 448x448, normalise to [-1, 1]
-        image_paths = [os.path.join(input_path, f) for f in image_files]
-        images = [process_image(p) for p in image_paths]
-        images = torch.stack(images, dim=0).unsqueeze(0).to(self.device)
-        print(f"Input tensor: {images.shape}  (batch, views, C, H, W)")
+        # Preprocess in parallel: resize + center-crop to 448x448, normalise to [-1, 1],
+        # written straight into a pinned (1, views, C, H, W) buffer
+        host, decode_s = self._preprocessor().load([{"image_paths": image_paths}])
+        images, transfer_s = to_device(host, self.device)
+        print(f"Input tensor: {images.shape}  (batch, views, C, H, W), "
+              f"decode {decode_s:.2f}s, transfer {transfer_s:.3f}s")
 
         # Inference — AnySplat expects [0, 1] range
         t0 = time.time()
         with torch.no_grad():
             gaussians, pred_poses = self.model.inference((images + 1) * 0.5)
+        torch.cuda.synchronize()
         elapsed = time.time() - t0
         print(f"Inference: {elapsed:.1f}s")
 
-        # Export .ply — gaussians is a dataclass, index [0] strips batch dim
-        export_ply(
+        # Export .ply in chunks — gaussians is a dataclass, index [0] strips batch dim
+        export = write_gaussians_ply(
+            ply_path,
             means=gaussians.means[0],
             scales=gaussians.scales[0],
             rotations=gaussians.rotations[0],
             harmonics=gaussians.harmonics[0],
             opacities=gaussians.opacities[0],
-            path=ply_path,
-            shift_and_scale=False,
-            save_sh_dc_only=True,
+            min_opacity=min_opacity,
         )
 
         file_size_mb = ply_path.stat().st_size / (1024 * 1024)
-        num_gaussians = int(gaussians.means[0].shape[0])
-        print(f"Saved {ply_path}: {num_gaussians:,} gaussians, {file_size_mb:.1f} MB")
+        num_gaussians = export["num_gaussians"]
+        print(f"Saved {ply_path}: {num_gaussians:,} gaussians ({export['num_pruned']:,} pruned), "
+              f"{file_size_mb:.1f} MB in {export['write_time_s']}s")
+
+        spz = compress_to_spz(ply_path) if export_spz else {}
+        lods = build_lod_files(ply_path, lod_budgets, export_spz) if lod_budgets else {}
 
         volume.commit()
 
         return {
+            **spz,
+            **lods,
             "output_path": str(ply_path),
             "num_images": n,
             "num_gaussians": num_gaussians,
+            "num_pruned": export["num_pruned"],
             "file_size_mb": round(file_size_mb, 1),
+            "decode_time_s": round(decode_s, 2),
+            "transfer_time_s": round(transfer_s, 3),
             "inference_time_s": round(elapsed, 1),
         }
 
+    @modal.method()
+    def generate_batch(
+        self,
+        image_dirs: list[str],
+        output_names: list[str] | None = None,
+        max_batch: int | None = None,
+        export_spz: bool = False,
+        lod_budgets: list[int] | None = None,
+        min_opacity: float = 0.0,
+    ) -> dict:
+        """
+        Generate one .ply per image directory, batching scenes with equal view counts.
+
+        Args:
+            image_dirs: Image directory paths relative to volume root
+            output_names: Output directory names under splats/ (default: each dir's basename)
+            max_batch: Max scenes per forward pass (default: splat_batching.MAX_BATCH_SCENES)
+            export_spz: Also compress each .ply to scene.spz
+            lod_budgets: Gaussian budgets for decimated LOD variants of each scene
+            min_opacity: Drop gaussians below this opacity at export (0 keeps all)
+
+        Returns:
+            Dict with per-scene results (as generate returns, plus batch_size) under
+            "scenes", and aggregate scenes_per_min / inference_fraction / gpu_utilization_pct
+        """
+        import sys
+        sys.path.insert(0, "/opt/anysplat")
+
+        from pathlib import Path
+        from gaussian_ply import write_gaussians_ply
+        from splat_batching import MAX_BATCH_SCENES, run_batches, scene_images
+
+        output_names = output_names or [os.path.basename(d.rstrip("/")) for d in image_dirs]
+        if len(set(output_names)) != len(output_names):
+            raise ValueError(f"Output names must be unique: {output_names}")
+        scenes = [
+            {"name": name, "image_paths": scene_images(os.path.join(VOLUME_PATH, image_dir))}
+            for image_dir, name in zip(image_dirs, output_names)
+        ]
+
+        def export(scene: dict, tensors: dict) -> dict:
+            output_dir = os.path.join(VOLUME_PATH, "splats", scene["name"])
+            os.makedirs(output_dir, exist_ok=True)
+            ply_path = Path(os.path.join(output_dir, "scene.ply"))
+            export = write_gaussians_ply(ply_path, **tensors, min_opacity=min_opacity)
+            return {
+                "output_path": str(ply_path),
+                "num_gaussians": export["num_gaussians"],
+                "num_pruned": export["num_pruned"],
+                "file_size_mb": export["file_size_mb"],
+                **(compress_to_spz(ply_path) if export_spz else {}),
+                **(build_lod_files(ply_path, lod_budgets, export_spz) if lod_budgets else {}),
+            }
+
+        result = run_batches(
+            self.model,
+            scenes,
+            load_view=self._preprocessor(),
+            export=export,
+            device=self.device,
+            max_batch=max_batch or MAX_BATCH_SCENES,
+        )
+        print(f"{result['num_scenes']} scenes in {result['total_time_s']}s: "
+              f"{result['scenes_per_min']} scenes/min, GPU util {result['gpu_utilization_pct']}%")
+
+        volume.commit()
+        return result
+
     @modal.method()
     def verify(self) -> dict:
         """Verify AnySplat model + GPU are working."""
@@ -225,16 +350,55 @@ class SplatGenerator:
 def main(
     image_dir: str = "",
     output_name: str = "test",
+    image_dirs: str = "",
+    max_batch: int = 0,
+    spz: bool = False,
+    lods: str = "",
+    registry: str = "",
+    world_id: str = "",
+    center: str = "",
+    min_opacity: float = 0.0,
 ):
     """
-    modal run splat_generator.py                          # verify setup
-    modal run splat_generator.py --image-dir images/test  # generate splat
+    modal run splat_generator.py                                  # verify setup
+    modal run splat_generator.py --image-dir images/test          # generate splat
+    modal run splat_generator.py --image-dirs images/a,images/b   # batched scenes
+    modal run splat_generator.py --image-dir images/test --spz    # + compressed .spz
+    modal run splat_generator.py --image-dir images/test --min-opacity 0.005  # prune faint gaussians
+    modal run splat_generator.py --image-dir images/test --lods 500000,100000 \
+        --registry data/splats/marble/registry.json --world-id my-scene \
+        --center 40.7285,-73.9875                                         # + LODs in registry
     """
     import json
 
+    lod_budgets = [int(b) for b in lods.split(",") if b] or None
+    world_center = None
+    if registry or world_id:
+        if image_dirs:
+            raise SystemExit("--registry/--world-id record a single scene; use --image-dir, not --image-dirs")
+        if not (registry and world_id and image_dir):
+            raise SystemExit("--registry needs --world-id and --image-dir")
+        # Fail before spending GPU time if the world can't be placed in the spatial index
+        world_center = registry_center(registry, world_id, center)
+
     gen = SplatGenerator()
 
-    if not image_dir:
+    if image_dirs:
+        dirs = [d for d in image_dirs.split(",") if d]
+        print(f"Generating {len(dirs)} splats (batched) ...")
+        result = gen.generate_batch.remote(
+            dirs, max_batch=max_batch or None, export_spz=spz, lod_budgets=lod_budgets, min_opacity=min_opacity
+        )
+        for scene in result["scenes"]:
+            print(f"  {scene['name']}: {scene['num_gaussians']:,} gaussians, {scene['file_size_mb']} MB, "
+                  f"batch of {scene['batch_size']}, {scene['inference_time_s']}s inference")
+        for k in ("num_batches", "total_time_s", "decode_time_s", "decode_wait_time_s",
+                  "transfer_time_s", "inference_time_s", "scenes_per_min",
+                  "inference_fraction", "gpu_utilization_pct"):
+            print(f"  {k}: {result[k]}")
+        with open("splat_output.json", "w") as f:
+            json.dump(result, f, indent=2)
+    elif not image_dir:
         print("Verifying AnySplat + Modal GPU setup...")
         info = gen.verify.remote()
         for k, v in info.items():
@@ -245,10 +409,91 @@ def main(
         print("Saved gpu_verify_output.json")
     else:
         print(f"Generating splat from {image_dir} ...")
-        result = gen.generate.remote(image_dir, output_name)
+        result = gen.generate.remote(
+            image_dir, output_name, export_spz=spz, lod_budgets=lod_budgets, min_opacity=min_opacity
+        )
         for k, v in result.items():
             print(f"  {k}: {v}")
         print(f"\nSplat saved on volume at {result['output_path']}")
         print(f"Download: modal volume get globerun-data {result['output_path'].removeprefix('/data/')} ./scene.ply")
+        if "spz_path" in result:
+            print(f"          modal volume get globerun-data {result['spz_path'].removeprefix('/data/')} ./scene.spz")
+        if registry:
+            record_in_registry(registry, world_id, result, world_center)
         with open("splat_output.json", "w") as f:
             json.dump(result, f, indent=2)
+
+
+def _local_registry(registry_path: str):
+    import sys
+    from pathlib import Path
+
+    sys.path.insert(0, str(Path(__file__).parent))
+    from registry import Registry
+
+    return Registry.for_json(registry_path)
+
+
+def registry_center(registry_path: str, world_id: str, center: str) -> dict:
+    """
+    Center for a registry entry: --center "lat,lng", else the existing entry's center.
+
+    Raises SystemExit when neither exists; an entry without a center lands in
+    the catch-all shard and is left out of the world index.
+    """
+    if center:
+        try:
+            lat, lng = (float(v) for v in center.split(","))
+        except ValueError:
+            raise SystemExit(f"--center must be lat,lng (got {center!r})")
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise SystemExit(f"--center out of range: {center}")
+        return {"lat": lat, "lng": lng}
+    existing = _local_registry(registry_path).get(world_id)
+    if existing and existing.get("center"):
+        return existing["center"]
+    raise SystemExit(f"{world_id} has no center in {registry_path}; pass --center lat,lng")
+
+
+def record_in_registry(registry_path: str, world_id: str, result: dict, center: dict):
+    """
+    Record a generated scene and its LOD variants under world_id in a local registry.
+
+    Files are named <world_id>.spz / <world_id>_<lod>.spz (or .ply) next to
+    registry.json, like Marble worlds; the download commands are printed.
+    """
+    from pathlib import Path
+
+    store = _local_registry(registry_path)  # also puts this directory on sys.path
+    from world_index import build_index
+
+    ext = "spz" if "spz_path" in result else "ply"
+    source = Path(result[f"{ext}_path" if ext == "spz" else "output_path"])
+    registry_dir = Path(registry_path).parent
+    downloads = [(source, f"{world_id}.{ext}")]
+
+    lod_files = {}
+    for label, lod in result.get("lod_files", {}).items():
+        name = f"{world_id}_{label}.{ext}"
+        lod_files[label] = {
+            "file": name,
+            "num_gaussians": lod["num_gaussians"],
+            "file_size_mb": lod["spz_size_mb" if ext == "spz" else "file_size_mb"],
+        }
+        downloads.append((source.parent / lod["spz_file" if ext == "spz" else "file"], name))
+
+    entry = store.get(world_id) or {"id": world_id, "status": "completed", "mode": "anysplat"}
+    entry.update({
+        "center": center,
+        "file": f"{world_id}.{ext}",
+        "file_size_mb": result["spz_size_mb" if ext == "spz" else "file_size_mb"],
+        "num_gaussians": result["num_gaussians"],
+        "lod_files": lod_files,
+    })
+    store.put(entry)
+    store.export_json(registry_path)
+    build_index(registry_path)
+
+    print(f"\nRecorded {world_id} in {registry_path} with LODs {list(lod_files) or 'none'}. Download:")
+    for remote, name in downloads:
+        print(f"  modal volume get globerun-data {str(remote).removeprefix('/data/')} {registry_dir / name}")
@@ -0,0 +1,211 @@
+"""
+Level-of-detail variants of a gaussian splat, like Marble's 500k / 100k .spz files.
+
+Each budget merges nearby gaussians on a voxel grid (sized by binary search
+to land just under the budget) by importance-weighted moment matching, then
+sorts by importance so any prefix is the best subset for progressive loading.
+Variants are written next to the source as scene_500k.ply etc.
+
+Usage:
+    python pipeline/splat_lod.py data/splats/my-scene/scene.ply --budgets 500000 100000 --spz
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from gaussian_ply import read_gaussians_ply, write_gaussians_ply
+
+
+LOD_BUDGETS = (500000, 100000)
+SEARCH_STEPS = 24
+BUDGET_TOLERANCE = 0.97  # accept a voxel size once occupied voxels reach this share of the budget
+GAUSSIAN_KEYS = ("means", "scales", "rotations", "harmonics", "opacities")
+
+
+def lod_label(budget: int) -> str:
+    """500000 -> "500k", the key Marble uses for its spz variants."""
+    return f"{budget // 1000}k" if budget % 1000 == 0 else str(budget)
+
+
+def importance(gaussians: dict[str, np.ndarray]) -> np.ndarray:
+    """Per-gaussian importance: opacity x ellipsoid volume (up to a constant)."""
+    scales = gaussians["scales"].astype(np.float64)
+    return gaussians["opacities"].astype(np.float64) * scales.prod(axis=1)
+
+
+def _quat_to_matrix(q: np.ndarray) -> np.ndarray:
+    """(N, 4) x y z w -> (N, 3, 3) rotation matrices."""
+    q = q / np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+    x, y, z, w = q.T
+    return np.stack([
+        1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w),
+        2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w),
+        2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y),
+    ], axis=1).reshape(-1, 3, 3)
+
+
+def _matrix_to_quat(m: np.ndarray) -> np.ndarray:
+    """(N, 3, 3) rotation matrices -> (N, 4) x y z w, via the largest of w/x/y/z."""
+    trace = m[:, 0, 0] + m[:, 1, 1] + m[:, 2, 2]
+    candidates = np.stack([trace, m[:, 0, 0], m[:, 1, 1], m[:, 2, 2]], axis=1)
+    case = candidates.argmax(axis=1)
+    q = np.empty((len(m), 4))
+
+    def fill(mask, s, x, y, z, w):
+        q[mask] = np.stack([x, y, z, w], axis=1) / s[:, None]
+
+    for c in range(4):
+        mask = case == c
+        if not mask.any():
+            continue
+        r = m[mask]
+        t = trace[mask]
+        if c == 0:
+            s = 2 * np.sqrt(np.maximum(1 + t, 1e-12))
+            fill(mask, s, r[:, 2, 1] - r[:, 1, 2], r[:, 0, 2] - r[:, 2, 0], r[:, 1, 0] - r[:, 0, 1], s * s / 4)
+        elif c == 1:
+            s = 2 * np.sqrt(np.maximum(1 + r[:, 0, 0] - r[:, 1, 1] - r[:, 2, 2], 1e-12))
+            fill(mask, s, s * s / 4, r[:, 0, 1] + r[:, 1, 0], r[:, 0, 2] + r[:, 2, 0], r[:, 2, 1] - r[:, 1, 2])
+        elif c == 2:
+            s = 2 * np.sqrt(np.maximum(1 + r[:, 1, 1] - r[:, 0, 0] - r[:, 2, 2], 1e-12))
+            fill(mask, s, r[:, 0, 1] + r[:, 1, 0], s * s / 4, r[:, 1, 2] + r[:, 2, 1], r[:, 0, 2] - r[:, 2, 0])
+        else:
+            s = 2 * np.sqrt(np.maximum(1 + r[:, 2, 2] - r[:, 0, 0] - r[:, 1, 1], 1e-12))
+            fill(mask, s, r[:, 0, 2] + r[:, 2, 0], r[:, 1, 2] + r[:, 2, 1], s * s / 4, r[:, 1, 0] - r[:, 0, 1])
+    return q
+
+
+def _voxel_ids(means: np.ndarray, origin: np.ndarray, voxel_size: float) -> np.ndarray:
+    """Dense voxel index per gaussian (0..M-1) for a grid of voxel_size."""
+    cells = np.floor((means - origin) / voxel_size).astype(np.int64)
+    dims = cells.max(axis=0) + 1
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    return np.unique(keys, return_inverse=True)[1].reshape(-1)
+
+
+def _voxel_size_for(means: np.ndarray, budget: int) -> float:
+    """Smallest (binary-searched) voxel size whose occupied voxel count is <= budget."""
+    origin = means.min(axis=0)
+    extent = float((means.max(axis=0) - origin).max()) or 1.0
+    lo, hi = extent / (1 << 20), extent  # hi: a single voxel
+    for _ in range(SEARCH_STEPS):
+        mid = np.sqrt(lo * hi)  # sizes span orders of magnitude: bisect in log space
+        count = int(_voxel_ids(means, origin, mid).max()) + 1
+        if count > budget:
+            lo = mid
+        else:
+            hi = mid
+            if count >= budget * BUDGET_TOLERANCE:
+                break
+    return hi
+
+
+def merge_voxels(gaussians: dict[str, np.ndarray], voxel_size: float) -> dict[str, np.ndarray]:
+    """Merge the gaussians in each occupied voxel into one, by importance-weighted moment matching."""
+    means = gaussians["means"].astype(np.float64)
+    ids = _voxel_ids(means, means.min(axis=0), voxel_size)
+    m = int(ids.max()) + 1 if len(ids) else 0
+    weight = importance(gaussians) + 1e-20
+    total = np.bincount(ids, weights=weight, minlength=m)
+
+    def weighted_mean(values: np.ndarray) -> np.ndarray:
+        flat = values.reshape(len(values), -1).astype(np.float64)
+        out = np.stack([np.bincount(ids, weights=weight * flat[:, k], minlength=m)
+                        for k in range(flat.shape[1])], axis=1) / total[:, None]
+        return out.reshape((m,) + values.shape[1:])
+
+    merged_means = weighted_mean(means)
+
+    # Second moment of the mixture: E[cov_i + mu_i mu_i^T] - mu mu^T
+    rot = _quat_to_matrix(gaussians["rotations"].astype(np.float64))
+    variances = gaussians["scales"].astype(np.float64) ** 2
+    second = np.einsum("nij,nj,nkj->nik", rot, variances, rot) + means[:, :, None] * means[:, None, :]
+    cov = weighted_mean(second) - merged_means[:, :, None] * merged_means[:, None, :]
+    eigvals, eigvecs = np.linalg.eigh((cov + cov.transpose(0, 2, 1)) / 2)
+    eigvecs[np.linalg.det(eigvecs) < 0, :, 2] *= -1  # proper rotation
+
+    alpha = np.clip(gaussians["opacities"].astype(np.float64), 0, 1 - 1e-6)
+    transmittance = np.exp(np.bincount(ids, weights=np.log1p(-alpha), minlength=m))
+
+    return {
+        "means": merged_means.astype(np.float32),
+        "scales": np.sqrt(np.maximum(eigvals, 1e-20)).astype(np.float32),
+        "rotations": _matrix_to_quat(eigvecs).astype(np.float32),
+        "harmonics": weighted_mean(gaussians["harmonics"]).astype(np.float32),
+        "opacities": (1 - transmittance).astype(np.float32),
+    }
+
+
+def decimate(gaussians: dict[str, np.ndarray], budget: int) -> dict[str, np.ndarray]:
+    """At most `budget` gaussians: voxel-merged, then sorted by importance (most important first)."""
+    n = len(gaussians["means"])
+    if n > budget:
+        gaussians = merge_voxels(gaussians, _voxel_size_for(gaussians["means"], budget))
+    order = np.argsort(-importance(gaussians), kind="stable")[:budget]
+    return {key: gaussians[key][order] for key in GAUSSIAN_KEYS}
+
+
+def build_lods(
+    ply_path: str | os.PathLike,
+    budgets: tuple[int, ...] | list[int] = LOD_BUDGETS,
+    export_spz: bool = False,
+) -> dict[str, dict]:
+    """
+    Write decimated variants of a gaussian .ply next to it.
+
+    Args:
+        ply_path: source .ply (e.g. .../scene.ply)
+        budgets: max gaussians per variant; budgets >= the source count are skipped
+        export_spz: also write each variant as .spz
+
+    Returns:
+        {label: {"file", "num_gaussians", "file_size_mb", "lod_time_s", ["spz_file", "spz_size_mb"]}},
+        largest budget first; file names are relative to the source's directory
+    """
+    gaussians = read_gaussians_ply(ply_path)
+    n = len(gaussians["means"])
+    base, _ = os.path.splitext(str(ply_path))
+    lods = {}
+    for budget in sorted(set(budgets), reverse=True):
+        if budget >= n:
+            print(f"  LOD {lod_label(budget)}: skipped ({n:,} gaussians already within budget)")
+            continue
+        t0 = time.time()
+        variant = decimate(gaussians, budget)
+        path = f"{base}_{lod_label(budget)}.ply"
+        written = write_gaussians_ply(path, **variant, sh_dc_only=variant["harmonics"].shape[2] == 1)
+        lod = {
+            "file": os.path.basename(path),
+            "num_gaussians": written["num_gaussians"],
+            "file_size_mb": written["file_size_mb"],
+        }
+        if export_spz:
+            from spz import write_spz
+
+            spz_path = f"{base}_{lod_label(budget)}.spz"
+            size = write_spz(spz_path, variant)
+            lod.update(spz_file=os.path.basename(spz_path), spz_size_mb=round(size / (1024 * 1024), 1))
+        lod["lod_time_s"] = round(time.time() - t0, 2)
+        lods[lod_label(budget)] = lod
+        print(f"  LOD {lod_label(budget)}: {lod['num_gaussians']:,} gaussians, {lod['file_size_mb']} MB "
+              f"in {lod['lod_time_s']}s")
+    return lods
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build LOD variants of a gaussian .ply")
+    parser.add_argument("ply", help="Source .ply")
+    parser.add_argument("--budgets", type=int, nargs="+", default=list(LOD_BUDGETS), help="Gaussian budgets")
+    parser.add_argument("--spz", action="store_true", help="Also write .spz variants")
+    args = parser.parse_args()
+
+    lods = build_lods(args.ply, args.budgets, export_spz=args.spz)
+    for label, lod in lods.items():
+        print(f"{label}: {os.path.join(os.path.dirname(args.ply), lod['file'])}")
+
+
+if __name__ == "__main__":
+    main()
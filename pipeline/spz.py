@@ -0,0 +1,327 @@
+"""
+NumPy SPZ encoder / decoder: compress gaussian .ply splats ~10x for the viewer.
+
+SPZ (Niantic's format, the one Marble serves) is a gzip stream holding a
+16-byte header and column-major quantized attributes:
+
+    header     magic 0x5053474e ("NGSP"), version 3, point count,
+               SH degree, fractional bits, flags (0x1 = antialiased), reserved
+    positions  24-bit signed fixed point per axis, FRACTIONAL_BITS fraction bits
+    alphas     sigmoid(opacity) * 255
+    colors     SH DC * (0.15 * 255) + 127.5
+    scales     (log scale + 10) * 16
+    rotations  smallest-three: 2-bit index of the largest |component|, then the
+               other three as sign + 9-bit magnitude scaled by 1/sqrt(2)
+    sh         higher SH bands, coefficient-major with RGB interleaved,
+               x * 128 + 128 snapped to 8-value (band 1) / 16-value buckets
+
+Positions are stored as-is, in the same frame as our .ply and Marble's
+.spz; the viewer applies its own x-axis flip to both.
+
+Usage:
+    python pipeline/spz.py scene.ply scene.spz            # convert
+    python pipeline/spz.py scene.spz scene-decoded.ply    # decode back to .ply
+    python pipeline/spz.py --roundtrip scene.ply          # per-attribute error + size / time
+    python pipeline/spz.py --roundtrip --gaussians 500000 # same on synthetic gaussians
+"""
+
+import argparse
+import gzip
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from gaussian_ply import read_gaussians_ply, write_gaussians_ply
+
+
+SPZ_MAGIC = 0x5053474E
+SPZ_VERSION = 3
+FRACTIONAL_BITS = 12
+COLOR_SCALE = 0.15
+FLAG_ANTIALIASED = 0x1
+SH_DIM = {0: 0, 1: 3, 2: 8, 3: 15}  # extra coefficients per channel beyond DC
+SH1_BUCKET = 8  # 5 bits for band 1
+SH_REST_BUCKET = 16  # 4 bits for bands 2-3
+GZIP_LEVEL = 6
+_HEADER = struct.Struct("<IIIBBBB")
+_SQRT1_2 = np.float32(np.sqrt(0.5))
+
+
+def _to_uint8(x: np.ndarray) -> np.ndarray:
+    return np.clip(np.round(x), 0, 255).astype(np.uint8)
+
+
+def _pack_quaternions(rotations: np.ndarray) -> np.ndarray:
+    """(N, 4) x y z w quaternions -> (N, 4) bytes, smallest-three."""
+    q = rotations / np.maximum(np.linalg.norm(rotations, axis=1, keepdims=True), 1e-12)
+    n = len(q)
+    largest = np.abs(q).argmax(axis=1)
+    # -q is the same rotation; flip so the dropped (largest) component is positive
+    q = np.where(q[np.arange(n), largest][:, None] < 0, -q, q)
+
+    comp = largest.astype(np.uint32)
+    for i in range(4):
+        others = largest != i
+        mag = (np.float32((1 << 9) - 1) * (np.abs(q[:, i]) / _SQRT1_2) + 0.5).astype(np.uint32)
+        value = ((q[:, i] < 0).astype(np.uint32) << 9) | np.minimum(mag, (1 << 9) - 1)
+        comp = np.where(others, (comp << 10) | value, comp)
+    return comp.astype("<u4").view(np.uint8).reshape(n, 4)
+
+
+def _unpack_quaternions(packed: np.ndarray) -> np.ndarray:
+    """(N, 4) smallest-three bytes -> (N, 4) x y z w quaternions."""
+    comp = packed.reshape(-1, 4).copy().view("<u4").reshape(-1).astype(np.uint32)
+    n = len(comp)
+    largest = (comp >> 30).astype(np.int64)
+    mask = np.uint32((1 << 9) - 1)
+    q = np.zeros((n, 4), dtype=np.float32)
+    for i in range(3, -1, -1):
+        others = largest != i
+        value = _SQRT1_2 * (comp & mask).astype(np.float32) / np.float32(mask)
+        value = np.where((comp >> 9) & 1, -value, value)
+        q[:, i] = np.where(others, value, 0)
+        comp = np.where(others, comp >> 10, comp)
+    q[np.arange(n), largest] = np.sqrt(np.maximum(0, 1 - (q * q).sum(axis=1)))
+    return q
+
+
+def _quantize_sh(sh: np.ndarray) -> np.ndarray:
+    """(N, K, 3) higher-band SH -> uint8 with per-band bucket snapping."""
+    q = np.round(sh * 128.0).astype(np.int32) + 128
+    bucket = np.full(sh.shape[1], SH_REST_BUCKET, dtype=np.int32)
+    bucket[:3] = SH1_BUCKET
+    bucket = bucket[None, :, None]
+    q = (q + bucket // 2) // bucket * bucket
+    return np.clip(q, 0, 255).astype(np.uint8)
+
+
+def encode_spz(
+    gaussians: dict[str, np.ndarray],
+    sh_degree: int | None = None,
+    fractional_bits: int = FRACTIONAL_BITS,
+    antialiased: bool = False,
+    level: int = GZIP_LEVEL,
+) -> bytes:
+    """
+    Encode gaussians to SPZ bytes.
+
+    Args:
+        gaussians: activated arrays as read_gaussians_ply returns them: means (N, 3),
+            scales (N, 3), rotations (N, 4, x y z w), harmonics (N, 3, K), opacities (N,)
+        sh_degree: SH degree to keep (default: everything the input has, max 3)
+        fractional_bits: position precision; range is +-2^(23 - fractional_bits)
+        antialiased: set the antialiased flag (mip-splatting style training)
+        level: gzip level
+
+    Returns:
+        gzip-compressed SPZ file contents
+    """
+    means = np.asarray(gaussians["means"], dtype=np.float32)
+    n = len(means)
+    harmonics = np.asarray(gaussians["harmonics"], dtype=np.float32)
+    available = {1: 0, 4: 1, 9: 2, 16: 3}.get(harmonics.shape[2], 0)
+    sh_degree = available if sh_degree is None else min(sh_degree, available)
+    sh_dim = SH_DIM[sh_degree]
+
+    fixed = np.round(means * (1 << fractional_bits))
+    limit = 1 << 23
+    if n and np.abs(fixed).max() >= limit:
+        print(f"  Warning: positions beyond +-{limit >> fractional_bits} clipped; lower fractional_bits")
+    fixed = np.ascontiguousarray(np.clip(fixed, -limit, limit - 1), dtype="<i4")
+    positions = fixed.view(np.uint8).reshape(n, 3, 4)[:, :, :3]
+
+    opacities = np.asarray(gaussians["opacities"], dtype=np.float32).reshape(-1)
+    alphas = _to_uint8(opacities * 255.0)
+    colors = _to_uint8(harmonics[:, :, 0] * (COLOR_SCALE * 255.0) + 0.5 * 255.0)
+    log_scales = np.log(np.maximum(np.asarray(gaussians["scales"], dtype=np.float32), 1e-12))
+    scales = _to_uint8((log_scales + 10.0) * 16.0)
+    rotations = _pack_quaternions(np.asarray(gaussians["rotations"], dtype=np.float32))
+    sh = _quantize_sh(harmonics[:, :, 1:1 + sh_dim].transpose(0, 2, 1))
+
+    header = _HEADER.pack(SPZ_MAGIC, SPZ_VERSION, n, sh_degree, fractional_bits,
+                          FLAG_ANTIALIASED if antialiased else 0, 0)
+    payload = b"".join([header] + [np.ascontiguousarray(a).tobytes()
+                                   for a in (positions, alphas, colors, scales, rotations, sh)])
+    return gzip.compress(payload, compresslevel=level, mtime=0)
+
+
+def decode_spz(data: bytes) -> dict[str, np.ndarray]:
+    """
+    Decode SPZ bytes (version 2 or 3) into activated arrays (see encode_spz).
+
+    Returns:
+        Dict of means, scales, rotations (x y z w), harmonics (N, 3, K), opacities,
+        plus "antialiased"
+    """
+    raw = gzip.decompress(data)
+    magic, version, n, sh_degree, fractional_bits, flags, _ = _HEADER.unpack_from(raw)
+    if magic != SPZ_MAGIC:
+        raise ValueError(f"Not an SPZ file (magic {magic:#x})")
+    if version not in (2, 3):
+        raise ValueError(f"Unsupported SPZ version {version}")
+    sh_dim = SH_DIM[sh_degree]
+    rotation_bytes = 4 if version == 3 else 3
+
+    offset = _HEADER.size
+    sections = {}
+    for name, width in (("positions", 9), ("alphas", 1), ("colors", 3), ("scales", 3),
+                        ("rotations", rotation_bytes), ("sh", sh_dim * 3)):
+        size = n * width
+        sections[name] = np.frombuffer(raw, dtype=np.uint8, count=size, offset=offset).reshape(n, width)
+        offset += size
+    if offset != len(raw):
+        raise ValueError(f"SPZ size mismatch: expected {offset} bytes, got {len(raw)}")
+
+    p = sections["positions"].reshape(n, 3, 3).astype(np.int32)
+    fixed = p[:, :, 0] | (p[:, :, 1] << 8) | (p[:, :, 2] << 16)
+    fixed = np.where(fixed & 0x800000, fixed - (1 << 24), fixed)
+    means = fixed.astype(np.float32) / (1 << fractional_bits)
+
+    if version == 3:
+        rotations = _unpack_quaternions(sections["rotations"])
+    else:
+        xyz = sections["rotations"].astype(np.float32) / 127.5 - 1
+        w = np.sqrt(np.maximum(0, 1 - (xyz * xyz).sum(axis=1, keepdims=True)))
+        rotations = np.concatenate([xyz, w], axis=1)
+
+    harmonics = np.empty((n, 3, 1 + sh_dim), dtype=np.float32)
+    harmonics[:, :, 0] = (sections["colors"].astype(np.float32) / 255.0 - 0.5) / COLOR_SCALE
+    if sh_dim:
+        sh = (sections["sh"].astype(np.float32) - 128.0) / 128.0
+        harmonics[:, :, 1:] = sh.reshape(n, sh_dim, 3).transpose(0, 2, 1)
+
+    return {
+        "means": means,
+        "scales": np.exp(sections["scales"].astype(np.float32) / 16.0 - 10.0),
+        "rotations": rotations,
+        "harmonics": harmonics,
+        "opacities": sections["alphas"][:, 0].astype(np.float32) / 255.0,
+        "antialiased": bool(flags & FLAG_ANTIALIASED),
+    }
+
+
+def write_spz(path: str | os.PathLike, gaussians: dict[str, np.ndarray], **kwargs) -> int:
+    """Encode gaussians to path (via a temp file). Returns the file size in bytes."""
+    data = encode_spz(gaussians, **kwargs)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+def read_spz(path: str | os.PathLike) -> dict[str, np.ndarray]:
+    with open(path, "rb") as f:
+        return decode_spz(f.read())
+
+
+def ply_to_spz(ply_path: str | os.PathLike, spz_path: str | os.PathLike, **kwargs) -> dict:
+    """
+    Convert a gaussian .ply to .spz.
+
+    Returns:
+        Dict with spz_path, num_gaussians, spz_size_mb, compression_ratio, spz_time_s
+    """
+    t0 = time.time()
+    gaussians = read_gaussians_ply(ply_path)
+    size = write_spz(spz_path, gaussians, **kwargs)
+    return {
+        "spz_path": str(spz_path),
+        "num_gaussians": len(gaussians["means"]),
+        "spz_size_mb": round(size / (1024 * 1024), 1),
+        "compression_ratio": round(os.path.getsize(ply_path) / max(size, 1), 1),
+        "spz_time_s": round(time.time() - t0, 2),
+    }
+
+
+def roundtrip_report(gaussians: dict[str, np.ndarray], ply_bytes: int, **kwargs):
+    """Print encode / decode time, size and per-attribute error for one encode + decode."""
+    n = len(gaussians["means"])
+    t0 = time.perf_counter()
+    data = encode_spz(gaussians, **kwargs)
+    encode_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    decoded = decode_spz(data)
+    decode_s = time.perf_counter() - t0
+
+    print(f"{n:,} gaussians: .ply {ply_bytes / (1024 * 1024):.1f} MB -> .spz {len(data) / (1024 * 1024):.1f} MB "
+          f"({ply_bytes / max(len(data), 1):.1f}x)")
+    print(f"  encode {encode_s:.2f}s ({n / max(encode_s, 1e-9) / 1e6:.1f} M/s), "
+          f"decode {decode_s:.2f}s ({n / max(decode_s, 1e-9) / 1e6:.1f} M/s)")
+
+    # Quaternions q and -q are the same rotation: compare |dot|
+    dot = np.abs((decoded["rotations"] * gaussians["rotations"]
+                  / np.linalg.norm(gaussians["rotations"], axis=1, keepdims=True)).sum(axis=1))
+    k = decoded["harmonics"].shape[2]
+    errors = {
+        "position (abs)": np.abs(decoded["means"] - gaussians["means"]).max(),
+        "scale (rel)": np.abs(decoded["scales"] / gaussians["scales"] - 1).max(),
+        "rotation (deg)": np.degrees(2 * np.arccos(np.clip(dot, 0, 1))).max(),
+        "opacity (abs)": np.abs(decoded["opacities"] - gaussians["opacities"]).max(),
+        "color DC (abs)": np.abs(decoded["harmonics"][:, :, 0] - gaussians["harmonics"][:, :, 0]).max(),
+    }
+    if k > 1:
+        errors["SH rest (abs)"] = np.abs(decoded["harmonics"][:, :, 1:] - gaussians["harmonics"][:, :, 1:k]).max()
+    for name, error in errors.items():
+        print(f"  max {name:<15} {error:.4f}")
+
+
+def _synthetic(n: int, sh_degree: int) -> dict[str, np.ndarray]:
+    rng = np.random.default_rng(0)
+    return {
+        "means": rng.normal(scale=10, size=(n, 3)).astype(np.float32),
+        "scales": np.exp(rng.uniform(-7, -1, (n, 3))).astype(np.float32),
+        "rotations": rng.normal(size=(n, 4)).astype(np.float32),
+        "harmonics": np.concatenate([
+            rng.normal(scale=0.5, size=(n, 3, 1)),
+            rng.normal(scale=0.2, size=(n, 3, (sh_degree + 1) ** 2 - 1)),
+        ], axis=2).astype(np.float32),
+        "opacities": rng.uniform(0, 1, n).astype(np.float32),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gaussian splat .ply <-> .spz")
+    parser.add_argument("input", nargs="?", help=".ply to encode or .spz to decode")
+    parser.add_argument("output", nargs="?", help="Output .spz / .ply")
+    parser.add_argument("--roundtrip", action="store_true", help="Encode + decode input and report error")
+    parser.add_argument("--gaussians", type=int, default=0, help="Round trip synthetic gaussians instead")
+    parser.add_argument("--sh-degree", type=int, default=None, help="SH degree to keep (default: all)")
+    parser.add_argument("--fractional-bits", type=int, default=FRACTIONAL_BITS, help="Position precision")
+    parser.add_argument("--level", type=int, default=GZIP_LEVEL, help="gzip level")
+    args = parser.parse_args()
+    kwargs = dict(sh_degree=args.sh_degree, fractional_bits=args.fractional_bits, level=args.level)
+
+    if args.roundtrip:
+        if args.gaussians:
+            degree = 0 if args.sh_degree is None else args.sh_degree
+            gaussians = _synthetic(args.gaussians, degree)
+            ply_bytes = args.gaussians * 4 * (14 + 3 * (degree + 1) ** 2)
+        elif args.input:
+            gaussians = read_gaussians_ply(args.input)
+            ply_bytes = os.path.getsize(args.input)
+        else:
+            sys.exit("--roundtrip needs a .ply or --gaussians")
+        roundtrip_report(gaussians, ply_bytes, **kwargs)
+        return
+
+    if not (args.input and args.output):
+        parser.error("input and output are required unless --roundtrip")
+    if args.input.endswith(".spz"):
+        gaussians = read_spz(args.input)
+        sh_dc_only = gaussians["harmonics"].shape[2] == 1
+        result = write_gaussians_ply(args.output, **{k: gaussians[k] for k in
+                                                     ("means", "scales", "rotations", "harmonics", "opacities")},
+                                     sh_dc_only=sh_dc_only)
+        print(f"{args.output}: {result['num_gaussians']:,} gaussians, {result['file_size_mb']} MB")
+    else:
+        result = ply_to_spz(args.input, args.output, **kwargs)
+        print(f"{args.output}: {result['num_gaussians']:,} gaussians, {result['spz_size_mb']} MB "
+              f"({result['compression_ratio']}x smaller) in {result['spz_time_s']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+On-disk Street View tile cache, shared by fetch_streetview.py and marble_generator.py.
+
+Tiles are immutable per (pano_id, zoom, x, y) and stored as
+<root>/<pano_id>/z<zoom>/<x>_<y>.jpg, bounded by size with LRU eviction.
+Missing tiles can be rebuilt from cached higher-zoom tiles (synthesize).
+"""
+
+import os
+import tempfile
+import threading
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image
+
+
+DEFAULT_CACHE_DIR = "data/cache/tiles"
+DEFAULT_MAX_MB = 2048
+
+TILE_SIZE = 512
+MAX_ZOOM = 5
+
+
+class TileCache:
+    """Size-bounded LRU tile store keyed by (pano_id, zoom, x, y)."""
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.bytes_written = 0
+        self.evictions = 0
+        self.synthesized = 0
+        self._lock = threading.Lock()
+        self._total_bytes: int | None = None  # scanned lazily on first write
+
+    def path(self, pano_id: str, zoom: int, x: int, y: int) -> Path:
+        return self.root / pano_id / f"z{zoom}" / f"{x}_{y}.jpg"
+
+    def has(self, pano_id: str, zoom: int, x: int, y: int) -> bool:
+        return self.path(pano_id, zoom, x, y).exists()
+
+    def _read(self, pano_id: str, zoom: int, x: int, y: int) -> bytes | None:
+        """Tile bytes (marking the tile recently used), or None; leaves hit/miss stats alone."""
+        path = self.path(pano_id, zoom, x, y)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return data
+
+    def get(self, pano_id: str, zoom: int, x: int, y: int) -> bytes | None:
+        """Return cached tile bytes, or None on a miss."""
+        data = self._read(pano_id, zoom, x, y)
+        if data is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += len(data)
+        return data
+
+    def put(self, pano_id: str, zoom: int, x: int, y: int, data: bytes):
+        """Store tile bytes atomically, evicting old tiles if over the size bound."""
+        path = self.path(pano_id, zoom, x, y)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        previous = path.stat().st_size if path.exists() else 0
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            self.bytes_written += len(data)
+            if self._total_bytes is not None:
+                self._total_bytes += len(data) - previous
+        if self._size() > self.max_bytes:
+            self.evict()
+
+    def synthesize(
+        self,
+        pano_id: str,
+        zoom: int,
+        x: int,
+        y: int,
+        tile_px: int = TILE_SIZE,
+    ) -> Image.Image | None:
+        """
+        Build tile (zoom, x, y) by downsampling cached tiles from a higher zoom.
+
+        Uses the nearest higher zoom whose children are all cached, decoding
+        each child at reduced JPEG draft scale straight into its place in the
+        output. Returns a tile_px x tile_px RGB image, or None if no zoom has
+        full coverage. Zoom 0 is a single tile with its own layout and is
+        never synthesized.
+        """
+        if zoom < 1:
+            return None
+
+        for higher in range(zoom + 1, MAX_ZOOM + 1):
+            k = 2 ** (higher - zoom)
+            if k > tile_px:
+                break
+            children = [
+                (cx, cy)
+                for cy in range(y * k, (y + 1) * k)
+                for cx in range(x * k, (x + 1) * k)
+            ]
+            if not all(self.has(pano_id, higher, cx, cy) for cx, cy in children):
+                continue
+
+            child_px = tile_px // k
+            tile = Image.new("RGB", (tile_px, tile_px))
+            for cx, cy in children:
+                # Not get(): children are inputs, counted once in `synthesized`, not as hits
+                data = self._read(pano_id, higher, cx, cy)
+                if data is None:  # evicted since has()
+                    break
+                child = Image.open(BytesIO(data))
+                child.draft("RGB", (child_px, child_px))
+                if child.mode != "RGB":
+                    child = child.convert("RGB")
+                if child.size != (child_px, child_px):
+                    child = child.resize((child_px, child_px), Image.BOX)
+                tile.paste(child, ((cx - x * k) * child_px, (cy - y * k) * child_px))
+            else:
+                with self._lock:
+                    self.synthesized += 1
+                return tile
+
+        return None
+
+    def _size(self) -> int:
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._scan())
+            return self._total_bytes
+
+    def _scan(self) -> list[tuple[float, int, Path]]:
+        entries = []
+        for path in self.root.glob("*/z*/*.jpg"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self, target_bytes: int | None = None):
+        """Delete least-recently-used tiles until the cache is under target_bytes.
+
+        Defaults to 90% of max_bytes so eviction doesn't run on every put.
+        """
+        if target_bytes is None:
+            target_bytes = int(self.max_bytes * 0.9)
+
+        with self._lock:
+            entries = sorted(self._scan())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= target_bytes:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    continue
+                total -= size
+                self.evictions += 1
+            self._total_bytes = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests_total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / requests_total, 3) if requests_total else 0.0,
+                "bytes_saved": self.bytes_saved,
+                "bytes_written": self.bytes_written,
+                "evictions": self.evictions,
+                "synthesized": self.synthesized,
+            }
+
+    def report(self) -> str:
+        s = self.stats()
+        return (
+            f"Tile cache ({self.root}): {s['hits']} hits, {s['misses']} misses "
+            f"({s['hit_rate']:.0%} hit rate), {s['bytes_saved'] / (1024 * 1024):.1f} MB saved, "
+            f"{s['bytes_written'] / (1024 * 1024):.1f} MB written, {s['evictions']} evicted, "
+            f"{s['synthesized']} tiles built from higher zooms"
+        )
+
+
+_default_cache: TileCache | None = None
+_default_configured = False
+_default_lock = threading.Lock()
+
+
+def default_tile_cache() -> TileCache | None:
+    """Process-wide cache used by fetch_tile, or None if disabled (see set_default_tile_cache)."""
+    global _default_cache, _default_configured
+    with _default_lock:
+        if not _default_configured:
+            _default_cache = TileCache()
+            _default_configured = True
+        return _default_cache
+
+
+def set_default_tile_cache(cache: TileCache | None):
+    """Replace the process-wide cache (None disables caching)."""
+    global _default_cache, _default_configured
+    with _default_lock:
+        _default_cache = cache
+        _default_configured = True
@@ -0,0 +1,275 @@
+"""
+Spatial index over registry.json worlds for nearest-splat lookup.
+
+Worlds are bucketed into geohash cells by their center. Geohash cells at a
+fixed precision form a regular lat/lng grid, so k-nearest and radius queries
+only visit the cells around the query point instead of scanning every world.
+
+`build` (and marble_generator, whenever it saves the registry) also writes
+the index as generated JSON next to the registry (registry.index.json):
+
+    {
+      "version": 1,
+      "precision": 7,
+      "cell_deg": {"lat": ..., "lng": ...},
+      "cells": {"dr5rsq1": [0, 3], ...},     # geohash -> indices into worlds
+      "worlds": [{"id", "file", "lat", "lng"}, ...]
+    }
+
+Usage:
+    python pipeline/world_index.py build data/registry.json
+    python pipeline/world_index.py query data/registry.json 40.7284 -73.9872 --k 3
+    python pipeline/world_index.py query data/registry.json 40.7284 -73.9872 --radius 100
+"""
+
+import argparse
+import json
+import math
+import os
+import time
+from pathlib import Path
+
+from pano_graph import EARTH_RADIUS_M, haversine_m
+
+
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+DEFAULT_PRECISION = 7  # ~153m x 153m cells at the equator, ~115m x 153m in NYC
+INDEX_VERSION = 1
+
+
+def _grid_bits(precision: int) -> tuple[int, int]:
+    """(lat_bits, lng_bits) of a geohash; longitude gets the extra bit."""
+    total = 5 * precision
+    return total // 2, total - total // 2
+
+
+def cell_size_deg(precision: int) -> tuple[float, float]:
+    """(lat, lng) size in degrees of a geohash cell."""
+    lat_bits, lng_bits = _grid_bits(precision)
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def _cell(lat: float, lng: float, precision: int) -> tuple[int, int]:
+    lat_bits, lng_bits = _grid_bits(precision)
+    row = min(int((lat + 90.0) / 180.0 * (1 << lat_bits)), (1 << lat_bits) - 1)
+    col = min(int((lng + 180.0) / 360.0 * (1 << lng_bits)), (1 << lng_bits) - 1)
+    return row, col
+
+
+def _cell_geohash(row: int, col: int, precision: int) -> str:
+    lat_bits, lng_bits = _grid_bits(precision)
+    bits = 0
+    lat_i, lng_i = lat_bits, lng_bits
+    for i in range(5 * precision):
+        if i % 2 == 0:
+            lng_i -= 1
+            bits = (bits << 1) | ((col >> lng_i) & 1)
+        else:
+            lat_i -= 1
+            bits = (bits << 1) | ((row >> lat_i) & 1)
+    return "".join(
+        GEOHASH_BASE32[(bits >> (5 * (precision - 1 - i))) & 31] for i in range(precision)
+    )
+
+
+def geohash_encode(lat: float, lng: float, precision: int = DEFAULT_PRECISION) -> str:
+    """Standard geohash of a point."""
+    return _cell_geohash(*_cell(lat, lng, precision), precision)
+
+
+def geohash_decode(geohash: str) -> tuple[int, int]:
+    """(row, col) grid cell of a geohash at its own precision."""
+    precision = len(geohash)
+    bits = 0
+    for ch in geohash:
+        bits = (bits << 5) | GEOHASH_BASE32.index(ch)
+    row = col = 0
+    for i in range(5 * precision):
+        bit = (bits >> (5 * precision - 1 - i)) & 1
+        if i % 2 == 0:
+            col = (col << 1) | bit
+        else:
+            row = (row << 1) | bit
+    return row, col
+
+
+class WorldIndex:
+    """Geohash-grid index of world centers supporting k-nearest and radius queries."""
+
+    def __init__(self, worlds: list[dict], precision: int = DEFAULT_PRECISION):
+        self.precision = precision
+        self.worlds = [w for w in worlds if w.get("center")]
+        self.cells: dict[tuple[int, int], list[int]] = {}
+        for i, world in enumerate(self.worlds):
+            cell = _cell(world["center"]["lat"], world["center"]["lng"], precision)
+            self.cells.setdefault(cell, []).append(i)
+
+        self._max_abs_lat = max((abs(w["center"]["lat"]) for w in self.worlds), default=0.0)
+        rows = [r for r, _ in self.cells] or [0]
+        cols = [c for _, c in self.cells] or [0]
+        self._bounds = (min(rows), max(rows), min(cols), max(cols))
+
+    @classmethod
+    def from_registry(cls, registry_path: str, precision: int = DEFAULT_PRECISION) -> "WorldIndex":
+        with open(registry_path) as f:
+            registry = json.load(f)
+        return cls(registry.get("worlds", []), precision)
+
+    @classmethod
+    def load(cls, index_path: str) -> "WorldIndex":
+        """Load a static index file written by save()."""
+        with open(index_path) as f:
+            data = json.load(f)
+        worlds = [
+            {"id": w["id"], "file": w.get("file"), "center": {"lat": w["lat"], "lng": w["lng"]}}
+            for w in data["worlds"]
+        ]
+        return cls(worlds, data["precision"])
+
+    def _min_cell_m(self, lat: float) -> float:
+        """Smallest cell side in meters between the query and the indexed latitudes."""
+        lat_deg, lng_deg = cell_size_deg(self.precision)
+        worst_lat = min(max(abs(lat), self._max_abs_lat), 89.0)
+        return math.radians(min(lat_deg, lng_deg * math.cos(math.radians(worst_lat)))) * EARTH_RADIUS_M
+
+    def _dist(self, i: int, lat: float, lng: float) -> float:
+        center = self.worlds[i]["center"]
+        return haversine_m(lat, lng, center["lat"], center["lng"])
+
+    def _ring(self, row: int, col: int, r: int):
+        if r == 0:
+            yield row, col
+            return
+        for c in range(col - r, col + r + 1):
+            yield row - r, c
+            yield row + r, c
+        for rr in range(row - r + 1, row + r):
+            yield rr, col - r
+            yield rr, col + r
+
+    def nearest(self, lat: float, lng: float, k: int = 1) -> list[tuple[float, dict]]:
+        """The k worlds whose centers are closest to (lat, lng), as (distance_m, world) pairs."""
+        if not self.worlds:
+            return []
+        k = min(k, len(self.worlds))
+        row, col = _cell(lat, lng, self.precision)
+        min_row, max_row, min_col, max_col = self._bounds
+        max_ring = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+
+        cell_m = self._min_cell_m(lat)
+
+        found: list[tuple[float, int]] = []
+        for r in range(max_ring + 1):
+            # Far from every world the rings are mostly empty; just scan them all
+            if 8 * r > len(self.cells):
+                found = [(self._dist(i, lat, lng), i) for i in range(len(self.worlds))]
+                break
+            for cell in self._ring(row, col, r):
+                for i in self.cells.get(cell, ()):
+                    found.append((self._dist(i, lat, lng), i))
+            # Anything outside rings 0..r is at least r cells away
+            if len(found) >= k:
+                found.sort()
+                if found[k - 1][0] <= r * cell_m:
+                    break
+        found.sort()
+        return [(d, self.worlds[i]) for d, i in found[:k]]
+
+    def within_radius(self, lat: float, lng: float, radius_m: float) -> list[tuple[float, dict]]:
+        """Worlds whose centers are within radius_m of (lat, lng), nearest first."""
+        dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+        dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        row_lo, col_lo = _cell(max(lat - dlat, -90.0), max(lng - dlng, -180.0), self.precision)
+        row_hi, col_hi = _cell(min(lat + dlat, 90.0), min(lng + dlng, 180.0), self.precision)
+
+        if (row_hi - row_lo + 1) * (col_hi - col_lo + 1) > len(self.cells):
+            candidates = [i for idxs in self.cells.values() for i in idxs]
+        else:
+            candidates = [
+                i
+                for r in range(row_lo, row_hi + 1)
+                for c in range(col_lo, col_hi + 1)
+                for i in self.cells.get((r, c), ())
+            ]
+
+        hits = [(self._dist(i, lat, lng), i) for i in candidates]
+        return [(d, self.worlds[i]) for d, i in sorted(hits) if d <= radius_m]
+
+    def to_json(self) -> dict:
+        lat_deg, lng_deg = cell_size_deg(self.precision)
+        return {
+            "version": INDEX_VERSION,
+            "precision": self.precision,
+            "cell_deg": {"lat": lat_deg, "lng": lng_deg},
+            "cells": {
+                _cell_geohash(row, col, self.precision): idxs
+                for (row, col), idxs in sorted(self.cells.items())
+            },
+            "worlds": [
+                {
+                    "id": w["id"],
+                    "file": w.get("file"),
+                    "lat": w["center"]["lat"],
+                    "lng": w["center"]["lng"],
+                }
+                for w in self.worlds
+            ],
+        }
+
+    def save(self, index_path: str):
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_json(), f, separators=(",", ":"))
+        os.replace(tmp_path, index_path)
+
+
+def index_path_for(registry_path: str) -> str:
+    """registry.json -> registry.index.json alongside it."""
+    path = Path(registry_path)
+    return str(path.with_name(f"{path.stem}.index.json"))
+
+
+def build_index(registry_path: str, precision: int = DEFAULT_PRECISION) -> str:
+    """Build and save the static index next to a registry. Returns the index path."""
+    index = WorldIndex.from_registry(registry_path, precision)
+    index_path = index_path_for(registry_path)
+    index.save(index_path)
+    return index_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spatial index over registry.json worlds")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Write registry.index.json next to the registry")
+    build.add_argument("registry", type=str)
+    build.add_argument("--precision", type=int, default=DEFAULT_PRECISION, help="Geohash precision")
+
+    query = sub.add_parser("query", help="Nearest worlds to a point")
+    query.add_argument("registry", type=str)
+    query.add_argument("lat", type=float)
+    query.add_argument("lng", type=float)
+    query.add_argument("--k", type=int, default=1, help="Number of nearest worlds")
+    query.add_argument("--radius", type=float, default=None, help="All worlds within this many meters")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index_path = build_index(args.registry, args.precision)
+        index = WorldIndex.load(index_path)
+        print(f"Indexed {len(index.worlds)} worlds into {len(index.cells)} cells -> {index_path}")
+        return
+
+    index = WorldIndex.from_registry(args.registry)
+    t0 = time.perf_counter()
+    if args.radius is not None:
+        hits = index.within_radius(args.lat, args.lng, args.radius)
+    else:
+        hits = index.nearest(args.lat, args.lng, args.k)
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    for dist, world in hits:
+        print(f"  {dist:7.1f}m  {world['id']}  ({world.get('file')})")
+    print(f"{len(hits)} worlds in {elapsed_ms:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()